@@ -0,0 +1,66 @@
+import logging
+import secrets
+from fastapi import APIRouter, HTTPException, Depends, Query, Header
+from fastapi.responses import PlainTextResponse
+from app.core.config import settings
+from app.core.profiling import profiler, ProfilerStateError
+from app.core.hotkeys import hot_keys
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not settings.ADMIN_TOKEN or not x_admin_token or not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+hot_keys_router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.post("/cpu", response_class=PlainTextResponse)
+async def profile_cpu(
+    seconds: float = Query(10.0, gt=0, le=120, description="How long to profile live traffic for"),
+    format: str = Query("collapsed", pattern="^(collapsed|pstats)$", description="collapsed stacks for flame graphs, or a cumulative pstats report"),
+    interval_ms: float = Query(5.0, ge=1, le=100, description="Sampling interval for the collapsed format"),
+    limit: int = Query(50, ge=1, le=500, description="Rows in the pstats report"),
+):
+    """Profile the running process for `seconds` and return the result."""
+    logger.info(f"Starting {format} CPU profile for {seconds}s")
+    try:
+        return await profiler.cpu(seconds, interval=interval_ms / 1000, output=format, limit=limit)
+    except ProfilerStateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post("/memory/start")
+def start_memory_tracing(frames: int = Query(25, ge=1, le=100, description="Stack depth recorded per allocation")):
+    """Start tracemalloc. Tracing slows allocations down noticeably, so stop it when done."""
+    logger.info(f"Starting tracemalloc with {frames} frames")
+    return profiler.start_tracing(frames)
+
+
+@router.post("/memory/stop")
+def stop_memory_tracing():
+    logger.info("Stopping tracemalloc")
+    return profiler.stop_tracing()
+
+
+@router.post("/memory/snapshot")
+def memory_snapshot(
+    key_type: str = Query("app", pattern="^(app|lineno|filename|traceback)$", description="app groups by the innermost frame under app/"),
+    limit: int = Query(25, ge=1, le=200),
+    app_only: bool = Query(True, description="Only count allocations made under app/ code"),
+):
+    """Snapshot allocations; the response diffs against the previous snapshot when there is one."""
+    try:
+        return profiler.snapshot(key_type=key_type, limit=limit, app_only=app_only)
+    except ProfilerStateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@hot_keys_router.get("/hot-keys")
+def get_hot_keys(limit: int = Query(50, ge=1, le=1000, description="How many of the top keys to list")):
+    """Most requested cache keys by estimated count, with the URL that last requested each."""
+    return hot_keys.stats(limit)
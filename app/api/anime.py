@@ -2,6 +2,8 @@ import logging
 from fastapi import APIRouter, HTTPException, Depends, Query
 from app.models.anime.mal_model import (MalResponseType1, AnimeSeasonAndScheduleResponse, AnimeSearchResponse, AnimeDetails, CharacterDetails, PersonDetails)
 from app.dependencies import get_anime_scraper, get_anime_season_and_schedule_scraper, get_anime_search_scraper, get_anime_details_scraper
+from app.core.cache import cached
+from app.core.config import settings
 from typing import Optional, List
 
 router = APIRouter()
@@ -10,6 +12,7 @@ logger = logging.getLogger(__name__)
 # MyAnimeList
 # top and popular
 @router.get("/mal/top", response_model=MalResponseType1)
+@cached("anime.top", ttl=settings.CACHE_TTL_ANIME)
 async def get_top_anime(
     page: int = Query(1, description="Page number, starting from 1", ge=1, le=100),
     scraper = Depends(get_anime_scraper)
@@ -24,6 +27,7 @@ async def get_top_anime(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/mal/top_airing", response_model=MalResponseType1)
+@cached("anime.top_airing", ttl=settings.CACHE_TTL_ANIME)
 async def get_top_airing_anime(
     page: int = Query(1, description="Page number, starting from 1", ge=1, le=5),
     scraper = Depends(get_anime_scraper)
@@ -38,6 +42,7 @@ async def get_top_airing_anime(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/mal/top_upcoming", response_model=MalResponseType1)
+@cached("anime.top_upcoming", ttl=settings.CACHE_TTL_ANIME)
 async def get_top_upcoming_anime(
     page: int = Query(1, description="Page number, starting from 1", ge=1, le=6),
     scraper = Depends(get_anime_scraper)
@@ -52,6 +57,7 @@ async def get_top_upcoming_anime(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/mal/top_series", response_model=MalResponseType1)
+@cached("anime.top_series", ttl=settings.CACHE_TTL_ANIME)
 async def get_top_series_anime(
     page: int = Query(1, description="Page number, starting from 1", ge=1, le=100),
     scraper = Depends(get_anime_scraper)
@@ -66,6 +72,7 @@ async def get_top_series_anime(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/mal/top_movies", response_model=MalResponseType1)
+@cached("anime.top_movies", ttl=settings.CACHE_TTL_ANIME)
 async def get_top_movies_anime(
     page: int = Query(1, description="Page number, starting from 1", ge=1, le=40),
     scraper = Depends(get_anime_scraper)
@@ -80,6 +87,7 @@ async def get_top_movies_anime(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/mal/top_ova", response_model=MalResponseType1)
+@cached("anime.top_ova", ttl=settings.CACHE_TTL_ANIME)
 async def get_top_ova_anime(
     page: int = Query(1, description="Page number, starting from 1", ge=1, le=30),
     scraper = Depends(get_anime_scraper)
@@ -94,6 +102,7 @@ async def get_top_ova_anime(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/mal/top_ona", response_model=MalResponseType1)
+@cached("anime.top_ona", ttl=settings.CACHE_TTL_ANIME)
 async def get_top_ona_anime(
     page: int = Query(1, description="Page number, starting from 1", ge=1, le=30),
     scraper = Depends(get_anime_scraper)
@@ -108,6 +117,7 @@ async def get_top_ona_anime(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/mal/top_special", response_model=MalResponseType1)
+@cached("anime.top_special", ttl=settings.CACHE_TTL_ANIME)
 async def get_top_special_anime(
     page: int = Query(1, description="Page number, starting from 1", ge=1, le=36),
     scraper = Depends(get_anime_scraper)
@@ -122,6 +132,7 @@ async def get_top_special_anime(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/mal/most_popular", response_model=MalResponseType1)
+@cached("anime.most_popular", ttl=settings.CACHE_TTL_ANIME)
 async def get_most_popular_anime(
     page: int = Query(1, description="Page number, starting from 1", ge=1, le=100),
     scraper = Depends(get_anime_scraper)
@@ -136,6 +147,7 @@ async def get_most_popular_anime(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/mal/most_fav", response_model=MalResponseType1)
+@cached("anime.most_fav", ttl=settings.CACHE_TTL_ANIME)
 async def get_most_favorited_anime(
     page: int = Query(1, description="Page number, starting from 1", ge=1, le=100),
     scraper = Depends(get_anime_scraper)
@@ -151,6 +163,7 @@ async def get_most_favorited_anime(
 
 # Seasons
 @router.get("/mal/season", response_model=AnimeSeasonAndScheduleResponse)
+@cached("anime.season", ttl=settings.CACHE_TTL_ANIME)
 async def get_anime_season(
     y: Optional[int] = Query(None, description="Year of the anime season"),
     s: Optional[str] = Query(None, description="Season (winter, spring, summer, fall)"),
@@ -167,6 +180,7 @@ async def get_anime_season(
 
 # schedule
 @router.get("/mal/schedule", response_model=AnimeSeasonAndScheduleResponse)
+@cached("anime.schedule", ttl=settings.CACHE_TTL_ANIME)
 async def get_anime_schedule(
     scraper = Depends(get_anime_season_and_schedule_scraper)
 ):
@@ -181,6 +195,7 @@ async def get_anime_schedule(
 
 # search
 @router.get("/mal/search", response_model=AnimeSearchResponse)
+@cached("anime.search", ttl=settings.CACHE_TTL_ANIME)
 async def search_anime(
     q: str = Query(..., description="Search query"),
     page: int = Query(1, description="Page number, starting from 1", ge=1),
@@ -217,6 +232,7 @@ async def search_anime(
 
 # Anime details
 @router.get("/mal/details", response_model=AnimeDetails)
+@cached("anime.details", ttl=settings.CACHE_TTL_ANIME)
 async def get_anime_details(
     id: int = Query(..., description="MyAnimeList ID of the anime"),
     scraper = Depends(get_anime_details_scraper)
@@ -232,6 +248,7 @@ async def get_anime_details(
     
 # Anime character details
 @router.get("/mal/character", response_model=CharacterDetails)
+@cached("anime.character", ttl=settings.CACHE_TTL_ANIME)
 async def get_character_details(
     id: int = Query(..., description="MyAnimeList ID of the character"),
     scraper = Depends(get_anime_details_scraper)
@@ -247,6 +264,7 @@ async def get_character_details(
     
 # People details
 @router.get("/mal/person", response_model=PersonDetails)
+@cached("anime.person", ttl=settings.CACHE_TTL_ANIME)
 async def get_person_details(
     id: int = Query(..., description="MyAnimeList ID of the person"),
     scraper = Depends(get_anime_details_scraper)
@@ -4,11 +4,14 @@ from app.models.libgen_model import DownloadLinkResponse, LibgenSearchResponse
 from app.models.errorResponse_model import ErrorResponse
 from app.dependencies import get_libgen_download_scraper
 from app.scrapers.libgen_scraper import LibgenScraper
+from app.core.cache import cached
+from app.core.config import settings
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 @router.get("/libgen/download/{source}/{download_id}", response_model=DownloadLinkResponse, responses={400: {"model": ErrorResponse}, 404: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+@cached("books.libgen_download", ttl=settings.CACHE_TTL_BOOKS)
 async def get_download_link(
     source: str = Path(..., pattern="^(library_lol|libgen_li)$"),
     download_id: str = Path(..., min_length=32, max_length=32),
@@ -35,6 +38,7 @@ async def get_download_link(
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 @router.get("/libgen/{bookname}", response_model=LibgenSearchResponse, responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+@cached("books.libgen_search", ttl=settings.CACHE_TTL_BOOKS)
 async def get_libgen_books(
     bookname: str = Path(..., min_length=1, max_length=200)
 ):
@@ -3,12 +3,15 @@ from fastapi import APIRouter, HTTPException, Depends, Query
 from app.models.hero_model import HeroSearchResponse, HeroDetail
 from app.dependencies import get_heroes_scraper
 from app.models.errorResponse_model import ErrorResponse
+from app.core.cache import cached
+from app.core.config import settings
 from typing import List
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 @router.get("/heroes", response_model=HeroSearchResponse, responses={404: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+@cached("heroes.category", ttl=settings.CACHE_TTL_HEROES)
 async def get_heroes(
     start: str = Query(..., min_length=1, max_length=1),
     scraper = Depends(get_heroes_scraper)
@@ -30,6 +33,7 @@ async def get_heroes(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/details", response_model=HeroDetail, responses={404: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+@cached("heroes.details", ttl=settings.CACHE_TTL_HEROES)
 async def get_hero_detail(
     heroid: str = Query(..., description="The ID of the hero to fetch details for"),
     scraper = Depends(get_heroes_scraper)
@@ -45,6 +49,7 @@ async def get_hero_detail(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/search", response_model=HeroSearchResponse, responses={404: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+@cached("heroes.search", ttl=settings.CACHE_TTL_HEROES)
 async def search_heroes(
     q: str = Query(..., description="The search query"),
     scraper = Depends(get_heroes_scraper)
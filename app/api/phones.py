@@ -3,11 +3,14 @@ from fastapi import APIRouter, HTTPException, Depends, Path, Query
 from app.models.gsmarena_model import GSMArenaSearchResponse, PhoneDetailsResponse
 from app.models.errorResponse_model import ErrorResponse
 from app.dependencies import get_gsmarena_scraper, get_gsmarena_phone_info_scraper
+from app.core.cache import cached
+from app.core.config import settings
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 @router.get("/gsmarena", response_model=PhoneDetailsResponse, responses={404: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+@cached("phones.gsmarena_details", ttl=settings.CACHE_TTL_PHONES)
 async def get_phone_details(
     id: str = Query(..., description="URL of the phone details page on GSMArena"),
     scraper = Depends(get_gsmarena_phone_info_scraper)
@@ -23,6 +26,7 @@ async def get_phone_details(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/gsmarena/top", response_model=GSMArenaSearchResponse, responses={404: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+@cached("phones.gsmarena_top", ttl=settings.CACHE_TTL_PHONES)
 async def get_top_phones(
     scraper = Depends(get_gsmarena_scraper)
 ):
@@ -37,6 +41,7 @@ async def get_top_phones(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/gsmarena/{search_query}", response_model=GSMArenaSearchResponse, responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+@cached("phones.gsmarena_search", ttl=settings.CACHE_TTL_PHONES)
 async def get_gsmarena_phones(
     search_query: str = Path(..., min_length=1, max_length=200),
     scraper = Depends(get_gsmarena_scraper)
@@ -4,11 +4,14 @@ from app.models.wunderground_model import WundergroundWeatherData
 from app.models.timeanddate_model import TimeAndDateWeatherData, FourteenDayForecast, TwentyFourHourForecast
 from app.models.errorResponse_model import ErrorResponse
 from app.dependencies import get_wunderground_scraper, get_timeanddate_scraper
+from app.core.cache import cached
+from app.core.config import settings
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 @router.get("/wunderground/{country}/{location}", response_model=WundergroundWeatherData, responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+@cached("weather.wunderground", ttl=settings.CACHE_TTL_WEATHER)
 async def get_wunderground_weather(
     country: str = Path(..., min_length=2, max_length=50),
     location: str = Path(..., min_length=2, max_length=50),
@@ -25,6 +28,7 @@ async def get_wunderground_weather(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/timeanddate/{country}/{location}", response_model=TimeAndDateWeatherData, responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+@cached("weather.timeanddate", ttl=settings.CACHE_TTL_WEATHER)
 async def get_timeanddate_weather(
     country: str = Path(..., min_length=2, max_length=50),
     location: str = Path(..., min_length=2, max_length=50),
@@ -61,6 +65,7 @@ async def get_weather(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/timeanddate/{country}/{location}/14day", response_model=FourteenDayForecast, responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+@cached("weather.timeanddate_14day", ttl=settings.CACHE_TTL_WEATHER)
 async def get_timeanddate_14day_forecast(
     country: str = Path(..., min_length=2, max_length=50),
     location: str = Path(..., min_length=2, max_length=50),
@@ -77,6 +82,7 @@ async def get_timeanddate_14day_forecast(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/timeanddate/{country}/{location}/24hour", response_model=TwentyFourHourForecast, responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+@cached("weather.timeanddate_24hour", ttl=settings.CACHE_TTL_WEATHER)
 async def get_timeanddate_24hour_forecast(
     country: str = Path(..., min_length=2, max_length=50),
     location: str = Path(..., min_length=2, max_length=50),
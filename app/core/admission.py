@@ -0,0 +1,63 @@
+from contextlib import contextmanager
+from typing import Dict, List, Set
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core.metrics import registry
+
+admission_in_flight = registry.gauge(
+    "admission_in_flight", "Admitted requests currently doing upstream work, by route group.", ("group",))
+admission_shed_total = registry.counter(
+    "admission_shed_total", "Requests rejected with 503 because their route group was at its in-flight limit.", ("group",))
+
+
+class AdmissionController:
+    """Caps the number of requests doing upstream work at once per route group, shedding the excess with a 503.
+
+    Groups are the first part of the cache family ("anime" for "anime.top"), i.e. the router the route lives in.
+    Only cache misses come through here, so requests the cache can answer are never shed.
+    """
+
+    def __init__(self, limits: Dict[str, int], default: int, retry_after: int):
+        self.limits = limits
+        self.default = default
+        self.retry_after = retry_after
+        self._in_flight: Dict[str, int] = {}
+        self.groups: Set[str] = set()
+
+    @staticmethod
+    def group(family: str) -> str:
+        return family.split(".", 1)[0]
+
+    def register(self, family: str):
+        """Declare a cache family, so limits naming a group no route uses can be reported (see `unknown_limits`)."""
+        self.groups.add(self.group(family))
+
+    def unknown_limits(self) -> List[str]:
+        return sorted(group for group in self.limits if group not in self.groups)
+
+    @contextmanager
+    def admit(self, family: str):
+        group = self.group(family)
+        limit = self.limits.get(group, self.default)
+        in_flight = self._in_flight.get(group, 0)
+        if 0 < limit <= in_flight:
+            admission_shed_total.inc(group)
+            raise HTTPException(
+                status_code=503,
+                detail=f"Too many {group} requests in progress, retry shortly",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        self._in_flight[group] = in_flight + 1
+        admission_in_flight.inc(group)
+        try:
+            yield
+        finally:
+            self._in_flight[group] -= 1
+            admission_in_flight.dec(group)
+
+
+admission = AdmissionController(
+    limits=settings.ADMISSION_MAX_IN_FLIGHT,
+    default=settings.ADMISSION_DEFAULT_MAX_IN_FLIGHT,
+    retry_after=settings.ADMISSION_RETRY_AFTER,
+)
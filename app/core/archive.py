@@ -0,0 +1,112 @@
+import json
+import time
+import zlib
+import random
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_url ON responses (url, id);
+"""
+
+
+class ReplayMiss(httpx.TransportError):
+    """Raised in replay mode for a URL the archive has never seen."""
+
+
+def _archive_key(request: httpx.Request) -> str:
+    # The URL the scraper asked for, before any UPSTREAM_BASE_URL rewrite, so archives stay portable
+    return request.extensions.get("upstream_url") or str(request.url)
+
+
+class UpstreamArchive:
+    """SQLite archive of upstream responses, stored exactly as received: status, headers and the still-encoded body, zlib-compressed."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def put(self, url: str, status: int, headers: List[Tuple[str, str]], body: bytes):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO responses (url, status, headers, body, recorded_at) VALUES (?, ?, ?, ?, ?)",
+                (url, status, json.dumps(headers), zlib.compress(body), time.time()),
+            )
+            self._db.commit()
+
+    def get(self, url: str) -> Optional[Tuple[int, List[Tuple[str, str]], bytes]]:
+        """Latest recording for the URL."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, headers, body FROM responses WHERE url = ? ORDER BY id DESC LIMIT 1", (url,)).fetchone()
+        if row is None:
+            return None
+        return row[0], [tuple(header) for header in json.loads(row[1])], zlib.decompress(row[2])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, urls, stored = self._db.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT url), COALESCE(SUM(LENGTH(body)), 0) FROM responses").fetchone()
+        return {"path": self.path, "responses": count, "urls": urls, "stored_bytes": stored}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Passes requests through to `inner` and archives a sample of the responses."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, archive: UpstreamArchive, sample_rate: float):
+        self.inner = inner
+        self.archive = archive
+        self.sample_rate = sample_rate
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self.inner.handle_async_request(request)
+        # A 304 only makes sense next to the request that carried the validators, so it is never archived
+        if response.status_code == 304 or random.random() >= self.sample_rate:
+            return response
+        # Read the raw stream so the archive keeps the body as it came off the wire; the client decodes it later
+        raw = b"".join([chunk async for chunk in response.aiter_raw()])
+        await response.aclose()
+        try:
+            await asyncio.to_thread(self.archive.put, _archive_key(request), response.status_code, response.headers.multi_items(), raw)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not archive {request.url}: {e}")
+        return httpx.Response(response.status_code, headers=response.headers, stream=httpx.ByteStream(raw),
+                              extensions=response.extensions)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Serves every request from the archive without touching the network."""
+
+    def __init__(self, archive: UpstreamArchive):
+        self.archive = archive
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        recorded = await asyncio.to_thread(self.archive.get, _archive_key(request))
+        if recorded is None:
+            raise ReplayMiss(f"No archived response for {_archive_key(request)}", request=request)
+        status, headers, body = recorded
+        return httpx.Response(status, headers=headers, stream=httpx.ByteStream(body), extensions={"replayed": True})
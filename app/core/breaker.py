@@ -0,0 +1,159 @@
+import time
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+import httpx
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+upstream_circuit_transitions_total = registry.counter(
+    "upstream_circuit_transitions_total", "Circuit breaker state changes, by host and the state entered.", ("host", "state"))
+upstream_circuit_rejected_total = registry.counter(
+    "upstream_circuit_rejected_total", "Upstream fetches refused without a network call because the host's circuit was open.", ("host",))
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of calling a host whose circuit is open."""
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"{host} is unavailable (circuit open), retry in {retry_after:.0f}s")
+        self.host = host
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker for one host, driven by the error and slow-call rates over a rolling window.
+
+    Closed: calls go through and their outcomes are recorded. Open: calls fail immediately for `open_seconds`.
+    Half-open: up to `probes` calls are let through; that many successes close the circuit, any failure reopens it.
+    """
+
+    def __init__(self, host: str, window: float, min_calls: int, error_rate: float, slow_call_seconds: float,
+                 slow_call_rate: float, open_seconds: float, probes: int):
+        self.host = host
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.rejected = 0
+        # (finished at, failed, slow) for calls in the window, with running totals
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()
+        self._failures = 0
+        self._slow = 0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+    def allow(self) -> bool:
+        """Admit a call or raise CircuitOpenError. Returns True if the call is a half-open probe."""
+        if self.state == OPEN:
+            remaining = self.opened_at + self.open_seconds - time.monotonic()
+            if remaining > 0:
+                self._reject(remaining)
+            self._transition(HALF_OPEN)
+            self._probes_in_flight = self._probe_successes = 0
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= self.probes:
+                self._reject(1.0)
+            self._probes_in_flight += 1
+            return True
+        return False
+
+    def record(self, probe: bool, failed: Optional[bool], duration: float):
+        """Record a finished call. `failed` is None when the call never got an answer either way, e.g. it was cancelled."""
+        if probe:
+            self._probes_in_flight -= 1
+            if failed is None or self.state != HALF_OPEN:
+                return
+            if failed or duration >= self.slow_call_seconds:
+                self._open(f"probe {'failed' if failed else f'took {duration:.1f}s'}")
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.probes:
+                self._transition(CLOSED)
+            return
+
+        # Calls admitted before the circuit opened are not evidence about the recovery being probed
+        if failed is None or self.state != CLOSED:
+            return
+        now = time.monotonic()
+        slow = duration >= self.slow_call_seconds
+        self._calls.append((now, failed, slow))
+        self._failures += failed
+        self._slow += slow
+        self._prune(now)
+
+        calls = len(self._calls)
+        if calls < self.min_calls:
+            return
+        if self._failures / calls >= self.error_rate:
+            self._open(f"{self._failures}/{calls} calls failed in the last {self.window:.0f}s")
+        elif self._slow / calls >= self.slow_call_rate:
+            self._open(f"{self._slow}/{calls} calls took over {self.slow_call_seconds:.1f}s in the last {self.window:.0f}s")
+
+    def _prune(self, now: float):
+        while self._calls and self._calls[0][0] <= now - self.window:
+            _, failed, slow = self._calls.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+    def _reject(self, retry_after: float):
+        self.rejected += 1
+        upstream_circuit_rejected_total.inc(self.host)
+        raise CircuitOpenError(self.host, retry_after)
+
+    def _open(self, reason: str):
+        logger.warning(f"Opening circuit for {self.host} for {self.open_seconds:.0f}s: {reason}")
+        self.opened_at = time.monotonic()
+        self._transition(OPEN)
+
+    def _transition(self, state: str):
+        if state != OPEN:
+            logger.info(f"Circuit for {self.host} is now {state}")
+        self.state = state
+        self._calls.clear()
+        self._failures = self._slow = 0
+        upstream_circuit_transitions_total.inc(self.host, state)
+
+    def stats(self) -> Dict[str, Any]:
+        self._prune(time.monotonic())
+        calls = len(self._calls)
+        stats = {
+            "state": self.state,
+            "calls": calls,
+            "error_rate": round(self._failures / calls, 4) if calls else 0.0,
+            "slow_call_rate": round(self._slow / calls, 4) if calls else 0.0,
+            "rejected": self.rejected,
+        }
+        if self.state == OPEN:
+            stats["retry_after"] = round(max(0.0, self.opened_at + self.open_seconds - time.monotonic()), 1)
+        return stats
+
+
+class CircuitBreakers:
+    """One breaker per upstream host, created on first use with the shared thresholds."""
+
+    def __init__(self, **thresholds):
+        self.thresholds = thresholds
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, host: str) -> CircuitBreaker:
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers[host] = CircuitBreaker(host, **self.thresholds)
+        return breaker
+
+    def states(self) -> Dict[str, str]:
+        # Reading the state does not advance open -> half-open; that happens when the next call is admitted
+        return {host: breaker.state for host, breaker in sorted(self._breakers.items())}
+
+    def stats(self) -> Dict[str, Any]:
+        return {host: breaker.stats() for host, breaker in sorted(self._breakers.items())}
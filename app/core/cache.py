@@ -0,0 +1,554 @@
+import os
+import gzip
+import json
+import time
+import base64
+import hashlib
+import inspect
+import logging
+import tempfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from email.utils import formatdate
+from typing import Any, Dict, List, Optional
+import httpx
+from fastapi import params, Request
+from fastapi.exceptions import ResponseValidationError
+from starlette.exceptions import HTTPException
+from starlette.responses import Response
+from pydantic_core import to_json
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.timing import span
+from app.core.deadline import is_partial
+from app.core.admission import admission
+from app.core.hotkeys import hot_keys
+from app.core.peers import PEER_HEADER, PEER_TTL_HEADER, peer_cache
+
+logger = logging.getLogger(__name__)
+
+# Rough per-entry bookkeeping cost (key string, entry object, dict slot) on top of the payload
+ENTRY_OVERHEAD_BYTES = 256
+
+_MISSING = object()
+
+# Headers of an owner's answer that say how it may be reused, kept when a peer serves it on
+OWNER_HEADERS = ("cache-control", "warning", "x-partial-response")
+
+
+@dataclass
+class Refresh:
+    """Set while the cache warmer visits a path: the keys it found cached or stored. Forced visits skip the lookup."""
+    force: bool = True
+    found: List[str] = field(default_factory=list)
+    stored: List[str] = field(default_factory=list)
+
+
+_refresh: ContextVar[Optional[Refresh]] = ContextVar("cache_refresh", default=None)
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    family: str
+    size: int
+    expires_at: float
+
+
+def strong_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against `etag`, as RFC 9110 requires for GET."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    etag = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
+
+
+@dataclass
+class CachedBody:
+    body: bytes
+    gzip_body: Optional[bytes] = None
+    media_type: str = "application/json"
+    etag: str = ""
+    last_modified: str = ""
+
+    @property
+    def gzip_etag(self) -> str:
+        return self.etag[:-1] + '-gzip"'
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + len(self.gzip_body or b"") + ENTRY_OVERHEAD_BYTES
+
+
+@dataclass
+class FamilyStats:
+    entries: int = 0
+    bytes: int = 0
+    max_entry_bytes: int = 0
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    rejected: int = 0
+    stale_served: int = 0
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": self.entries,
+            "bytes": self.bytes,
+            "avg_entry_bytes": self.bytes // self.entries if self.entries else 0,
+            "max_entry_bytes": self.max_entry_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "rejected": self.rejected,
+            "stale_served": self.stale_served,
+        }
+
+
+def _snapshot_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, CachedBody):
+        return {
+            "body": base64.b64encode(value.body).decode(),
+            "gzip_body": base64.b64encode(value.gzip_body).decode() if value.gzip_body is not None else None,
+            "media_type": value.media_type,
+            "etag": value.etag,
+            "last_modified": value.last_modified,
+        }
+    # Endpoint results are stored as their JSON form; FastAPI validates a dict against the response model just the same
+    return {"json": json.loads(to_json(value, fallback=str))}
+
+
+def _restore_value(data: Dict[str, Any]) -> Any:
+    if "json" in data:
+        return data["json"]
+    return CachedBody(
+        body=base64.b64decode(data["body"]),
+        gzip_body=base64.b64decode(data["gzip_body"]) if data["gzip_body"] is not None else None,
+        media_type=data["media_type"],
+        etag=data["etag"],
+        last_modified=data["last_modified"],
+    )
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory cost of a cached value, measured as its serialized JSON length."""
+    if isinstance(value, CachedBody):
+        return value.size
+    try:
+        return len(to_json(value, fallback=str)) + ENTRY_OVERHEAD_BYTES
+    except Exception:
+        return len(repr(value)) + ENTRY_OVERHEAD_BYTES
+
+
+class ResponseCache:
+    """LRU cache bounded by the approximate serialized size of its entries rather than their count.
+
+    Expired entries are kept for `stale_seconds` so they can stand in for a failed refresh (see `get_stale`).
+    """
+
+    def __init__(self, max_bytes: int, stale_seconds: int = 0):
+        self.max_bytes = max_bytes
+        self.stale_seconds = stale_seconds
+        self.current_bytes = 0
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._families: Dict[str, FamilyStats] = {}
+
+    def _family(self, family: str) -> FamilyStats:
+        stats = self._families.get(family)
+        if stats is None:
+            stats = self._families[family] = FamilyStats()
+        return stats
+
+    def get(self, key: str, family: str, default: Any = None) -> Any:
+        stats = self._family(family)
+        entry = self._entries.get(key)
+        if entry is None:
+            stats.misses += 1
+            return default
+        if entry.expires_at <= time.monotonic():
+            if entry.expires_at + self.stale_seconds <= time.monotonic():
+                self._remove(key)
+                stats.expirations += 1
+            stats.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        stats.hits += 1
+        return entry.value
+
+    def ttl_remaining(self, key: str) -> Optional[float]:
+        """Seconds until `key` expires (negative once it has), or None if it is not cached. Not counted as a lookup."""
+        entry = self._entries.get(key)
+        return entry.expires_at - time.monotonic() if entry is not None else None
+
+    def get_stale(self, key: str, family: str, default: Any = None) -> Any:
+        """An expired entry still within `stale_seconds` of its expiry, for serving when a refresh has failed."""
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at + self.stale_seconds <= time.monotonic():
+            return default
+        self._family(family).stale_served += 1
+        return entry.value
+
+    def set(self, key: str, value: Any, family: str, ttl: int, size: Optional[int] = None):
+        if size is None:
+            size = estimate_size(value)
+        stats = self._family(family)
+        if size > self.max_bytes:
+            logger.warning(f"Not caching {key}: {size} bytes exceeds the {self.max_bytes} byte cache budget")
+            stats.rejected += 1
+            return
+
+        if key in self._entries:
+            if self._remove(key).expires_at <= time.monotonic():
+                stats.expirations += 1
+
+        self._entries[key] = CacheEntry(value=value, family=family, size=size, expires_at=time.monotonic() + ttl)
+        self.current_bytes += size
+        stats.entries += 1
+        stats.bytes += size
+        stats.max_entry_bytes = max(stats.max_entry_bytes, size)
+        self._evict()
+
+    def _remove(self, key: str) -> CacheEntry:
+        entry = self._entries.pop(key)
+        self.current_bytes -= entry.size
+        stats = self._family(entry.family)
+        stats.entries -= 1
+        stats.bytes -= entry.size
+        return entry
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            entry = self._remove(key)
+            self._family(entry.family).evictions += 1
+            logger.debug(f"Evicted {key} ({entry.size} bytes) from response cache")
+
+    def save_snapshot(self, path: str) -> int:
+        """Write the unexpired entries to `path` as gzipped JSON lines, least recently used first; returns the count.
+
+        Expiry is stored as wall-clock time so the snapshot can be loaded by another process.
+        """
+        now, wall = time.monotonic(), time.time()
+        saved = 0
+        # A temp file of its own in the same directory, so workers saving at once never write into each other's file
+        # and os.replace stays an atomic rename
+        fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                   dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8", compresslevel=6) as f:
+                for key, entry in self._entries.items():
+                    if entry.expires_at <= now:
+                        continue
+                    record = {"key": key, "family": entry.family, "expires_at": wall + entry.expires_at - now,
+                              **_snapshot_value(entry.value)}
+                    f.write(json.dumps(record, separators=(",", ":")) + "\n")
+                    saved += 1
+            os.chmod(tmp, 0o644)  # mkstemp makes it owner-only
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return saved
+
+    def load_snapshot(self, path: str, mode: str) -> int:
+        """Add the entries in a snapshot written by `save_snapshot` that have not expired since; returns the count.
+
+        Entries stored in the other CACHE_MODE are skipped, since hits in each mode expect their own kind of value.
+        """
+        wall = time.time()
+        loaded = 0
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                ttl = record["expires_at"] - wall
+                if ttl <= 0 or ("json" in record) != (mode != "bytes"):
+                    continue
+                value = _restore_value(record)
+                self.set(record["key"], value, record["family"], ttl)
+                loaded += 1
+        return loaded
+
+    def clear(self):
+        self._entries.clear()
+        self.current_bytes = 0
+        for stats in self._families.values():
+            stats.entries = 0
+            stats.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_bytes": self.max_bytes,
+            "current_bytes": self.current_bytes,
+            "entries": len(self._entries),
+            "families": {name: stats.as_dict() for name, stats in sorted(self._families.items())},
+        }
+
+
+response_cache = ResponseCache(max_bytes=settings.CACHE_MAX_BYTES, stale_seconds=settings.CACHE_STALE_IF_ERROR)
+
+
+def _collect_lookups():
+    for family, stats in response_cache.stats()["families"].items():
+        yield {"family": family, "result": "hit"}, stats["hits"]
+        yield {"family": family, "result": "miss"}, stats["misses"]
+        yield {"family": family, "result": "stale"}, stats["stale_served"]
+
+
+def _collect_bytes():
+    for family, stats in response_cache.stats()["families"].items():
+        yield {"family": family}, stats["bytes"]
+
+
+registry.collected("response_cache_lookups_total", "Response cache lookups, by endpoint family and result.", "counter", _collect_lookups)
+registry.collected("response_cache_bytes", "Approximate bytes held in the response cache, by endpoint family.", "gauge", _collect_bytes)
+
+
+def _accepts_gzip(request: Request) -> bool:
+    return "gzip" in request.headers.get("accept-encoding", "")
+
+
+def _body_response(entry: CachedBody, request: Request) -> Response:
+    headers = {"vary": "Accept-Encoding", "last-modified": entry.last_modified}
+    body = entry.body
+    headers["etag"] = entry.etag
+    if entry.gzip_body is not None and _accepts_gzip(request):
+        body = entry.gzip_body
+        headers["etag"] = entry.gzip_etag
+        headers["content-encoding"] = "gzip"
+
+    if etag_matches(request.headers.get("if-none-match"), headers["etag"]):
+        headers.pop("content-encoding", None)
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=entry.media_type, headers=headers)
+
+
+async def _encode_body(request: Request, result: Any) -> CachedBody:
+    """Validate and encode `result` the way FastAPI's serialize_response would for the matched route."""
+    field = getattr(request.scope.get("route"), "response_field", None)
+    if field is None:
+        with span("serialize"):
+            body = to_json(result)
+    else:
+        with span("validate"):
+            value, errors = field.validate(result, {}, loc=("response",))
+        if errors:
+            raise ResponseValidationError(errors=errors, body=result)
+        with span("serialize"):
+            body = field.serialize_json(value, by_alias=True)
+    return _cached_body(body)
+
+
+def _cached_body(body: bytes, last_modified: Optional[str] = None) -> CachedBody:
+    gzip_body = None
+    if settings.CACHE_GZIP and len(body) >= settings.CACHE_GZIP_MIN_BYTES:
+        gzip_body = gzip.compress(body, compresslevel=6)
+    return CachedBody(body=body, gzip_body=gzip_body, etag=strong_etag(body),
+                      last_modified=last_modified or formatdate(usegmt=True))
+
+
+def _target(request: Request) -> str:
+    url = request.url
+    return f"{url.path}?{url.query}" if url.query else url.path
+
+
+async def _from_owner(key: str, request: Optional[Request]) -> Optional[httpx.Response]:
+    """The answer of the node owning `key` in peer mode; None when this node should fetch it upstream itself."""
+    if peer_cache is None or request is None or PEER_HEADER in request.headers or peer_cache.owns(key):
+        return None
+    return await peer_cache.fetch(peer_cache.owner(key), _target(request))
+
+
+def _peer_ttl(response: httpx.Response, ttl: int) -> float:
+    """How long to keep the owner's answer here: what is left of its entry, or 0 if it must not be cached."""
+    # Stale fallbacks and deadline-truncated answers are served but not copied
+    if "warning" in response.headers or "x-partial-response" in response.headers:
+        return 0.0
+    try:
+        return min(ttl, float(response.headers.get(PEER_TTL_HEADER, ttl)))
+    except ValueError:
+        return ttl
+
+
+def _passthrough(response: httpx.Response) -> Response:
+    return Response(content=response.content, status_code=response.status_code,
+                    media_type=response.headers.get("content-type"),
+                    headers={name: response.headers[name] for name in OWNER_HEADERS if name in response.headers})
+
+
+def _stale_if_error(key: str, family: str, error: Exception) -> Any:
+    """The expired entry for `key` if `error` is a server-side failure, such as an upstream being down; else _MISSING."""
+    if isinstance(error, HTTPException) and error.status_code < 500:
+        return _MISSING
+    value = response_cache.get_stale(key, family, _MISSING)
+    if value is not _MISSING:
+        logger.warning(f"Serving stale {key} after error: {error}")
+    return value
+
+
+def _stale_response(entry: CachedBody, request: Request) -> Response:
+    """Serve a stale fallback so that nothing downstream stores it as fresh."""
+    response = _body_response(entry, request)
+    response.headers["cache-control"] = "no-cache"
+    response.headers["warning"] = '110 - "Response is Stale"'
+    return response
+
+
+def _owner_response(key: str, response: Response, request: Request) -> Response:
+    """Tell a peer that forwarded the request how long the entry has left, so its copy expires along with ours."""
+    if PEER_HEADER in request.headers and response.status_code == 200:
+        remaining = response_cache.ttl_remaining(key)
+        if remaining is not None:
+            response.headers[PEER_TTL_HEADER] = f"{max(0.0, remaining):.0f}"
+    return response
+
+
+@contextmanager
+def refreshing(force: bool = True):
+    """Record the cache keys behind the cached endpoints called inside this block. With `force`, lookups are skipped
+    so the endpoints run and store fresh entries."""
+    refresh = Refresh(force)
+    token = _refresh.set(refresh)
+    try:
+        yield refresh
+    finally:
+        _refresh.reset(token)
+
+
+def cached(family: str, ttl: int):
+    """Cache an endpoint's result under `family`, keyed by its non-dependency arguments.
+
+    In "bytes" mode the final encoded body is cached and served through a raw `Response`,
+    so hits skip response model validation and JSON encoding entirely. Misses go through admission
+    control. When the endpoint fails with a server error or is shed, an expired entry within
+    CACHE_STALE_IF_ERROR is served instead.
+    """
+    def decorator(func):
+        admission.register(family)
+        signature = inspect.signature(func)
+        key_params = [
+            name for name, param in signature.parameters.items()
+            if not isinstance(param.default, params.Depends)
+        ]
+
+        async def call(*args, **kwargs):
+            # Cache hits never get here, so load shedding only ever turns away upstream-bound work
+            if not settings.ADMISSION_ENABLED:
+                return await func(*args, **kwargs)
+            with admission.admit(family):
+                return await func(*args, **kwargs)
+
+        @wraps(func)
+        async def wrapper(*args, cache_request: Optional[Request] = None, **kwargs):
+            if not settings.CACHE_ENABLED:
+                return await call(*args, **kwargs)
+
+            arguments = signature.bind_partial(*args, **kwargs).arguments
+            key = family + "?" + "&".join(f"{name}={arguments[name]}" for name in key_params if name in arguments)
+            refresh = _refresh.get()
+            # Keyed by the cache key, so equivalent URLs (defaults spelled out or not, parameter order) count as one
+            if settings.HOT_KEYS_ENABLED and cache_request is not None and refresh is None:
+                hot_keys.add(key, _target(cache_request))
+
+            if settings.CACHE_MODE == "bytes":
+                # Direct calls from other endpoints have no request to encode for
+                if cache_request is None:
+                    return await call(*args, **kwargs)
+                if refresh is None or not refresh.force:
+                    with span("cache", family):
+                        entry = response_cache.get(key, family)
+                    if entry is not None:
+                        logger.debug(f"Response cache hit for {key}")
+                        if refresh is not None:
+                            refresh.found.append(key)
+                        return _owner_response(key, _body_response(entry, cache_request), cache_request)
+
+                owner_response = await _from_owner(key, cache_request)
+                if owner_response is not None:
+                    if owner_response.status_code != 200:
+                        return _passthrough(owner_response)
+                    entry = _cached_body(owner_response.content, owner_response.headers.get("last-modified"))
+                    peer_ttl = _peer_ttl(owner_response, ttl)
+                    if peer_ttl > 0:
+                        response_cache.set(key, entry, family, peer_ttl, size=entry.size)
+                        if refresh is not None:
+                            refresh.stored.append(key)
+                    response = _body_response(entry, cache_request)
+                    for name in OWNER_HEADERS:
+                        if name in owner_response.headers:
+                            response.headers[name] = owner_response.headers[name]
+                    return response
+
+                try:
+                    result = await call(*args, **kwargs)
+                except Exception as e:
+                    entry = _stale_if_error(key, family, e)
+                    if entry is _MISSING:
+                        raise
+                    return _stale_response(entry, cache_request)
+                if isinstance(result, Response):
+                    return result
+                entry = await _encode_body(cache_request, result)
+                # Parts skipped to meet the request's deadline must not be served to later callers
+                if not is_partial():
+                    response_cache.set(key, entry, family, ttl, size=entry.size)
+                    if refresh is not None:
+                        refresh.stored.append(key)
+                return _owner_response(key, _body_response(entry, cache_request), cache_request)
+
+            if refresh is None or not refresh.force:
+                with span("cache", family):
+                    result = response_cache.get(key, family, _MISSING)
+                if result is not _MISSING:
+                    logger.debug(f"Response cache hit for {key}")
+                    if refresh is not None:
+                        refresh.found.append(key)
+                    return result
+
+            # Object mode has no response to put PEER_TTL_HEADER on, so copies here live for the full TTL
+            owner_response = await _from_owner(key, cache_request)
+            if owner_response is not None:
+                # Errors and stale or partial answers are passed on with their headers rather than copied
+                if owner_response.status_code != 200 or _peer_ttl(owner_response, ttl) <= 0:
+                    return _passthrough(owner_response)
+                result = owner_response.json()
+                response_cache.set(key, result, family, ttl)
+                if refresh is not None:
+                    refresh.stored.append(key)
+                return result
+
+            try:
+                result = await call(*args, **kwargs)
+            except Exception as e:
+                result = _stale_if_error(key, family, e)
+                if result is _MISSING:
+                    raise
+                # Direct calls from other endpoints get the bare result, as they do on a hit
+                if cache_request is None:
+                    return result
+                return _stale_response(await _encode_body(cache_request, result), cache_request)
+            if not is_partial():
+                response_cache.set(key, result, family, ttl)
+                if refresh is not None:
+                    refresh.stored.append(key)
+            return result
+
+        # Let FastAPI inject the request so bytes mode can honour Accept-Encoding
+        wrapper.__signature__ = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter("cache_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+        ])
+        return wrapper
+    return decorator
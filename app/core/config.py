@@ -1,10 +1,155 @@
+from typing import Dict, List
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8000
     LOG_LEVEL: str = "INFO"
+    METRICS_ENABLED: bool = True
+    ERROR_DETAIL_LOGS_PER_MINUTE: int = 30
+    CANCEL_ON_DISCONNECT: bool = True
+
+    # Admission control: at most this many requests per route group doing upstream work at once (0 = unlimited).
+    # Sized at roughly the group's upstream rate limit times its request deadline; beyond that requests would only
+    # queue until they time out. Cache hits are never counted or shed
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_IN_FLIGHT: Dict[str, int] = {"anime": 32, "weather": 48, "phones": 32, "heroes": 64, "books": 32}
+    ADMISSION_DEFAULT_MAX_IN_FLIGHT: int = 32
+    ADMISSION_RETRY_AFTER: int = 2
+
+    # Request deadlines in seconds (0 disables): the longest matching path prefix wins, and clients can shorten theirs
+    # with an X-Request-Deadline header. Upstream fetches get whatever time is left
+    REQUEST_DEADLINE: float = 30.0
+    REQUEST_DEADLINES: Dict[str, float] = {"/weather": 10.0, "/phones": 15.0, "/hero": 15.0, "/anime": 15.0, "/books": 20.0}
+
+    # Admin endpoints, which require the X-Admin-Token header to match ADMIN_TOKEN
+    ADMIN_TOKEN: str = ""
+    PROFILING_ENABLED: bool = False
+
+    # Event loop lag monitor
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_MONITOR_INTERVAL: float = 0.05
+    LOOP_LAG_THRESHOLD: float = 0.1
+
+    # Server-Timing response header
+    SERVER_TIMING_ENABLED: bool = True
+    SERVER_TIMING_SAMPLE_RATE: float = 0.01  # the header is public; sample more only while investigating
+    SERVER_TIMING_SAMPLE_RATES: Dict[str, float] = {}  # path prefix -> rate, e.g. {"/anime/mal/details": 0.1}
+    SERVER_TIMING_LOG: bool = False
+
+    # Response cache
+    CACHE_ENABLED: bool = True
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_MODE: str = "bytes"  # "bytes" stores encoded response bodies, "object" stores endpoint results
+    CACHE_GZIP: bool = True
+    CACHE_GZIP_MIN_BYTES: int = 1024
+    CACHE_STALE_IF_ERROR: int = 86400  # seconds past expiry an entry may still be served when the upstream fails
+    CACHE_TTL_ANIME: int = 3600
+    CACHE_TTL_WEATHER: int = 600
+    CACHE_TTL_PHONES: int = 86400
+    CACHE_TTL_HEROES: int = 86400
+    CACHE_TTL_BOOKS: int = 3600
+    # Warm restarts: unexpired entries are written here (gzipped JSON lines) on shutdown and loaded again at startup.
+    # Empty disables it. `python cache_snapshot.py` builds one before a deploy takes traffic
+    CACHE_SNAPSHOT_PATH: str = "cache_snapshot.jsonl.gz"
+    # Peer mode for replicas behind a load balancer: every node lists the same CACHE_PEERS (base URLs, including its own,
+    # given again as CACHE_PEER_SELF). Each cache key is owned by one node by consistent hashing; the others ask the
+    # owner on a miss before going upstream. Empty disables it
+    CACHE_PEERS: List[str] = []
+    CACHE_PEER_SELF: str = ""
+    CACHE_PEER_VNODES: int = 128
+    CACHE_PEER_CONNECT_TIMEOUT: float = 0.5
+    CACHE_PEER_TIMEOUT: float = 20.0
+    # Hot paths re-requested at prefetch priority shortly before their entries expire, so they are never served cold.
+    # Each refresh is due LEAD seconds before expiry plus up to JITTER more; failed refreshes are retried after RETRY
+    CACHE_WARMER_ENABLED: bool = True
+    CACHE_WARMER_PATHS: List[str] = [
+        "/anime/mal/schedule",
+        "/anime/mal/season",
+        "/anime/mal/top?page=1",
+        "/anime/mal/top?page=2",
+        "/anime/mal/top?page=3",
+        "/anime/mal/top?page=4",
+        "/phones/gsmarena/top",
+    ]
+    CACHE_WARMER_LEAD_SECONDS: float = 120.0
+    CACHE_WARMER_JITTER_SECONDS: float = 60.0
+    CACHE_WARMER_RETRY_SECONDS: float = 60.0
+    # The warmer also keeps the most requested cache keys warm: up to this many, once seen at least MIN_COUNT times
+    # (counts are halved every HOT_KEYS_DECAY_SECONDS), re-read every SYNC seconds
+    CACHE_WARMER_HOT_KEYS: int = 16
+    CACHE_WARMER_HOT_MIN_COUNT: int = 10
+    CACHE_WARMER_HOT_SYNC_SECONDS: float = 60.0
+    # Heavy-hitter tracking of cache keys: a count-min sketch (about e/WIDTH relative error) plus the top K keys
+    HOT_KEYS_ENABLED: bool = True
+    HOT_KEYS_TOP_K: int = 64
+    HOT_KEYS_SKETCH_WIDTH: int = 4096
+    HOT_KEYS_SKETCH_DEPTH: int = 4
+    HOT_KEYS_DECAY_SECONDS: float = 3600.0
+
+    # Upstream fetch layer
+    UPSTREAM_TIMEOUT: float = 5.0
+    UPSTREAM_BASE_URL: str = ""  # e.g. http://127.0.0.1:9000 to send every upstream fetch to benchmarks/stub_upstream.py
+    UPSTREAM_MAX_CONNECTIONS: int = 100
+    UPSTREAM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    UPSTREAM_REVALIDATE: bool = True
+    UPSTREAM_REVALIDATE_MAX_URLS: int = 256
+    UPSTREAM_REVALIDATE_MAX_BYTES: int = 16 * 1024 * 1024  # stored bodies; least recently used URLs go first
+    # Per-host scheduling: at most max_in_flight concurrent fetches and `rate` requests/sec with bursts of `burst`.
+    # Keys match the host and its subdomains; hosts not listed get the defaults (0 means unlimited)
+    UPSTREAM_SCHEDULER_ENABLED: bool = True
+    UPSTREAM_HOST_LIMITS: Dict[str, Dict[str, float]] = {
+        "myanimelist.net": {"max_in_flight": 4, "rate": 2.0, "burst": 4},
+        "timeanddate.com": {"max_in_flight": 8, "rate": 5.0, "burst": 10},
+        "wunderground.com": {"max_in_flight": 8, "rate": 5.0, "burst": 10},
+        "hero.fandom.com": {"max_in_flight": 8, "rate": 5.0, "burst": 10},
+        "gsmarena.com": {"max_in_flight": 4, "rate": 2.0, "burst": 4},
+        "webproxy.lumiproxy.com": {"max_in_flight": 4, "rate": 2.0, "burst": 4},  # proxy in front of GSMArena
+        "libgen.is": {"max_in_flight": 4, "rate": 2.0, "burst": 4},
+        "libgen.li": {"max_in_flight": 4, "rate": 2.0, "burst": 4},
+        "library.lol": {"max_in_flight": 4, "rate": 2.0, "burst": 4},
+    }
+    UPSTREAM_DEFAULT_MAX_IN_FLIGHT: int = 16
+    UPSTREAM_DEFAULT_RATE: float = 0.0
+    UPSTREAM_QUEUE_TIMEOUT: float = 10.0
+    # Weighted fair queuing between priority classes sharing a host's limits. Background classes (anything but
+    # interactive) never start while interactive fetches are queued and hold at most this share of a host's slots
+    UPSTREAM_PRIORITY_WEIGHTS: Dict[str, float] = {"interactive": 16.0, "prefetch": 4.0, "crawl": 1.0}
+    UPSTREAM_BACKGROUND_MAX_SHARE: float = 0.5
+    UPSTREAM_COALESCE: bool = True  # concurrent identical fetches share one request
+    # Per-host circuit breaker: opens when, over the window, the error or slow-call rate reaches its threshold
+    CIRCUIT_BREAKER_ENABLED: bool = True
+    CIRCUIT_WINDOW_SECONDS: float = 30.0
+    CIRCUIT_MIN_CALLS: int = 10
+    CIRCUIT_ERROR_RATE: float = 0.5
+    CIRCUIT_SLOW_CALL_SECONDS: float = 4.0
+    CIRCUIT_SLOW_CALL_RATE: float = 0.8
+    CIRCUIT_OPEN_SECONDS: float = 30.0
+    CIRCUIT_HALF_OPEN_PROBES: int = 1
+    # Hedged requests: a duplicate fetch when the first has not answered within the host's observed percentile.
+    # host -> hedge budget as a fraction of that host's requests; only listed hosts (and their subdomains) are hedged
+    UPSTREAM_HEDGING_ENABLED: bool = True
+    UPSTREAM_HEDGE_HOSTS: Dict[str, float] = {"webproxy.lumiproxy.com": 0.1}
+    UPSTREAM_HEDGE_PERCENTILE: float = 0.9
+    UPSTREAM_HEDGE_MIN_SAMPLES: int = 20
+    UPSTREAM_HEDGE_MIN_DELAY: float = 0.05
+    # Retries for connect errors, timeouts, 429 and 5xx: full-jitter exponential backoff or the upstream's Retry-After,
+    # no retry started past the deadline, and a process-wide budget of roughly RATIO retries per request
+    UPSTREAM_RETRY_ENABLED: bool = True
+    UPSTREAM_RETRY_MAX_ATTEMPTS: int = 3
+    UPSTREAM_RETRY_BACKOFF_BASE: float = 0.2
+    UPSTREAM_RETRY_BACKOFF_MAX: float = 2.0
+    UPSTREAM_RETRY_DEADLINE: float = 10.0
+    UPSTREAM_RETRY_BUDGET_RATIO: float = 0.2
+    UPSTREAM_RETRY_BUDGET_MIN_PER_SECOND: float = 1.0
+    PARSE_MEMO_ENABLED: bool = True
+    PARSE_MEMO_MAX_ENTRIES: int = 512
+
+    # Upstream record/replay: archive a sample of live responses, or serve only from the archive
+    UPSTREAM_ARCHIVE_PATH: str = "upstream_archive.sqlite3"
+    UPSTREAM_RECORD_SAMPLE_RATE: float = 0.0
+    UPSTREAM_REPLAY: bool = False
 
     model_config = SettingsConfigDict(env_file=".env")
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
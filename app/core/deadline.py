@@ -0,0 +1,55 @@
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import List, Optional
+import httpx
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """Raised instead of starting or continuing upstream work that cannot finish before the request's deadline."""
+
+
+@dataclass
+class Deadline:
+    expires_at: float
+    # Parts of the response left out because the deadline ran out, e.g. ["astronomy"]
+    omitted: List[str] = field(default_factory=list)
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+
+_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def start_deadline(seconds: float) -> Deadline:
+    deadline = Deadline(time.monotonic() + seconds)
+    _deadline.set(deadline)
+    return deadline
+
+
+def clear_deadline():
+    """Run the rest of the current task without a deadline, for work shared by requests with different deadlines."""
+    _deadline.set(None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the request being served, or None outside a request or when it has no deadline."""
+    deadline = _deadline.get()
+    return deadline.remaining() if deadline is not None else None
+
+
+def omit(part: str):
+    """Record that `part` of the response was skipped to meet the deadline, so the response is not cached as complete."""
+    deadline = _deadline.get()
+    if deadline is not None:
+        deadline.omitted.append(part)
+
+
+def is_partial() -> bool:
+    deadline = _deadline.get()
+    return deadline is not None and bool(deadline.omitted)
@@ -0,0 +1,105 @@
+import math
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+from app.core.metrics import registry
+from app.core.scheduler import match_host
+
+# Unused budget carries over, but only up to this many hedges, so a long quiet spell cannot fund a burst
+MAX_CREDIT = 10.0
+# Recompute the percentile after this many new samples rather than on every request
+RESORT_EVERY = 16
+
+upstream_hedges_total = registry.counter(
+    "upstream_hedges_total",
+    "Hedging decisions for slow upstream fetches, by host: won or lost against the first attempt, or skipped for lack of budget.",
+    ("host", "result"))
+
+
+class HostHedging:
+    """Latency window and hedge budget for one host.
+
+    Every request earns `budget` of a hedge, so over time at most that fraction of the host's requests are duplicated.
+    """
+
+    def __init__(self, host: str, budget: float, percentile: float, min_samples: int, min_delay: float, samples: int = 256):
+        self.host = host
+        self.budget = budget
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.latencies: Deque[float] = deque(maxlen=samples)
+        self.credit = 0.0
+        self.requests = 0
+        self.hedged = 0
+        self.won = 0
+        self.skipped = 0
+        self._threshold: Optional[float] = None
+        self._unsorted = 0
+
+    def observe(self, duration: float):
+        self.latencies.append(duration)
+        self._unsorted += 1
+        if self._unsorted >= RESORT_EVERY or self._threshold is None:
+            self._recompute()
+
+    def _recompute(self):
+        self._unsorted = 0
+        if len(self.latencies) < self.min_samples:
+            self._threshold = None
+            return
+        ordered = sorted(self.latencies)
+        self._threshold = ordered[min(len(ordered) - 1, math.ceil(self.percentile * len(ordered)) - 1)]
+
+    def delay(self) -> Optional[float]:
+        """How long to give the first attempt before hedging, or None until enough latencies have been seen."""
+        self.requests += 1
+        self.credit = min(MAX_CREDIT, self.credit + self.budget)
+        if self._threshold is None:
+            return None
+        return max(self.min_delay, self._threshold)
+
+    def take(self) -> bool:
+        if self.credit < 1.0:
+            self.skipped += 1
+            upstream_hedges_total.inc(self.host, "skipped")
+            return False
+        self.credit -= 1.0
+        self.hedged += 1
+        return True
+
+    def settle(self, hedge_won: bool):
+        self.won += hedge_won
+        upstream_hedges_total.inc(self.host, "won" if hedge_won else "lost")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "budget": self.budget,
+            f"p{round(self.percentile * 100)}_seconds": round(self._threshold, 4) if self._threshold is not None else None,
+            "samples": len(self.latencies),
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_won": self.won,
+            "skipped": self.skipped,
+            "credit": round(self.credit, 2),
+        }
+
+
+class Hedging:
+    """Hedging state for the hosts that opted in, keyed like UPSTREAM_HOST_LIMITS (a domain covers its subdomains)."""
+
+    def __init__(self, budgets: Dict[str, float], percentile: float, min_samples: int, min_delay: float):
+        self.budgets = {domain.lower(): budget for domain, budget in budgets.items() if budget > 0}
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._hosts: Dict[str, Optional[HostHedging]] = {}
+
+    def for_host(self, host: str) -> Optional[HostHedging]:
+        if host not in self._hosts:
+            budget = match_host(host, self.budgets)
+            self._hosts[host] = None if budget is None else HostHedging(
+                host, budget, self.percentile, self.min_samples, self.min_delay)
+        return self._hosts[host]
+
+    def stats(self) -> Dict[str, Any]:
+        return {host: hedging.stats() for host, hedging in sorted(self._hosts.items()) if hedging is not None}
@@ -0,0 +1,127 @@
+import math
+import time
+import heapq
+import hashlib
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+
+# Keys whose URL is longer than this are counted but never enter the top-K, which stores the URL
+MAX_URL_LENGTH = 512
+
+
+class CountMinSketch:
+    """Fixed-size frequency estimates for an unbounded set of keys.
+
+    `depth` rows of `width` counters; a key's estimate is the smallest of its counters, which overestimates by at most
+    about e/width of the total count with probability 1 - e^-depth. Updates are conservative (only counters at the
+    current minimum are raised), which tightens the overestimate for heavy keys.
+    """
+
+    def __init__(self, width: int, depth: int):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self._rows = [array("L", bytes(array("L").itemsize * width)) for _ in range(depth)]
+
+    def _indexes(self, key: str) -> List[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        # Double hashing: row i uses h1 + i * h2, which is as good as independent hashes for this purpose
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, key: str) -> int:
+        """Count one occurrence of `key` and return its new estimate."""
+        indexes = self._indexes(key)
+        estimate = min(row[i] for row, i in zip(self._rows, indexes)) + 1
+        for row, i in zip(self._rows, indexes):
+            if row[i] < estimate:
+                row[i] = estimate
+        self.total += 1
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        return min(row[i] for row, i in zip(self._rows, self._indexes(key)))
+
+    def halve(self):
+        for row in self._rows:
+            for i, count in enumerate(row):
+                if count:
+                    row[i] = count >> 1
+        self.total >>= 1
+
+
+class HeavyHitters:
+    """The `k` most requested cache keys, with the URL that last asked for each, in bounded memory.
+
+    Counts come from a count-min sketch, so tracking cost does not grow with the number of distinct keys seen. The
+    top-K is a min-heap whose entries may lag behind the sketch; since counts only grow between decays, a lagging
+    entry is a lower bound and is brought up to date only when it reaches the top of the heap.
+    Every `decay_seconds` all counts are halved, so the ranking follows recent traffic rather than all-time totals.
+    """
+
+    def __init__(self, k: int, width: int, depth: int, decay_seconds: float):
+        self.k = k
+        self.decay_seconds = decay_seconds
+        self.sketch = CountMinSketch(width, depth)
+        self._top: Dict[str, Tuple[int, str]] = {}
+        self._heap: List[Tuple[int, str]] = []
+        self._decayed_at = time.monotonic()
+
+    def add(self, key: str, url: str):
+        if self.decay_seconds and time.monotonic() - self._decayed_at >= self.decay_seconds:
+            self._decay()
+        count = self.sketch.add(key)
+        if key in self._top:
+            self._top[key] = (count, url)
+            return
+        if len(url) > MAX_URL_LENGTH or self.k <= 0:
+            return
+        if len(self._top) < self.k:
+            self._top[key] = (count, url)
+            heapq.heappush(self._heap, (count, key))
+            return
+        # Heap counts never exceed the real ones, so losing to the heap's root means losing to every tracked key
+        if count <= self._heap[0][0]:
+            return
+        while True:
+            stored, smallest = self._heap[0]
+            current = self._top[smallest][0]
+            if current == stored:
+                break
+            heapq.heapreplace(self._heap, (current, smallest))
+        if count > stored:
+            heapq.heapreplace(self._heap, (count, key))
+            del self._top[smallest]
+            self._top[key] = (count, url)
+
+    def _decay(self):
+        self._decayed_at = time.monotonic()
+        self.sketch.halve()
+        self._top = {key: (count >> 1, url) for key, (count, url) in self._top.items()}
+        self._heap = [(count, key) for key, (count, _) in self._top.items()]
+        heapq.heapify(self._heap)
+
+    def top(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        ranked = sorted(self._top.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        return [{"key": key, "url": url, "count": count} for key, (count, url) in ranked]
+
+    def stats(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "k": self.k,
+            "sketch_width": self.sketch.width,
+            "sketch_depth": self.sketch.depth,
+            "total": self.sketch.total,
+            # Counts may overestimate by up to this much (with high probability)
+            "max_overestimate": round(self.sketch.total * math.e / self.sketch.width),
+            "seconds_since_decay": round(time.monotonic() - self._decayed_at),
+            "keys": self.top(limit),
+        }
+
+
+hot_keys = HeavyHitters(
+    k=settings.HOT_KEYS_TOP_K,
+    width=settings.HOT_KEYS_SKETCH_WIDTH,
+    depth=settings.HOT_KEYS_SKETCH_DEPTH,
+    decay_seconds=settings.HOT_KEYS_DECAY_SECONDS,
+)
@@ -0,0 +1,97 @@
+import sys
+import time
+import asyncio
+import logging
+import threading
+from typing import Optional, Tuple
+from app.core.metrics import registry
+from app.core.profiling import frame_label
+
+logger = logging.getLogger(__name__)
+
+event_loop_lag_seconds = registry.histogram(
+    "event_loop_lag_seconds", "How late the loop monitor's scheduled wake-ups fired.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+event_loop_blocked_total = registry.counter(
+    "event_loop_blocked_total", "Wake-ups later than the lag threshold, by the route handler and code holding the loop.",
+    ("handler", "holder"))
+
+
+def _blame(frame) -> Tuple[str, str]:
+    """Outermost app.api frame (the route handler) and innermost app frame (the code actually running)."""
+    handler, holder = "unknown", "unknown"
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("app.") and module != __name__:
+            if holder == "unknown":
+                holder = frame_label(frame)
+            if module.startswith("app.api."):
+                handler = frame_label(frame)
+        frame = frame.f_back
+    return handler, holder
+
+
+class LoopLagMonitor:
+    """Measures event loop lag by sleeping `interval` and timing how late the wake-up comes.
+
+    A watchdog thread checks the loop's heartbeat; once it is overdue by more than `threshold` it grabs the loop
+    thread's stack, so the warning names the handler and scraper method that blocked rather than whoever ran next.
+    """
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1):
+        self.interval = interval
+        self.threshold = threshold
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop_thread = 0
+        self._expected = 0.0
+        self._culprit: Optional[Tuple[str, str]] = None
+
+    def start(self):
+        self._loop_thread = threading.get_ident()
+        self._expected = time.monotonic() + self.interval
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def _sample(self):
+        while True:
+            self._expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(time.monotonic() - self._expected, 0.0)
+            event_loop_lag_seconds.observe(lag)
+            if lag > self.threshold:
+                handler, holder = self._culprit or ("unknown", "unknown")
+                event_loop_blocked_total.inc(handler, holder)
+                logger.warning(f"Event loop blocked for {lag * 1000:.0f}ms by {holder} (handler {handler})")
+            self._culprit = None
+
+    def _watch(self):
+        check_every = max(self.threshold / 2, 0.005)
+        while not self._stopped.wait(check_every):
+            if self._culprit is not None or time.monotonic() - self._expected <= self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            try:
+                self._culprit = _blame(frame)
+            except Exception:
+                # Losing the name of one culprit is better than losing the watchdog thread
+                logger.exception("Could not name the code blocking the event loop")
+                self._culprit = ("unknown", "unknown")
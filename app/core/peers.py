@@ -0,0 +1,151 @@
+import time
+import bisect
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+import httpx
+from app.core.config import settings
+from app.core.breaker import CircuitBreakers, CircuitOpenError
+from app.core.deadline import remaining
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Sent on requests forwarded to a key's owner, naming the sender; the owner answers itself and never forwards again
+PEER_HEADER = "x-cache-peer"
+# Sent back by the owner in bytes mode: seconds its entry has left, so the forwarding node's copy expires with it
+PEER_TTL_HEADER = "x-cache-ttl"
+
+cache_peer_requests_total = registry.counter(
+    "cache_peer_requests_total",
+    "Cache misses forwarded to the node owning the key, by peer and result: the status, or unavailable when the miss "
+    "was served locally instead.", ("peer", "result"))
+
+
+def _point(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of keys onto nodes.
+
+    Each node gets `vnodes` points on the ring and a key belongs to the first point at or after its hash, so keys
+    spread evenly and adding or removing a node only moves the keys on that node's arcs.
+    """
+
+    def __init__(self, nodes: List[str], vnodes: int):
+        ring = sorted((_point(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self._points = [point for point, _ in ring]
+        self._nodes = [node for _, node in ring]
+
+    def owner(self, key: str) -> str:
+        return self._nodes[bisect.bisect(self._points, _point(key)) % len(self._points)]
+
+
+class PeerCache:
+    """Shares one response cache across replicas: each key is owned by one node, and the others ask the owner on a miss
+    instead of going upstream, so every key is fetched upstream about once however many replicas there are.
+
+    Each peer has a circuit breaker; while the owner is down or slow the miss is served locally, as without peers.
+    """
+
+    def __init__(self, self_url: str, peers: List[str], vnodes: int, connect_timeout: float, timeout: float,
+                 **breaker_thresholds):
+        self.self_url = self_url.rstrip("/")
+        self.peers = sorted({peer.rstrip("/") for peer in peers})
+        if self.self_url not in self.peers:
+            raise ValueError(f"CACHE_PEER_SELF {self_url!r} must be one of CACHE_PEERS {peers!r}")
+        self.ring = HashRing(self.peers, vnodes)
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.breakers = CircuitBreakers(**breaker_thresholds)
+        self._client: Optional[httpx.AsyncClient] = None
+        self.forwarded = 0
+        self.fallbacks = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout))
+        return self._client
+
+    def owner(self, key: str) -> str:
+        return self.ring.owner(key)
+
+    def owns(self, key: str) -> bool:
+        return self.ring.owner(key) == self.self_url
+
+    async def fetch(self, owner: str, target: str) -> Optional[httpx.Response]:
+        """GET `target` (path and query) from `owner`, or None if it is unavailable and the caller should go upstream.
+
+        Answers below 500 are returned as they are, since the owner would give the same answer to the client.
+        """
+        budget = remaining()
+        if budget is not None and budget <= 0:
+            return None
+        self.forwarded += 1
+        breaker = self.breakers.get(owner)
+        try:
+            probe = breaker.allow()
+        except CircuitOpenError:
+            return self._fallback(owner, "circuit open")
+
+        headers = {PEER_HEADER: self.self_url}
+        timeout = self.timeout
+        if budget is not None:
+            # The owner gets whatever is left of our deadline, not a fresh one of its own
+            headers["x-request-deadline"] = f"{budget:.3f}"
+            timeout = min(timeout, budget)
+        failed: Optional[bool] = None
+        started = time.perf_counter()
+        try:
+            failed = True
+            response = await self.client.get(owner + target, headers=headers,
+                                              timeout=httpx.Timeout(timeout, connect=self.connect_timeout))
+            failed = response.status_code >= 500
+        except httpx.HTTPError as e:
+            return self._fallback(owner, str(e) or type(e).__name__)
+        finally:
+            breaker.record(probe, failed, time.perf_counter() - started)
+        if failed:
+            return self._fallback(owner, f"HTTP {response.status_code}")
+        cache_peer_requests_total.inc(owner, str(response.status_code))
+        return response
+
+    def _fallback(self, owner: str, reason: str) -> None:
+        self.fallbacks += 1
+        cache_peer_requests_total.inc(owner, "unavailable")
+        logger.warning(f"Cache peer {owner} unavailable ({reason}), fetching upstream instead")
+        return None
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "self": self.self_url,
+            "peers": self.peers,
+            "forwarded": self.forwarded,
+            "fallbacks": self.fallbacks,
+            "circuits": self.breakers.stats(),
+        }
+
+
+peer_cache: Optional[PeerCache] = None
+if settings.CACHE_PEERS:
+    peer_cache = PeerCache(
+        settings.CACHE_PEER_SELF,
+        settings.CACHE_PEERS,
+        vnodes=settings.CACHE_PEER_VNODES,
+        connect_timeout=settings.CACHE_PEER_CONNECT_TIMEOUT,
+        timeout=settings.CACHE_PEER_TIMEOUT,
+        window=settings.CIRCUIT_WINDOW_SECONDS,
+        min_calls=settings.CIRCUIT_MIN_CALLS,
+        error_rate=settings.CIRCUIT_ERROR_RATE,
+        slow_call_seconds=settings.CACHE_PEER_TIMEOUT,
+        slow_call_rate=1.0,
+        open_seconds=settings.CIRCUIT_OPEN_SECONDS,
+        probes=settings.CIRCUIT_HALF_OPEN_PROBES,
+    )
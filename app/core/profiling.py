@@ -0,0 +1,183 @@
+import io
+import os
+import sys
+import time
+import asyncio
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class ProfilerStateError(RuntimeError):
+    pass
+
+
+def frame_label(frame) -> str:
+    module = frame.f_globals.get("__name__", "?")
+    # co_qualname (Class.method) is new in Python 3.11; older versions only have the bare function name
+    return f"{module}:{getattr(frame.f_code, 'co_qualname', frame.f_code.co_name)}"
+
+
+class SamplingProfiler:
+    """Samples the event loop thread's stack from a background thread and counts collapsed stacks.
+
+    Sampling from outside the loop means the requests being profiled pay nothing beyond the GIL hand-off.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="cpu-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed format, ready for flamegraph.pl or speedscope."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+
+class Profiler:
+    """On-demand CPU and allocation profiling of the live process. Only one CPU profile runs at a time."""
+
+    def __init__(self):
+        self._cpu_lock = asyncio.Lock()
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+
+    async def cpu(self, seconds: float, interval: float = 0.005, output: str = "collapsed", limit: int = 50) -> str:
+        """Profile whatever the process runs for `seconds`, returning collapsed stacks or a pstats report."""
+        if self._cpu_lock.locked():
+            raise ProfilerStateError("A CPU profile is already running")
+        async with self._cpu_lock:
+            if output == "pstats":
+                return await self._deterministic(seconds, limit)
+            sampler = SamplingProfiler(threading.get_ident(), interval)
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                sampler.stop()
+            return sampler.collapsed()
+
+    async def _deterministic(self, seconds: float, limit: int) -> str:
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile.disable()
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats("cumulative").print_stats(limit)
+        return stream.getvalue()
+
+    def start_tracing(self, frames: int = 25) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self._snapshot = None
+        return self.tracing_status()
+
+    def stop_tracing(self) -> Dict[str, Any]:
+        tracemalloc.stop()
+        self._snapshot = None
+        return self.tracing_status()
+
+    def tracing_status(self) -> Dict[str, Any]:
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit(),
+            "current_bytes": current,
+            "peak_bytes": peak,
+        }
+
+    def snapshot(self, key_type: str = "app", limit: int = 25, app_only: bool = True) -> Dict[str, Any]:
+        """Take an allocation snapshot; report the top allocation sites and the growth since the previous snapshot.
+
+        key_type "app" charges each allocation to the innermost frame in our own code (e.g. a scraper's
+        _parse_* method); the other key types are tracemalloc's own groupings.
+        """
+        if not tracemalloc.is_tracing():
+            raise ProfilerStateError("tracemalloc is not tracing; start it first")
+        started = time.perf_counter()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+        if app_only:
+            # Keep traces that passed through our code anywhere in the stack, so scraper parse paths
+            # are charged for what BeautifulSoup allocates on their behalf
+            snapshot = snapshot.filter_traces([tracemalloc.Filter(True, "*/app/*", all_frames=True)])
+        previous, self._snapshot = self._snapshot, snapshot
+
+        report = {**self.tracing_status(), "snapshot_seconds": round(time.perf_counter() - started, 4), "diff": None}
+        if key_type == "app":
+            current = _by_app_frame(snapshot)
+            report["top"] = [{"where": where, "size_bytes": size, "count": count}
+                             for where, (size, count) in sorted(current.items(), key=lambda item: -item[1][0])[:limit]]
+            if previous is not None:
+                report["diff"] = _app_frame_diff(current, _by_app_frame(previous))[:limit]
+            return report
+
+        report["top"] = [_stat_dict(stat) for stat in snapshot.statistics(key_type)[:limit]]
+        if previous is not None:
+            report["diff"] = [_stat_dict(stat) for stat in snapshot.compare_to(previous, key_type)[:limit]]
+        return report
+
+
+def _by_app_frame(snapshot: tracemalloc.Snapshot) -> Dict[str, Tuple[int, int]]:
+    totals: Dict[str, Tuple[int, int]] = {}
+    for trace in snapshot.traces:
+        # Frames run oldest to most recent, so the last app frame is the innermost one
+        where = "<outside app>"
+        for frame in reversed(trace.traceback):
+            if f"{os.sep}app{os.sep}" in frame.filename:
+                where = f"{frame.filename}:{frame.lineno}"
+                break
+        size, count = totals.get(where, (0, 0))
+        totals[where] = (size + trace.size, count + 1)
+    return totals
+
+
+def _app_frame_diff(current: Dict[str, Tuple[int, int]], previous: Dict[str, Tuple[int, int]]) -> List[Dict[str, Any]]:
+    diff = []
+    for where in current.keys() | previous.keys():
+        size, count = current.get(where, (0, 0))
+        old_size, old_count = previous.get(where, (0, 0))
+        diff.append({"where": where, "size_bytes": size, "count": count,
+                     "size_diff_bytes": size - old_size, "count_diff": count - old_count})
+    diff.sort(key=lambda item: -abs(item["size_diff_bytes"]))
+    return diff
+
+
+def _stat_dict(stat) -> Dict[str, Any]:
+    frames: List[str] = [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+    result = {"where": frames if len(frames) > 1 else frames[0], "size_bytes": stat.size, "count": stat.count}
+    if isinstance(stat, tracemalloc.StatisticDiff):
+        result["size_diff_bytes"] = stat.size_diff
+        result["count_diff"] = stat.count_diff
+    return result
+
+
+profiler = Profiler()
@@ -0,0 +1,113 @@
+import time
+import random
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+import httpx
+from app.core.metrics import registry
+from app.core.archive import ReplayMiss
+from app.core.breaker import CircuitOpenError
+from app.core.deadline import DeadlineExceeded
+from app.core.scheduler import UpstreamQueueTimeout
+
+# Statuses worth another attempt; other 4xx and 5xx answers will not change on a retry
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Failures raised by our own fetch layer rather than the network; retrying them would only add load
+NOT_RETRYABLE_ERRORS = (CircuitOpenError, UpstreamQueueTimeout, ReplayMiss, DeadlineExceeded)
+# Unused retry budget accumulates up to this many retries
+MAX_BALANCE = 20.0
+
+upstream_retries_total = registry.counter(
+    "upstream_retries_total", "Upstream fetches retried, by host and the status or error that caused the retry.", ("host", "reason"))
+upstream_retries_denied_total = registry.counter(
+    "upstream_retries_denied_total",
+    "Retryable upstream failures that were not retried, by host and why: attempts, deadline or budget.", ("host", "limit"))
+
+
+def retry_reason(response: Optional[httpx.Response], error: Optional[BaseException]) -> Optional[str]:
+    """Why this outcome should be retried, or None if it should not."""
+    if error is not None:
+        if isinstance(error, httpx.TransportError) and not isinstance(error, NOT_RETRYABLE_ERRORS):
+            return type(error).__name__
+        return None
+    if response.status_code in RETRYABLE_STATUSES:
+        return str(response.status_code)
+    return None
+
+
+def retry_after(response: Optional[httpx.Response]) -> Optional[float]:
+    """Seconds the upstream asked us to wait, from a Retry-After header in either delta-seconds or HTTP-date form."""
+    value = response.headers.get("retry-after") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryBudget:
+    """Process-wide cap on retries so they cannot multiply load during an outage.
+
+    Every request deposits `ratio` of a retry and the balance also refills by `min_per_second`, so retries stay
+    under roughly `ratio` of traffic plus a small floor for quiet periods. Each retry withdraws one.
+    """
+
+    def __init__(self, ratio: float, min_per_second: float):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.balance = MAX_BALANCE
+        self._refilled_at = time.monotonic()
+        self.retries = 0
+        self.denied = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.balance = min(MAX_BALANCE, self.balance + (now - self._refilled_at) * self.min_per_second)
+        self._refilled_at = now
+
+    def deposit(self):
+        self._refill()
+        self.balance = min(MAX_BALANCE, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        self._refill()
+        if self.balance < 1.0:
+            self.denied += 1
+            return False
+        self.balance -= 1.0
+        self.retries += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        return {"balance": round(self.balance, 2), "retries": self.retries, "denied": self.denied}
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int, backoff_base: float, backoff_max: float, deadline: float, budget: RetryBudget):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.budget = budget
+
+    def backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        """Delay before retry number `attempt` (1-based): the upstream's Retry-After if given, else full-jitter backoff."""
+        requested = retry_after(response)
+        if requested is not None:
+            return requested
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def denied_by(self, attempt: int, delay: float, deadline: float) -> Optional[str]:
+        """Which limit, if any, stops retry number `attempt` from being sent after `delay` seconds."""
+        if attempt >= self.max_attempts:
+            return "attempts"
+        if time.monotonic() + delay >= deadline:
+            return "deadline"
+        if not self.budget.withdraw():
+            return "budget"
+        return None
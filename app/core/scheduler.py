@@ -0,0 +1,236 @@
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Optional, Tuple
+import httpx
+from app.core.metrics import registry
+
+# Priority classes for upstream fetches. Requests being served are interactive; background jobs opt into the others
+INTERACTIVE, PREFETCH, CRAWL = "interactive", "prefetch", "crawl"
+
+upstream_queue_depth = registry.gauge(
+    "upstream_queue_depth", "Upstream fetches waiting for a concurrency slot or rate token, by host and priority class.",
+    ("host", "priority"))
+upstream_queue_wait_seconds = registry.histogram(
+    "upstream_queue_wait_seconds", "Time upstream fetches spent queued before being sent, by host and priority class.",
+    ("host", "priority"), buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+upstream_queue_timeouts_total = registry.counter(
+    "upstream_queue_timeouts_total",
+    "Upstream fetches abandoned after waiting longer than the queue timeout, by host and priority class.", ("host", "priority"))
+
+_priority: ContextVar[str] = ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(name: str):
+    """Send the upstream fetches made inside this block at priority class `name`, e.g. `with priority(PREFETCH):`."""
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def match_host(host: str, domains: Dict[str, Any], default: Any = None) -> Any:
+    """The value for the most specific entry in `domains` covering `host`: www.example.com, then example.com, then com."""
+    labels = host.lower().split(".")
+    for i in range(len(labels)):
+        value = domains.get(".".join(labels[i:]))
+        if value is not None:
+            return value
+    return default
+
+
+class UpstreamQueueTimeout(httpx.PoolTimeout):
+    """Raised when a fetch waits longer than UPSTREAM_QUEUE_TIMEOUT for its host's concurrency slot or rate token."""
+
+
+@dataclass(frozen=True)
+class HostLimit:
+    max_in_flight: int = 0  # 0 means unlimited
+    rate: float = 0.0  # requests per second, 0 means unlimited
+    burst: int = 1  # requests that may go out back to back before the rate applies
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, float]) -> "HostLimit":
+        return cls(int(values.get("max_in_flight", 0)), float(values.get("rate", 0.0)), max(1, int(values.get("burst", 1))))
+
+
+class HostQueue:
+    """Concurrency slots plus a token bucket for one upstream host, shared between priority classes.
+
+    Waiters queue per class and are started by weighted fair queuing: each gets a virtual finish tag 1/weight past
+    the later of the current virtual time and its class's previous tag, and the smallest tag goes next. A slot and a
+    rate token are only handed out at that point, so an abandoned waiter never holds either. The bucket is kept as a
+    theoretical arrival time (GCRA) and a timer wakes the queue when the next token is due, so nothing polls.
+
+    Background classes also yield to interactive work: they never start while an interactive fetch is waiting, and
+    together hold at most `background_share` of the host's slots so interactive bursts find one free.
+    """
+
+    def __init__(self, host: str, limit: HostLimit, weights: Dict[str, float], background_share: float):
+        self.host = host
+        self.limit = limit
+        self.weights = weights
+        self._background_slots = max(1, int(limit.max_in_flight * background_share)) if limit.max_in_flight > 0 else 0
+        self._waiting: Dict[str, Deque[Tuple[float, asyncio.Future]]] = {priority: deque() for priority in weights}
+        self._finish_tags: Dict[str, float] = {priority: 0.0 for priority in weights}
+        self._virtual_time = 0.0
+        self._next_send = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.queued: Dict[str, int] = {priority: 0 for priority in weights}
+        self.in_flight = 0
+        self.background_in_flight = 0
+        self.sent: Dict[str, int] = {priority: 0 for priority in weights}
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+
+    def _may_start(self, priority: str) -> bool:
+        if self.limit.max_in_flight > 0 and self.in_flight >= self.limit.max_in_flight:
+            return False
+        if priority == INTERACTIVE:
+            return True
+        if self._waiting[INTERACTIVE]:
+            return False
+        return not self._background_slots or self.background_in_flight < self._background_slots
+
+    def _next(self) -> Optional[str]:
+        """The class whose head waiter has the smallest finish tag among those allowed to start now."""
+        for waiters in self._waiting.values():
+            # Waiters that timed out or were cancelled are dropped lazily
+            while waiters and waiters[0][1].done():
+                waiters.popleft()
+        ready = [priority for priority, waiters in self._waiting.items() if waiters and self._may_start(priority)]
+        return min(ready, key=lambda priority: self._waiting[priority][0][0], default=None)
+
+    def _token_delay(self, now: float) -> float:
+        if self.limit.rate <= 0:
+            return 0.0
+        return max(0.0, self._next_send - now - (self.limit.burst - 1) / self.limit.rate)
+
+    def _dispatch(self):
+        while True:
+            priority = self._next()
+            if priority is None:
+                return
+            if self.limit.rate > 0:
+                now = time.monotonic()
+                delay = self._token_delay(now)
+                if delay > 0:
+                    if self._timer is None:
+                        self._timer = asyncio.get_running_loop().call_later(delay, self._wake)
+                    return
+                self._next_send = max(self._next_send, now) + 1.0 / self.limit.rate
+            finish, waiter = self._waiting[priority].popleft()
+            self._virtual_time = finish
+            self.in_flight += 1
+            if priority != INTERACTIVE:
+                self.background_in_flight += 1
+            waiter.set_result(None)
+
+    def _wake(self):
+        self._timer = None
+        self._dispatch()
+
+    def _release(self, priority: str):
+        self.in_flight -= 1
+        if priority != INTERACTIVE:
+            self.background_in_flight -= 1
+        self._dispatch()
+
+    async def _acquire(self, priority: str, timeout: Optional[float]):
+        finish = max(self._virtual_time, self._finish_tags[priority]) + 1.0 / self.weights[priority]
+        self._finish_tags[priority] = finish
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting[priority].append((finish, waiter))
+        self._dispatch()
+        try:
+            await (waiter if timeout is None else asyncio.wait_for(waiter, timeout))
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # Started just as we gave up: hand the slot to the next waiter
+                self._release(priority)
+            else:
+                waiter.cancel()
+                # Leaving may unblock background work that was yielding to this waiter
+                self._dispatch()
+            raise
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float], priority: str = INTERACTIVE):
+        if priority not in self.weights:
+            priority = INTERACTIVE
+        started = time.perf_counter()
+        self.queued[priority] += 1
+        upstream_queue_depth.inc(self.host, priority)
+        try:
+            await self._acquire(priority, timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            upstream_queue_timeouts_total.inc(self.host, priority)
+            raise UpstreamQueueTimeout(f"Waited more than {timeout}s to send a request to {self.host}") from None
+        finally:
+            self.queued[priority] -= 1
+            upstream_queue_depth.dec(self.host, priority)
+        waited = time.perf_counter() - started
+        upstream_queue_wait_seconds.observe(waited, self.host, priority)
+        self.wait_seconds += waited
+        self.sent[priority] += 1
+        try:
+            yield waited
+        finally:
+            self._release(priority)
+
+    def stats(self) -> Dict[str, Any]:
+        sent = sum(self.sent.values())
+        return {
+            "max_in_flight": self.limit.max_in_flight,
+            "rate": self.limit.rate,
+            "burst": self.limit.burst,
+            "in_flight": self.in_flight,
+            "background_in_flight": self.background_in_flight,
+            "queued": dict(self.queued),
+            "sent": sent,
+            "sent_by_priority": dict(self.sent),
+            "timeouts": self.timeouts,
+            "mean_wait_seconds": round(self.wait_seconds / sent, 4) if sent else 0.0,
+        }
+
+
+class UpstreamScheduler:
+    """Per-host queues for the shared fetch layer. A limit keyed "example.com" also covers its subdomains."""
+
+    def __init__(self, limits: Dict[str, Dict[str, float]], default: HostLimit, timeout: Optional[float],
+                 weights: Dict[str, float], background_share: float):
+        self.limits = {domain.lower(): HostLimit.from_dict(values) for domain, values in limits.items()}
+        self.default = default
+        self.timeout = timeout
+        # Interactive always exists, so an unknown or misconfigured class falls back to it
+        self.weights = {INTERACTIVE: 1.0, **{name: weight for name, weight in weights.items() if weight > 0}}
+        self.background_share = background_share
+        self._queues: Dict[str, HostQueue] = {}
+
+    def limit_for(self, host: str) -> HostLimit:
+        return match_host(host, self.limits, self.default)
+
+    def queue(self, host: str) -> HostQueue:
+        queue = self._queues.get(host)
+        if queue is None:
+            queue = self._queues[host] = HostQueue(host, self.limit_for(host), self.weights, self.background_share)
+        return queue
+
+    def slot(self, host: str, budget: Optional[float] = None):
+        """Wait for a slot at the current priority class, giving up after the queue timeout or `budget` seconds,
+        whichever is shorter."""
+        timeout = self.timeout if budget is None else min(self.timeout or budget, budget)
+        return self.queue(host).slot(timeout, current_priority())
+
+    def stats(self) -> Dict[str, Any]:
+        return {host: queue.stats() for host, queue in sorted(self._queues.items())}
@@ -0,0 +1,47 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+# (name, duration in seconds, description, detail) for the request being served, or None when it is not sampled. The
+# description goes out in the public Server-Timing header, so it must not name upstream URLs; the detail (a full URL,
+# say) only goes to the structured log.
+Span = Tuple[str, float, Optional[str], Optional[str]]
+
+_spans: ContextVar[Optional[List[Span]]] = ContextVar("server_timing_spans", default=None)
+
+
+def start_collecting() -> List[Span]:
+    spans: List[Span] = []
+    _spans.set(spans)
+    return spans
+
+
+def record_span(name: str, duration: float, description: Optional[str] = None, detail: Optional[str] = None):
+    spans = _spans.get()
+    if spans is not None:
+        spans.append((name, duration, description, detail))
+
+
+@contextmanager
+def span(name: str, description: Optional[str] = None):
+    spans = _spans.get()
+    if spans is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans.append((name, time.perf_counter() - started, description, None))
+
+
+def format_server_timing(spans: List[Span]) -> str:
+    """Render spans as a Server-Timing header value, durations in milliseconds."""
+    metrics = []
+    for name, duration, description, _ in spans:
+        metric = f"{name};dur={duration * 1000:.2f}"
+        if description:
+            metric += ';desc="' + description.replace("\\", "\\\\").replace('"', '\\"') + '"'
+        metrics.append(metric)
+    return ", ".join(metrics)
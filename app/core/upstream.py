@@ -0,0 +1,537 @@
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlsplit
+import httpx
+from bs4 import BeautifulSoup
+from app.core.config import settings
+from app.core.timing import record_span
+from app.core.deadline import DeadlineExceeded, clear_deadline, remaining
+from app.core.archive import UpstreamArchive, RecordingTransport, ReplayTransport
+from app.core.scheduler import INTERACTIVE, HostLimit, UpstreamQueueTimeout, UpstreamScheduler, current_priority
+from app.core.breaker import CircuitBreakers, STATE_VALUES
+from app.core.hedging import Hedging
+from app.core.retry import RetryBudget, RetryPolicy, retry_reason, upstream_retries_total, upstream_retries_denied_total
+from app.core.metrics import (
+    registry, parse_duration_seconds, upstream_request_duration_seconds,
+    upstream_requests_in_flight, upstream_response_bytes_total,
+    upstream_fetches_cancelled_total, upstream_coalesced_total,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+def redirect_to_base(url: str, base_url: str) -> str:
+    """Rewrite https://host/path?query to {base_url}/host/path?query, for pointing scrapers at a local stub server."""
+    parts = urlsplit(url)
+    rewritten = f"{base_url.rstrip('/')}/{parts.netloc}{parts.path}"
+    return f"{rewritten}?{parts.query}" if parts.query else rewritten
+
+
+@dataclass
+class Validators:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content: bytes
+    content_hash: str
+    content_type: Optional[str]
+
+
+@dataclass
+class Flight:
+    """A fetch in progress and the number of callers waiting on it."""
+    task: "asyncio.Future[httpx.Response]"
+    priority: str = INTERACTIVE
+    waiters: int = 0
+
+
+@dataclass
+class HostStats:
+    requests: int = 0
+    with_validators: int = 0
+    conditional: int = 0
+    not_modified: int = 0
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "with_validators": self.with_validators,
+            "conditional": self.conditional,
+            "not_modified": self.not_modified,
+            "revalidation_ratio": round(self.not_modified / self.conditional, 4) if self.conditional else 0.0,
+        }
+
+
+class ParseMemo:
+    """Maps (parser, parser args, body hash) to a parsed result so byte-identical pages skip BeautifulSoup."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._parsers: Dict[str, Dict[str, float]] = {}
+
+    def _parser(self, name: str) -> Dict[str, float]:
+        stats = self._parsers.get(name)
+        if stats is None:
+            stats = self._parsers[name] = {"hits": 0, "misses": 0, "parse_seconds": 0.0, "saved_seconds": 0.0}
+        return stats
+
+    def get(self, key: tuple):
+        entry = self._entries.get(key)
+        stats = self._parser(key[0])
+        if entry is None:
+            stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        stats["hits"] += 1
+        stats["saved_seconds"] += entry[1]
+        return entry
+
+    def set(self, key: tuple, result: Any, duration: float):
+        self._entries[key] = (result, duration)
+        self._entries.move_to_end(key)
+        self._parser(key[0])["parse_seconds"] += duration
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = sum(stats["hits"] for stats in self._parsers.values())
+        misses = sum(stats["misses"] for stats in self._parsers.values())
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "parse_seconds": round(sum(stats["parse_seconds"] for stats in self._parsers.values()), 4),
+            "saved_seconds": round(sum(stats["saved_seconds"] for stats in self._parsers.values()), 4),
+            "parsers": {
+                name: {key: round(value, 4) if isinstance(value, float) else value for key, value in stats.items()}
+                for name, stats in sorted(self._parsers.items())
+            },
+        }
+
+
+class UpstreamClient:
+    """Shared fetch layer used by every scraper: one pooled HTTP client, per-host scheduling, conditional revalidation
+    and parse memoization."""
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.parse_memo = ParseMemo(max_entries=settings.PARSE_MEMO_MAX_ENTRIES)
+        self._validators: "OrderedDict[str, Validators]" = OrderedDict()
+        self._validator_bytes = 0
+        self._hosts: Dict[str, HostStats] = {}
+        self._flights: Dict[tuple, Flight] = {}
+        self.archive: Optional[UpstreamArchive] = None
+        self.scheduler = UpstreamScheduler(
+            settings.UPSTREAM_HOST_LIMITS,
+            HostLimit(settings.UPSTREAM_DEFAULT_MAX_IN_FLIGHT, settings.UPSTREAM_DEFAULT_RATE),
+            settings.UPSTREAM_QUEUE_TIMEOUT,
+            settings.UPSTREAM_PRIORITY_WEIGHTS,
+            settings.UPSTREAM_BACKGROUND_MAX_SHARE,
+        )
+        self.breakers = CircuitBreakers(
+            window=settings.CIRCUIT_WINDOW_SECONDS,
+            min_calls=settings.CIRCUIT_MIN_CALLS,
+            error_rate=settings.CIRCUIT_ERROR_RATE,
+            slow_call_seconds=settings.CIRCUIT_SLOW_CALL_SECONDS,
+            slow_call_rate=settings.CIRCUIT_SLOW_CALL_RATE,
+            open_seconds=settings.CIRCUIT_OPEN_SECONDS,
+            probes=settings.CIRCUIT_HALF_OPEN_PROBES,
+        )
+        self.hedging = Hedging(
+            settings.UPSTREAM_HEDGE_HOSTS,
+            settings.UPSTREAM_HEDGE_PERCENTILE,
+            settings.UPSTREAM_HEDGE_MIN_SAMPLES,
+            settings.UPSTREAM_HEDGE_MIN_DELAY,
+        )
+        self.retry_policy = RetryPolicy(
+            max_attempts=settings.UPSTREAM_RETRY_MAX_ATTEMPTS,
+            backoff_base=settings.UPSTREAM_RETRY_BACKOFF_BASE,
+            backoff_max=settings.UPSTREAM_RETRY_BACKOFF_MAX,
+            deadline=settings.UPSTREAM_RETRY_DEADLINE,
+            budget=RetryBudget(settings.UPSTREAM_RETRY_BUDGET_RATIO, settings.UPSTREAM_RETRY_BUDGET_MIN_PER_SECOND),
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=settings.UPSTREAM_TIMEOUT, transport=self._transport())
+        return self._client
+
+    def _transport(self) -> httpx.AsyncBaseTransport:
+        if settings.UPSTREAM_REPLAY:
+            logger.info(f"Replaying upstream responses from {settings.UPSTREAM_ARCHIVE_PATH}")
+            return ReplayTransport(self._open_archive())
+        transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(
+            max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+        ))
+        if settings.UPSTREAM_RECORD_SAMPLE_RATE > 0:
+            logger.info(f"Recording {settings.UPSTREAM_RECORD_SAMPLE_RATE:.0%} of upstream responses to {settings.UPSTREAM_ARCHIVE_PATH}")
+            return RecordingTransport(transport, self._open_archive(), settings.UPSTREAM_RECORD_SAMPLE_RATE)
+        return transport
+
+    def _open_archive(self) -> UpstreamArchive:
+        if self.archive is None:
+            self.archive = UpstreamArchive(settings.UPSTREAM_ARCHIVE_PATH)
+        return self.archive
+
+    def _host(self, host: str) -> HostStats:
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = self._hosts[host] = HostStats()
+        return stats
+
+    async def _coalesced_send(self, host: str, url: str, headers: Optional[Dict[str, str]], follow_redirects: bool) -> httpx.Response:
+        """`_retrying_send`, shared between concurrent callers asking for the same URL with the same headers.
+
+        The shared fetch runs in its own task without any one caller's deadline; each caller waits only as long as its
+        own deadline allows, and the fetch is cancelled once the last caller has given up or gone away.
+        """
+        if not settings.UPSTREAM_COALESCE:
+            return await self._retrying_send(host, url, headers, follow_redirects)
+
+        key = (url, follow_redirects, tuple(sorted((headers or {}).items())))
+        flight = self._flights.get(key)
+        priority = current_priority()
+        # An interactive caller does not wait in a background fetch's queue; later callers join its own fetch instead
+        if flight is not None and flight.priority != INTERACTIVE and priority == INTERACTIVE:
+            flight = None
+        if flight is None:
+            async def shared() -> httpx.Response:
+                clear_deadline()
+                return await self._retrying_send(host, url, headers, follow_redirects)
+
+            flight = self._flights[key] = Flight(asyncio.ensure_future(shared()), priority)
+            flight.task.add_done_callback(partial(self._land, key, flight))
+        else:
+            upstream_coalesced_total.inc(host)
+
+        flight.waiters += 1
+        budget = remaining()
+        try:
+            if budget is None:
+                return await asyncio.shield(flight.task)
+            try:
+                return await asyncio.wait_for(asyncio.shield(flight.task), max(0.0, budget))
+            except asyncio.TimeoutError as e:
+                raise DeadlineExceeded(f"Deadline reached while waiting for {url}") from e
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _land(self, key: tuple, flight: Flight, _):
+        # A background flight that an interactive one replaced must not remove its replacement
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def _retrying_send(self, host: str, url: str, headers: Optional[Dict[str, str]], follow_redirects: bool) -> httpx.Response:
+        """`_hedged_send`, retrying transient failures until the attempt limit, the deadline or the retry budget runs out.
+
+        The last response or error is passed on unchanged, so callers still see the upstream's final answer.
+        """
+        if not settings.UPSTREAM_RETRY_ENABLED:
+            return await self._hedged_send(host, url, headers, follow_redirects)
+
+        policy = self.retry_policy
+        policy.budget.deposit()
+        budget = remaining()
+        deadline = time.monotonic() + (policy.deadline if budget is None else min(policy.deadline, budget))
+        attempt = 1
+        while True:
+            response, error = None, None
+            try:
+                response = await self._hedged_send(host, url, headers, follow_redirects)
+            except httpx.TransportError as e:
+                error = e
+            reason = retry_reason(response, error)
+            if reason is not None:
+                delay = policy.backoff(attempt, response)
+                denied = policy.denied_by(attempt, delay, deadline)
+                if denied is not None:
+                    upstream_retries_denied_total.inc(host, denied)
+                    reason = None
+            if reason is None:
+                if error is not None:
+                    raise error
+                return response
+
+            upstream_retries_total.inc(host, reason)
+            logger.info(f"Retrying {url} in {delay:.2f}s after {reason} (attempt {attempt + 1} of {policy.max_attempts})")
+            record_span("retry", delay, f"{reason} {host}", url)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _hedged_send(self, host: str, url: str, headers: Optional[Dict[str, str]], follow_redirects: bool) -> httpx.Response:
+        """`_send`, plus one duplicate if the host opted into hedging and the first attempt outlasts its usual p90.
+
+        Only safe because every upstream fetch is an idempotent GET. Whichever attempt succeeds first wins and the
+        other is cancelled; a failure only wins if the other attempt fails too.
+        """
+        hedging = self.hedging.for_host(host) if settings.UPSTREAM_HEDGING_ENABLED else None
+        delay = hedging.delay() if hedging is not None else None
+        if delay is None:
+            return await self._send(host, url, headers, follow_redirects)
+
+        first = asyncio.ensure_future(self._send(host, url, headers, follow_redirects))
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return first.result()
+            if not hedging.take():
+                return await first
+            logger.debug(f"Hedging {url}: no answer after {delay * 1000:.0f}ms")
+            pending.add(asyncio.ensure_future(self._send(host, url, headers, follow_redirects)))
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [task for task in done if task.exception() is None]
+                if succeeded or not pending:
+                    winner = (succeeded or list(done))[0]
+                    hedging.settle(hedge_won=winner is not first)
+                    return winner.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _send(self, host: str, url: str, headers: Optional[Dict[str, str]], follow_redirects: bool) -> httpx.Response:
+        if not settings.CIRCUIT_BREAKER_ENABLED:
+            async with self._queued(host):
+                return await self._fetch(host, url, headers, follow_redirects)
+
+        # Fail fast while the host's circuit is open, before taking a place in its queue
+        breaker = self.breakers.get(host)
+        probe = breaker.allow()
+        failed: Optional[bool] = None
+        started = time.perf_counter()
+        try:
+            async with self._queued(host):
+                started = time.perf_counter()
+                failed = True
+                response = await self._fetch(host, url, headers, follow_redirects)
+                failed = response.status_code >= 500 or response.status_code == 429
+                return response
+        except (asyncio.CancelledError, DeadlineExceeded):
+            # Cut short by our caller, not the upstream: no evidence either way
+            failed = None
+            raise
+        finally:
+            breaker.record(probe, failed, time.perf_counter() - started)
+
+    @asynccontextmanager
+    async def _queued(self, host: str):
+        if not settings.UPSTREAM_SCHEDULER_ENABLED:
+            yield
+            return
+        # Queue behind the host's concurrency and rate limits instead of bursting into its rate limiter
+        budget = remaining()
+        try:
+            async with self.scheduler.slot(host, budget) as waited:
+                if waited >= 0.001:
+                    record_span("queue", waited, host)
+                yield
+        except UpstreamQueueTimeout as e:
+            if budget is not None and budget <= (self.scheduler.timeout or budget):
+                raise DeadlineExceeded(f"Deadline reached while queued for {host}") from e
+            raise
+
+    async def _fetch(self, host: str, url: str, headers: Optional[Dict[str, str]], follow_redirects: bool) -> httpx.Response:
+        # The request's remaining deadline caps the httpx timeout, so a fetch never outlives its caller
+        budget = remaining()
+        if budget is not None and budget <= 0:
+            raise DeadlineExceeded(f"No time left to fetch {url}")
+        timeout = settings.UPSTREAM_TIMEOUT if budget is None else min(settings.UPSTREAM_TIMEOUT, budget)
+
+        upstream_requests_in_flight.inc(host)
+        started = time.perf_counter()
+        status = "error"
+        target = redirect_to_base(url, settings.UPSTREAM_BASE_URL) if settings.UPSTREAM_BASE_URL else url
+        try:
+            request = self.client.get(target, headers=headers, follow_redirects=follow_redirects, timeout=timeout,
+                                      extensions={"upstream_url": url})
+            # httpx timeouts bound each connect/read separately; the deadline bounds the whole exchange
+            response = await (request if budget is None else asyncio.wait_for(request, budget))
+            status = str(response.status_code)
+            upstream_response_bytes_total.inc(host, amount=len(response.content))
+            hedging = self.hedging.for_host(host)
+            if hedging is not None and response.status_code < 500:
+                hedging.observe(time.perf_counter() - started)
+            return response
+        except (httpx.TimeoutException, asyncio.TimeoutError) as e:
+            if timeout < settings.UPSTREAM_TIMEOUT or not isinstance(e, httpx.TimeoutException):
+                raise DeadlineExceeded(f"Deadline reached while fetching {url}") from e
+            raise
+        except asyncio.CancelledError:
+            upstream_fetches_cancelled_total.inc(host)
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            upstream_requests_in_flight.dec(host)
+            upstream_request_duration_seconds.observe(duration, host, status)
+            record_span("fetch", duration, f"{status} {host}", url)
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None, follow_redirects: bool = False) -> httpx.Response:
+        host = urlsplit(url).hostname or "unknown"
+        stats = self._host(host)
+        stats.requests += 1
+        if not settings.UPSTREAM_REVALIDATE:
+            return await self._coalesced_send(host, url, headers, follow_redirects)
+
+        headers = dict(headers or {})
+        validators = self._validators.get(url)
+        if validators is not None:
+            stats.conditional += 1
+            if validators.etag:
+                headers["If-None-Match"] = validators.etag
+            if validators.last_modified:
+                headers["If-Modified-Since"] = validators.last_modified
+
+        response = await self._coalesced_send(host, url, headers, follow_redirects)
+
+        if response.status_code == 304 and validators is not None:
+            stats.not_modified += 1
+            self._validators.move_to_end(url)
+            logger.debug(f"Upstream revalidated {url} (304 Not Modified)")
+            return self._replay(response, validators)
+
+        if response.status_code == 200:
+            self._remember(url, response, stats)
+        return response
+
+    def _remember(self, url: str, response: httpx.Response, stats: HostStats):
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        self._forget(url)
+        if not etag and not last_modified:
+            return
+        stats.with_validators += 1
+        digest = content_hash(response.content)
+        response.extensions["content_hash"] = digest
+        if len(response.content) > settings.UPSTREAM_REVALIDATE_MAX_BYTES:
+            return
+        self._validators[url] = Validators(
+            etag=etag,
+            last_modified=last_modified,
+            content=response.content,
+            content_hash=digest,
+            content_type=response.headers.get("content-type"),
+        )
+        self._validator_bytes += len(response.content)
+        while (len(self._validators) > settings.UPSTREAM_REVALIDATE_MAX_URLS
+               or self._validator_bytes > settings.UPSTREAM_REVALIDATE_MAX_BYTES):
+            _, evicted = self._validators.popitem(last=False)
+            self._validator_bytes -= len(evicted.content)
+
+    def _forget(self, url: str):
+        validators = self._validators.pop(url, None)
+        if validators is not None:
+            self._validator_bytes -= len(validators.content)
+
+    def _replay(self, response: httpx.Response, validators: Validators) -> httpx.Response:
+        """Turn a 304 into the 200 it stands for, reusing the stored body and its hash."""
+        headers = {key: value for key, value in (
+            ("content-type", validators.content_type),
+            ("etag", validators.etag),
+            ("last-modified", validators.last_modified),
+        ) if value}
+        replayed = httpx.Response(200, content=validators.content, headers=headers, request=response.request)
+        replayed.extensions["content_hash"] = validators.content_hash
+        replayed.extensions["revalidated"] = True
+        return replayed
+
+    def parse(self, response: httpx.Response, parser: Callable[..., Any], *args: Any) -> Any:
+        """Run `parser(soup, *args)` on the response body, reusing the previous result if the body is unchanged."""
+        if not settings.PARSE_MEMO_ENABLED:
+            return self._run_parser(response, parser, args)[0]
+
+        digest = response.extensions.get("content_hash") or content_hash(response.content)
+        key = (parser.__qualname__, repr(args), digest)
+        entry = self.parse_memo.get(key)
+        if entry is not None:
+            logger.debug(f"Parse memo hit for {key[0]}")
+            record_span("parse", 0.0, f"{key[0]} (memo)")
+            return entry[0]
+
+        result, duration = self._run_parser(response, parser, args)
+        self.parse_memo.set(key, result, duration)
+        return result
+
+    def _run_parser(self, response: httpx.Response, parser: Callable[..., Any], args: tuple):
+        started = time.perf_counter()
+        result = parser(BeautifulSoup(response.text, 'html.parser'), *args)
+        duration = time.perf_counter() - started
+        parse_duration_seconds.observe(duration, parser.__qualname__)
+        record_span("parse", duration, parser.__qualname__)
+        return result, duration
+
+    def pool_usage(self) -> Dict[str, int]:
+        """Connection counts from httpx's pool; the pool is internal, so read it defensively."""
+        usage = {"active": 0, "idle": 0, "max": settings.UPSTREAM_MAX_CONNECTIONS}
+        transport = getattr(self._client, "_transport", None)
+        pool = getattr(getattr(transport, "inner", transport), "_pool", None)
+        for connection in getattr(pool, "connections", []):
+            usage["idle" if connection.is_idle() else "active"] += 1
+        return usage
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "parse_memo": self.parse_memo.stats(),
+            "revalidation": {
+                "tracked_urls": len(self._validators),
+                "tracked_bytes": self._validator_bytes,
+                "hosts": {host: stats.as_dict() for host, stats in sorted(self._hosts.items())},
+            },
+            "scheduler": self.scheduler.stats(),
+            "circuits": self.breakers.stats(),
+            "hedging": self.hedging.stats(),
+            "retry_budget": self.retry_policy.budget.stats(),
+            "archive": {
+                "mode": "replay" if settings.UPSTREAM_REPLAY else "record" if settings.UPSTREAM_RECORD_SAMPLE_RATE > 0 else "off",
+                **(self.archive.stats() if self.archive is not None else {}),
+            },
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+
+
+upstream = UpstreamClient()
+
+
+def _collect_parse_memo():
+    for parser, stats in upstream.parse_memo.stats()["parsers"].items():
+        yield {"parser": parser, "result": "hit"}, stats["hits"]
+        yield {"parser": parser, "result": "miss"}, stats["misses"]
+
+
+def _collect_pool():
+    for state, count in upstream.pool_usage().items():
+        yield {"state": state}, count
+
+
+def _collect_circuits():
+    for host, state in upstream.breakers.states().items():
+        yield {"host": host}, STATE_VALUES[state]
+
+
+registry.collected("parse_memo_lookups_total", "Parse memo lookups, by scraper method and result.", "counter", _collect_parse_memo)
+registry.collected("upstream_pool_connections", "Upstream connection pool usage: active, idle and configured maximum.", "gauge", _collect_pool)
+registry.collected("upstream_circuit_state", "Circuit breaker state by host: 0 closed, 1 half-open, 2 open.", "gauge", _collect_circuits)
@@ -0,0 +1,139 @@
+import time
+import random
+import asyncio
+import logging
+from typing import Dict, List, Optional
+import httpx
+from app.core.cache import refreshing, response_cache
+from app.core.hotkeys import HeavyHitters
+from app.core.peers import peer_cache
+from app.core.metrics import registry
+from app.core.scheduler import PREFETCH, priority
+
+logger = logging.getLogger(__name__)
+
+cache_warmer_refreshes_total = registry.counter(
+    "cache_warmer_refreshes_total",
+    "Hot paths handled by the cache warmer, by path and result: refreshed, failed, or skipped because already fresh.",
+    ("path", "result"))
+
+
+class CacheWarmer:
+    """Keeps a fixed set of hot paths cached by requesting each one again shortly before its entry expires.
+
+    Refreshes go through the app itself, so entries are built exactly as for a client, at prefetch priority so they
+    queue behind interactive fetches. Each is due `lead` seconds before expiry plus up to `jitter` more, so paths
+    sharing a TTL do not refresh together. An entry refreshed by something else is left alone until its new expiry.
+
+    Besides the fixed `paths`, the `hot_count` most requested keys in `hot_keys` are kept warm while they stay popular;
+    the list is re-read every `hot_sync` seconds. In peer mode each node only warms the keys it owns.
+    """
+
+    def __init__(self, app, paths: List[str], lead: float, jitter: float, retry: float,
+                 hot_keys: Optional[HeavyHitters] = None, hot_count: int = 0, hot_min_count: int = 1,
+                 hot_sync: float = 60.0):
+        self.app = app
+        self.paths = paths
+        self.lead = lead
+        self.jitter = jitter
+        self.retry = retry
+        self.hot_keys = hot_keys if hot_count > 0 else None
+        self.hot_count = hot_count
+        self.hot_min_count = hot_min_count
+        self.hot_sync = hot_sync
+        self._task: Optional[asyncio.Task] = None
+        self._due: Dict[str, float] = {}
+        # Cache key behind each path, once known
+        self._keys: Dict[str, str] = {}
+        self._synced_at = 0.0
+
+    def start(self):
+        # Everything is cold at startup: warm it straight away, spread over the jitter window
+        now = time.monotonic()
+        self._due = {path: now + random.uniform(0, self.jitter) for path in self.paths}
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        transport = httpx.ASGITransport(app=self.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://cache-warmer", timeout=None,
+                                     headers={"user-agent": "cache-warmer"}) as client:
+            while True:
+                if self.hot_keys is not None and time.monotonic() >= self._synced_at + self.hot_sync:
+                    self._sync_hot_keys()
+                path = min(self._due, key=self._due.get, default=None)
+                wake = self._due[path] if path is not None else float("inf")
+                if self.hot_keys is not None:
+                    wake = min(wake, self._synced_at + self.hot_sync)
+                await asyncio.sleep(max(0.0, wake - time.monotonic()))
+                # Woken to re-read the hot keys rather than to refresh
+                if path is None or path not in self._due or time.monotonic() < self._due[path]:
+                    continue
+                delay = await self._refresh(client, path)
+                if delay is None:
+                    del self._due[path]
+                else:
+                    self._due[path] = time.monotonic() + delay
+
+    def _sync_hot_keys(self):
+        now = self._synced_at = time.monotonic()
+        hot = {entry["url"]: entry["key"] for entry in self.hot_keys.top(self.hot_count)
+               if entry["count"] >= self.hot_min_count}
+        warmed = {self._keys.get(path) for path in self._due}
+        for url, key in hot.items():
+            # A hot key may be one of the fixed paths spelled differently; its cache key says so
+            if url not in self._due and key not in warmed and (peer_cache is None or peer_cache.owns(key)):
+                self._due[url] = now + random.uniform(0, self.jitter)
+                self._keys[url] = key
+                warmed.add(key)
+        for path in [path for path in self._due if path not in self.paths and path not in hot]:
+            logger.info(f"Cache warmer no longer warming {path}: it is not among the hot keys any more")
+            del self._due[path]
+            self._keys.pop(path, None)
+
+    def _until_due(self, ttl_remaining: float) -> float:
+        # At least a second, so a TTL shorter than the lead time cannot spin
+        return max(1.0, ttl_remaining - self.lead - random.uniform(0, self.jitter))
+
+    async def _refresh(self, client: httpx.AsyncClient, path: str) -> Optional[float]:
+        """Refresh `path` unless it is still fresh; returns the seconds until it should be looked at again, or None
+        if another node owns it and this one should stop."""
+        key = self._keys.get(path)
+        ttl_remaining = response_cache.ttl_remaining(key) if key is not None else None
+        if ttl_remaining is not None and ttl_remaining > self.lead + self.jitter:
+            cache_warmer_refreshes_total.inc(path, "skipped")
+            return self._until_due(ttl_remaining)
+
+        started = time.perf_counter()
+        try:
+            # Until the path's cache key is known, an entry already cached (e.g. loaded from a snapshot) is kept
+            with refreshing(force=key is not None) as refresh, priority(PREFETCH):
+                response = await client.get(path)
+            # A stale fallback or partial response is a 200 that stored nothing
+            ok = response.status_code == 200 and (refresh.stored or refresh.found)
+            error = None if ok else f"HTTP {response.status_code}"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        if error is not None:
+            cache_warmer_refreshes_total.inc(path, "failed")
+            logger.warning(f"Cache warmer could not refresh {path} ({error}), retrying in {self.retry:.0f}s")
+            return self.retry
+
+        key = self._keys[path] = (refresh.stored or refresh.found)[0]
+        if peer_cache is not None and not peer_cache.owns(key):
+            logger.info(f"Cache warmer leaving {path} to {peer_cache.owner(key)}, which owns it")
+            return None
+        if refresh.stored:
+            cache_warmer_refreshes_total.inc(path, "refreshed")
+            logger.info(f"Cache warmer refreshed {path} in {time.perf_counter() - started:.2f}s")
+        else:
+            cache_warmer_refreshes_total.inc(path, "skipped")
+        return self._until_due(response_cache.ttl_remaining(key) or 0.0)
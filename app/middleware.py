@@ -1,41 +1,356 @@
+import time
+import random
+import asyncio
 import logging
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
-import traceback
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.cache import etag_matches, strong_etag
+from app.core.deadline import start_deadline
+from app.core.metrics import http_requests_total, http_request_duration_seconds, http_requests_in_flight, http_requests_cancelled_total
+from app.core.timing import Span, format_server_timing, start_collecting
 import json
 
 logger = logging.getLogger(__name__)
 
-class ErrorHandlingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
+ERROR_BODY = b'{"error": "An internal server error occurred"}'
+# Non-standard status popularised by nginx for "client closed request"; only our own metrics and logs ever see it
+CLIENT_CLOSED_REQUEST = 499
+
+
+class _LogRateLimiter:
+    """Allows `limit` events per rolling minute window and counts the ones it suppresses."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.window_start = 0.0
+        self.count = 0
+        self.suppressed = 0
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if now - self.window_start >= 60:
+            self.window_start = now
+            self.count = 0
+        self.count += 1
+        if self.count > self.limit:
+            self.suppressed += 1
+            return False
+        return True
+
+
+class ErrorHandlingMiddleware:
+    """Turns unhandled exceptions into a generic JSON 500; successful responses pass through untouched."""
+
+    def __init__(self, app: ASGIApp, detail_logs_per_minute: int = 30):
+        self.app = app
+        self.limiter = _LogRateLimiter(detail_logs_per_minute)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_tracking_start(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
         try:
-            response = await call_next(request)
-            return response
+            await self.app(scope, receive, send_tracking_start)
         except Exception as e:
-            # Log detailed error information
-            error_details = {
-                "error_type": type(e).__name__,
-                "error_message": str(e),
-                "request_method": request.method,
-                "request_url": str(request.url),
-                "request_headers": dict(request.headers),
-                "request_query_params": dict(request.query_params),
-                "traceback": traceback.format_exc()
-            }
-            
-            # Try to include request body, if possible
+            self._log(scope, e)
+            if response_started:
+                # Headers are already on the wire; nothing useful can be sent any more
+                raise
+            await send({
+                "type": "http.response.start",
+                "status": 500,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(ERROR_BODY)).encode())],
+            })
+            await send({"type": "http.response.body", "body": ERROR_BODY})
+
+    def _log(self, scope: Scope, error: Exception):
+        summary = f"{type(error).__name__} while processing {scope['method']} {scope['path']}"
+        if not self.limiter.allow():
+            logger.error(f"{summary}: {error} (details suppressed, {self.limiter.suppressed} so far)")
+            return
+        query = scope.get("query_string", b"").decode("latin-1")
+        logger.error(f"{summary}?{query}: {error}" if query else f"{summary}: {error}", exc_info=error)
+
+
+def route_template(scope: Scope) -> str:
+    """Full path template of the matched route (e.g. /anime/mal/top), used to keep metric labels bounded."""
+    # FastAPI versions that keep included routers nested expose the prefixed path on the effective route context
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    path = getattr(context, "path", None) or getattr(scope.get("route"), "path", None)
+    return path or "unmatched"
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    max_age: int
+    stale_while_revalidate: int = 0
+
+    @property
+    def cache_control(self) -> str:
+        value = f"public, max-age={self.max_age}"
+        if self.stale_while_revalidate:
+            value += f", stale-while-revalidate={self.stale_while_revalidate}"
+        return value
+
+
+class HTTPCacheMiddleware:
+    """Adds Cache-Control and a strong ETag to GET responses under each router prefix, answering If-None-Match with 304."""
+
+    def __init__(self, app: ASGIApp, policies: Dict[str, CachePolicy]):
+        self.app = app
+        self.policies = sorted(policies.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def _policy(self, path: str) -> Optional[CachePolicy]:
+        for prefix, policy in self.policies:
+            if path == prefix or path.startswith(prefix + "/"):
+                return policy
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+        policy = self._policy(scope["path"])
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        is_head = scope["method"] == "HEAD"
+        start: Optional[Message] = None
+        chunks = []
+
+        async def send_with_validators(message: Message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            status = start["status"]
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=list(start["headers"]))
+            if status in (200, 304):
+                if "cache-control" not in headers:
+                    headers["cache-control"] = policy.cache_control
+                etag = headers.get("etag")
+                if etag is None and status == 200 and not is_head:
+                    etag = headers["etag"] = strong_etag(body)
+                if status == 200 and etag is not None and etag_matches(if_none_match, etag):
+                    status, body = 304, b""
+                    for name in ("content-length", "content-type", "content-encoding"):
+                        if name in headers:
+                            del headers[name]
+            elif "cache-control" not in headers:
+                headers["cache-control"] = "no-store"
+
+            await send({**start, "status": status, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_with_validators)
+
+
+class MetricsMiddleware:
+    """Records request count, latency and in-flight gauges per route template and status."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            labels = (scope["method"], route_template(scope), str(status))
+            http_requests_total.inc(*labels)
+            http_request_duration_seconds.observe(time.perf_counter() - started, *labels)
+
+
+class ClientDisconnectMiddleware:
+    """Cancels the handler of a GET or HEAD request as soon as its client disconnects, along with its upstream fetches.
+
+    The request body is read up front, so this middleware is the only reader of `receive` while the handler runs and
+    the next message it gets is the disconnect.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        request_messages: List[Message] = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            request_messages.append(message)
+            if not message.get("more_body", False):
+                break
+        disconnected = asyncio.Event()
+
+        async def receive_buffered() -> Message:
+            if request_messages:
+                return request_messages.pop(0)
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        response_started = False
+
+        async def send_tracking_start(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        handler = asyncio.ensure_future(self.app(scope, receive_buffered, send_tracking_start))
+        watcher = asyncio.ensure_future(receive())
+        try:
+            await asyncio.wait({handler, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            handler.cancel()
+            raise
+        finally:
+            watcher.cancel()
+
+        if handler.done():
+            handler.result()
+            return
+
+        disconnected.set()
+        handler.cancel()
+        try:
+            await handler
+        except asyncio.CancelledError:
+            pass
+        http_requests_cancelled_total.inc(route_template(scope))
+        logger.info(f"Client disconnected from {scope['method']} {scope['path']}; cancelled its handler")
+        if not response_started:
+            # The client is gone, so this never reaches it; it lets outer middlewares record the request as abandoned
+            await send({"type": "http.response.start", "status": CLIENT_CLOSED_REQUEST, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+
+class DeadlineMiddleware:
+    """Gives each request a deadline that every upstream fetch made while serving it must fit into.
+
+    The budget is the longest matching path prefix in `deadlines`, else `default`. A client may shorten it, never
+    lengthen it, by sending X-Request-Deadline with the number of seconds it is prepared to wait.
+    """
+
+    def __init__(self, app: ASGIApp, default: float, deadlines: Optional[Dict[str, float]] = None):
+        self.app = app
+        self.default = default
+        self.deadlines = sorted((deadlines or {}).items(), key=lambda item: len(item[0]), reverse=True)
+
+    def _budget(self, path: str) -> float:
+        for prefix, seconds in self.deadlines:
+            if path == prefix or path.startswith(prefix + "/"):
+                return seconds
+        return self.default
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        budget = self._budget(scope["path"])
+        requested = Headers(scope=scope).get("x-request-deadline")
+        if requested:
             try:
-                body = await request.json()
-                error_details["request_body"] = body
-            except:
-                error_details["request_body"] = "Unable to parse request body"
-
-            logger.error(f"An error occurred while processing the request: {json.dumps(error_details, indent=2)}")
-
-            # Return a generic error response to the client
-            return Response(
-                content=json.dumps({"error": "An internal server error occurred"}),
-                status_code=500,
-                media_type="application/json"
-            )
\ No newline at end of file
+                seconds = float(requested)
+            except ValueError:
+                seconds = 0.0
+            if seconds > 0:
+                budget = min(budget, seconds) if budget > 0 else seconds
+        if budget <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        deadline = start_deadline(budget)
+
+        async def send_marking_partial(message: Message):
+            if message["type"] == "http.response.start" and deadline.omitted:
+                # A response missing parts must not be cached downstream as if it were complete
+                headers = MutableHeaders(raw=list(message["headers"]))
+                headers["x-partial-response"] = ", ".join(deadline.omitted)
+                headers["cache-control"] = "no-store"
+                message = {**message, "headers": headers.raw}
+            await send(message)
+
+        await self.app(scope, receive, send_marking_partial)
+
+
+class ServerTimingMiddleware:
+    """Collects fetch/parse/validate/serialize/cache spans for sampled requests and reports them in Server-Timing."""
+
+    def __init__(self, app: ASGIApp, sample_rate: float = 0.01, sample_rates: Optional[Dict[str, float]] = None, log: bool = False):
+        self.app = app
+        self.sample_rate = sample_rate
+        # Longest path prefix wins, so a single hot endpoint can be sampled less than its router
+        self.sample_rates = sorted((sample_rates or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self.log = log
+
+    def _rate(self, path: str) -> float:
+        for prefix, rate in self.sample_rates:
+            if path == prefix or path.startswith(prefix + "/"):
+                return rate
+        return self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or random.random() >= self._rate(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        spans = start_collecting()
+        started = time.perf_counter()
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start":
+                timings: List[Span] = [*spans, ("total", time.perf_counter() - started, None, None)]
+                headers = MutableHeaders(raw=list(message["headers"]))
+                headers.append("server-timing", format_server_timing(timings))
+                message = {**message, "headers": headers.raw}
+                if self.log:
+                    logger.info("server-timing " + json.dumps({
+                        "method": scope["method"],
+                        "route": route_template(scope),
+                        "status": message["status"],
+                        "spans": [{"name": name, "ms": round(duration * 1000, 2), "desc": description, "detail": detail}
+                                  for name, duration, description, detail in timings],
+                    }))
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
@@ -1,13 +1,12 @@
 import re
-import httpx
 import datetime
-from bs4 import BeautifulSoup
 from urllib.parse import urlencode, parse_qsl, urljoin
 from typing import Dict, List, Optional
 from app.models.anime.mal_model import MalDataType1, MalResponseType1
 from app.models.anime.mal_model import AnimeSeasonAndScheduleData, AnimeSeasonAndScheduleResponse
 from app.models.anime.mal_model import AnimeSearchResponse, AnimeSearchResult
 from app.models.anime.mal_model import PersonDetails, VoiceActingRole, AnimeStaffPosition
+from app.core.upstream import upstream
 import logging
 
 logger = logging.getLogger(__name__)
@@ -28,141 +27,121 @@ class AnimeMalScraper:
         logger.info(f"Scraping top anime list for page {page}")
         limit = (page - 1) * 50
         url = f"{self.mal_top_anime}?limit={limit}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             logger.error(f"Failed to fetch top anime list. Status code: {response.status_code}")
             raise Exception("Failed to fetch top anime list")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_anime_data(soup, page, total_pages)
+        return upstream.parse(response, self._parse_anime_data, page, total_pages)
     
     async def scrape_top_airing(self, page: int = 1, total_pages = 1):
         logger.info(f"Scraping top airing anime list for page {page}")
         limit = (page - 1) * 50
         url = f"{self.mal_top_airing}&limit={limit}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             logger.error(f"Failed to fetch top airing anime list. Status code: {response.status_code}")
             raise Exception("Failed to fetch top airing anime list")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_anime_data(soup, page, total_pages)
+        return upstream.parse(response, self._parse_anime_data, page, total_pages)
     
     async def scrape_top_upcoming(self, page: int = 1, total_pages = 1):
         logger.info(f"Scraping top upcoming anime list for page {page}")
         limit = (page - 1) * 50
         url = f"{self.mal_top_upcoming}&limit={limit}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             logger.error(f"Failed to fetch top upcoming anime list. Status code: {response.status_code}")
             raise Exception("Failed to fetch top upcoming anime list")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_anime_data(soup, page, total_pages)
+        return upstream.parse(response, self._parse_anime_data, page, total_pages)
     
     async def scrape_top_tv_series(self, page: int = 1, total_pages = 1):
         logger.info(f"Scraping top TV series anime list for page {page}")
         limit = (page - 1) * 50
         url = f"{self.mal_top_tv_series}&limit={limit}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             logger.error(f"Failed to fetch top TV series anime list. Status code: {response.status_code}")
             raise Exception("Failed to fetch top tv series anime list")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_anime_data(soup, page, total_pages)
+        return upstream.parse(response, self._parse_anime_data, page, total_pages)
     
     async def scrape_top_movies(self, page: int = 1, total_pages = 1):
         logger.info(f"Scraping top anime movies list for page {page}")
         limit = (page - 1) * 50
         url = f"{self.mal_top_movies}&limit={limit}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             logger.error(f"Failed to fetch top anime movies list. Status code: {response.status_code}")
             raise Exception("Failed to fetch top tv movies anime list")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_anime_data(soup, page, total_pages)
+        return upstream.parse(response, self._parse_anime_data, page, total_pages)
     
     async def scrape_top_ova(self, page: int = 1, total_pages = 1):
         logger.info(f"Scraping top OVA anime list for page {page}")
         limit = (page - 1) * 50
         url = f"{self.mal_top_ova}&limit={limit}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             logger.error(f"Failed to fetch top OVA anime list. Status code: {response.status_code}")
             raise Exception("Failed to fetch top OVAs anime list")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_anime_data(soup, page, total_pages)
+        return upstream.parse(response, self._parse_anime_data, page, total_pages)
     
     async def scrape_top_ona(self, page: int = 1, total_pages = 1):
         logger.info(f"Scraping top ONA anime list for page {page}")
         limit = (page - 1) * 50
         url = f"{self.mal_top_ona}&limit={limit}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             logger.error(f"Failed to fetch top ONA anime list. Status code: {response.status_code}")
             raise Exception("Failed to fetch top ONAs anime list")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_anime_data(soup, page, total_pages)
+        return upstream.parse(response, self._parse_anime_data, page, total_pages)
     
     async def scrape_top_special(self, page: int = 1, total_pages = 1):
         logger.info(f"Scraping top special anime list for page {page}")
         limit = (page - 1) * 50
         url = f"{self.mal_top_special}&limit={limit}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             logger.error(f"Failed to fetch top special anime list. Status code: {response.status_code}")
             raise Exception("Failed to fetch top special anime list")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_anime_data(soup, page, total_pages)
+        return upstream.parse(response, self._parse_anime_data, page, total_pages)
     
     async def scrape_most_popular(self, page: int = 1, total_pages = 1):
         logger.info(f"Scraping most popular anime list for page {page}")
         limit = (page - 1) * 50
         url = f"{self.mal_most_popular}&limit={limit}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             logger.error(f"Failed to fetch most popular anime list. Status code: {response.status_code}")
             raise Exception("Failed to fetch most popular anime list")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_anime_data(soup, page, total_pages)
+        return upstream.parse(response, self._parse_anime_data, page, total_pages)
     
     async def scrape_most_favorited(self, page: int = 1, total_pages = 1):
         logger.info(f"Scraping most favorited anime list for page {page}")
         limit = (page - 1) * 50
         url = f"{self.mal_most_favorited}&limit={limit}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             logger.error(f"Failed to fetch most favorited anime list. Status code: {response.status_code}")
             raise Exception("Failed to fetch most favorited anime list")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_anime_data(soup, page, total_pages)
+        return upstream.parse(response, self._parse_anime_data, page, total_pages)
 
     # Main Data Scraper Type 1
     def _parse_anime_data(self, soup, page, total_pages):
@@ -225,30 +204,26 @@ class AnimeMalSeasonAndScheduleScraper:
             season, year = self.get_season_and_year()
             url = f"{self.anime_season}/{year}/{season}"
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             logger.error(f"Failed to fetch anime season data. Status code: {response.status_code}")
             raise Exception("Failed to fetch anime season data")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_anime_season_data(soup, year, season, scrape_type="season")
+        return upstream.parse(response, self._parse_anime_season_data, year, season, "season")
     
     async def scrape_anime_schedule(self):
         logger.info("Scraping anime schedule data")
         url = self.anime_schedule
         season, year = self.get_season_and_year()
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             logger.error(f"Failed to fetch anime schedule data. Status code: {response.status_code}")
             raise Exception("Failed to fetch anime season data")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_anime_season_data(soup, year, season,  scrape_type="schedule")
+        return upstream.parse(response, self._parse_anime_season_data, year, season, "schedule")
 
     def _parse_anime_season_data(self, soup, year, season, scrape_type):
         logger.debug(f"Parsing anime {scrape_type} data")
@@ -493,15 +468,13 @@ class AnimeSearchScraper:
         url = f"{self.search_url}?{urlencode(url_parts)}"
         
         logger.debug(f"Constructed search URL: {url}")
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             logger.error(f"Failed to fetch anime search results. Status code: {response.status_code}")
             raise Exception("Failed to fetch anime search results")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_search_results(soup, page)
+        return upstream.parse(response, self._parse_search_results, page)
 
     def _parse_search_results(self, soup, page):
         logger.debug("Parsing search results")
@@ -576,15 +549,13 @@ class AnimeDetailsScraper:
     async def scrape_anime_details(self, anime_id: int):
         logger.info(f"Scraping anime details for ID: {anime_id}")
         url = f"{self.base_url}/anime/{anime_id}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             logger.error(f"Failed to fetch anime details for ID {anime_id}. Status code: {response.status_code}")
             raise Exception(f"Failed to fetch anime details for ID {anime_id}")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_anime_details(soup, anime_id)
+        return upstream.parse(response, self._parse_anime_details, anime_id)
 
     def _parse_anime_details(self, soup, anime_id):
         logger.debug(f"Parsing anime details for ID: {anime_id}")
@@ -864,19 +835,16 @@ class AnimeDetailsScraper:
 # character details
     async def scrape_character_details(self, character_id: int) -> Dict:
         url = f"{self.base_url}/character/{character_id}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             logger.error(f"Failed to fetch character details for ID {character_id}. Status code: {response.status_code}")
             raise Exception(f"Failed to fetch character details for ID {character_id}")
 
-        return self._parse_character_details(response.text)
+        return upstream.parse(response, self._parse_character_details)
 
 
-    def _parse_character_details(self, html_content: str) -> Dict:
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
+    def _parse_character_details(self, soup) -> Dict:
         # Extract character name
         name_elem = soup.select_one('h2', class_='normal_header')
         name = name_elem.text.strip() if name_elem else "Unknown"
@@ -961,15 +929,13 @@ class AnimeDetailsScraper:
     async def scrape_person_details(self, person_id: int):
         logger.info(f"Scraping person details for ID: {person_id}")
         url = f"{self.base_url}/people/{person_id}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             logger.error(f"Failed to fetch person details for ID {person_id}. Status code: {response.status_code}")
             raise Exception(f"Failed to fetch person details for ID {person_id}")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_person_details(soup, person_id)
+        return upstream.parse(response, self._parse_person_details, person_id)
 
     def _parse_person_details(self, soup, person_id):
         details = {}
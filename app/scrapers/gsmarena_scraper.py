@@ -1,7 +1,6 @@
-import httpx
-from bs4 import BeautifulSoup
 from fastapi import HTTPException
 from app.models.gsmarena_model import GSMArenaPhoneData, GSMArenaSearchResponse, PhoneDetailsResponse
+from app.core.upstream import upstream
 import logging
 
 class GSMArenaScraper:
@@ -12,35 +11,31 @@ class GSMArenaScraper:
     async def fetch(self, url):
         proxied_url = f"{self.proxy_base_url}{url}"
         self.logger.info(f"Fetching data from proxied URL: {proxied_url}")
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            response = await client.get(proxied_url)
-            if response.status_code != 200:
-                self.logger.error(f"Error fetching data. Status code: {response.status_code}")
-                raise HTTPException(status_code=response.status_code, detail="Error fetching data")
-            return response
+        response = await upstream.get(proxied_url, follow_redirects=True)
+        if response.status_code != 200:
+            self.logger.error(f"Error fetching data. Status code: {response.status_code}")
+            raise HTTPException(status_code=response.status_code, detail="Error fetching data")
+        return response
 
     async def fetch_Normal(self, url):
         self.logger.info(f"Fetching data from URL: {url}")
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            response = await client.get(url)
-            if response.status_code != 200:
-                self.logger.error(f"Error fetching data. Status code: {response.status_code}")
-                raise HTTPException(status_code=response.status_code, detail="Error fetching data")
-            return response
+        response = await upstream.get(url, follow_redirects=True)
+        if response.status_code != 200:
+            self.logger.error(f"Error fetching data. Status code: {response.status_code}")
+            raise HTTPException(status_code=response.status_code, detail="Error fetching data")
+        return response
 
     async def scrape(self, search_query: str):
         self.logger.info(f"Scraping GSMArena for query: '{search_query}'")
         url = f"https://www.gsmarena.com/results.php3?sQuickSearch=yes&sName={search_query}"
         response = await self.fetch_Normal(url)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_data(soup)
+        return upstream.parse(response, self._parse_data)
     
     async def scrapeTopSeventy(self):
         self.logger.info("Scraping top seventy phones from GSMArena")
         url = f"https://www.gsmarena.com/results.php3?sQuickSearch=yes&sName="
         response = await self.fetch(url)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_data(soup)
+        return upstream.parse(response, self._parse_data)
 
     def _parse_data(self, soup):
         try:
@@ -81,18 +76,16 @@ class GSMArenaPhoneInfoScraper:
     async def fetch(self, id):
         proxied_url = f"{self.proxy_base_url}https://www.gsmarena.com/{id}"
         self.logger.info(f"Fetching phone details from proxied URL: {proxied_url}")
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            response = await client.get(proxied_url)
-            if response.status_code != 200:
-                self.logger.error(f"Error fetching phone details. Status code: {response.status_code}")
-                raise HTTPException(status_code=response.status_code, detail="Error fetching data")
-            return response
+        response = await upstream.get(proxied_url, follow_redirects=True)
+        if response.status_code != 200:
+            self.logger.error(f"Error fetching phone details. Status code: {response.status_code}")
+            raise HTTPException(status_code=response.status_code, detail="Error fetching data")
+        return response
 
     async def scrape_phone_details(self, id: str):
         self.logger.info(f"Scraping phone details for ID: {id}")
         response = await self.fetch(id)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_phone_details(soup, id)
+        return upstream.parse(response, self._parse_phone_details, id)
 
     def _parse_phone_details(self, soup, id):
         try:
@@ -1,10 +1,10 @@
-import httpx
 from bs4 import BeautifulSoup
 from fastapi import HTTPException
 from pydantic import BaseModel
 from app.models.hero_model import HeroData, HeroSearchResponse, HeroDetail, HeroSearchResult
 from typing import List
 from urllib.parse import unquote
+from app.core.upstream import upstream
 import logging
 
 class HeroScraper:
@@ -14,15 +14,13 @@ class HeroScraper:
     async def scrape(self, start: str):
         self.logger.info(f"Scraping heroes starting with '{start}'")
         url = f"https://hero.fandom.com/wiki/Category:Superheroes?from={start}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             self.logger.error(f"Failed to fetch hero data. Status code: {response.status_code}")
             raise HTTPException(status_code=404, detail="Hero data not found")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_data(soup)
+        return upstream.parse(response, self._parse_data)
 
     def _parse_data(self, soup):
         try:
@@ -60,15 +58,13 @@ class HeroScraper:
     async def scrape_hero_detail(self, hero_id: str):
         self.logger.info(f"Scraping details for hero with ID: {hero_id}")
         url = f"https://hero.fandom.com/wiki/{hero_id}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             self.logger.error(f"Failed to fetch hero details for ID {hero_id}. Status code: {response.status_code}")
             raise HTTPException(status_code=404, detail="Hero details not found")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_hero_detail(soup, hero_id)
+        return upstream.parse(response, self._parse_hero_detail, hero_id)
 
     def _parse_hero_detail(self, soup, hero_id):
         try:
@@ -155,15 +151,13 @@ class HeroScraper:
         query = unquote(query).replace(" ", '+')
         self.logger.info(f"Searching heroes with query: '{query}'")
         url = f"https://hero.fandom.com/wiki/Special:Search?query={query}&scope=internal&navigationSearch=true"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             self.logger.error(f"Hero search failed for query '{query}'. Status code: {response.status_code}")
             raise HTTPException(status_code=404, detail="Hero search failed")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_search_results(soup)
+        return upstream.parse(response, self._parse_search_results)
 
     def _parse_search_results(self, soup: BeautifulSoup) -> HeroSearchResponse:
         self.logger.debug("Parsing hero search results")
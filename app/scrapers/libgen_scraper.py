@@ -1,7 +1,6 @@
-import httpx
-from bs4 import BeautifulSoup
 from fastapi import HTTPException
 from app.models.libgen_model import LibgenBookData, LibgenSearchResponse
+from app.core.upstream import upstream
 import logging
 
 class LibgenScraper:
@@ -11,15 +10,13 @@ class LibgenScraper:
     async def scrape(self, bookname: str):
         self.logger.info(f"Scraping Libgen for book: '{bookname}'")
         url = f"https://libgen.is/search.php?req={bookname}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             self.logger.error(f"Failed to fetch book data for '{bookname}'. Status code: {response.status_code}")
             raise HTTPException(status_code=404, detail="Book data not found")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_data(soup)
+        return upstream.parse(response, self._parse_data)
 
     def _parse_data(self, soup):
         try:
@@ -83,38 +80,43 @@ class LibgenDownloadScraper:
 
     async def _scrape_library_lol(self, url: str):
         self.logger.debug(f"Scraping library.lol URL: {url}")
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             self.logger.error(f"Failed to fetch download page from library.lol. Status code: {response.status_code}")
             raise HTTPException(status_code=404, detail="Download page not found")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        download_button = soup.find('div', id='download').find('h2').find('a')
+        href = upstream.parse(response, self._parse_library_lol_link)
 
-        if download_button and 'href' in download_button.attrs:
+        if href:
             self.logger.info("Successfully found download link on library.lol")
-            return download_button['href']
+            return href
         else:
             self.logger.error("Download link not found on library.lol page")
             raise HTTPException(status_code=500, detail="Download link not found on library.lol")
 
     async def _scrape_libgen_li(self, url: str):
         self.logger.debug(f"Scraping libgen.li URL: {url}")
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
 
         if response.status_code != 200:
             self.logger.error(f"Failed to fetch download page from libgen.li. Status code: {response.status_code}")
             raise HTTPException(status_code=404, detail="Download page not found")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        download_button = soup.find('td', bgcolor="#A9F5BC").find('a')
+        href = upstream.parse(response, self._parse_libgen_li_link)
 
-        if download_button and 'href' in download_button.attrs:
+        if href:
             self.logger.info("Successfully found download link on libgen.li")
-            return f"http://libgen.li/{download_button['href']}"
+            return f"http://libgen.li/{href}"
         else:
             self.logger.error("Download link not found on libgen.li page")
-            raise HTTPException(status_code=500, detail="Download link not found on libgen.li")
\ No newline at end of file
+            raise HTTPException(status_code=500, detail="Download link not found on libgen.li")
+
+    # Return the href rather than the tag, so a memoized result does not keep the whole parse tree alive
+    def _parse_library_lol_link(self, soup):
+        download_button = soup.find('div', id='download').find('h2').find('a')
+        return download_button.get('href') if download_button else None
+
+    def _parse_libgen_li_link(self, soup):
+        download_button = soup.find('td', bgcolor="#A9F5BC").find('a')
+        return download_button.get('href') if download_button else None
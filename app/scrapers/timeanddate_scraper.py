@@ -1,7 +1,7 @@
 import re
-import httpx
-from bs4 import BeautifulSoup
 from fastapi import HTTPException
+from app.core.upstream import upstream
+from app.core.deadline import DeadlineExceeded, omit
 import logging
 from datetime import datetime
 from app.models.timeanddate_model import TimeAndDateWeatherData, Temperature, Condition, AdditionalConditions, AstronomyData, SunMoonData
@@ -20,19 +20,25 @@ class TimeAndDateScraper:
     async def scrape(self, country: str, location: str):
         self.logger.info(f"Scraping weather data for {location}, {country}")
         url = f"https://www.timeanddate.com/weather/{country}/{location}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
         
         if response.status_code != 200:
             self.logger.error(f"Failed to fetch weather data for {location}, {country}. Status code: {response.status_code}")
             raise HTTPException(status_code=404, detail="Weather data not found")
         
-        soup = BeautifulSoup(response.text, 'html.parser')
-        weather_data = self._parse_data(soup)
+        weather_data = upstream.parse(response, self._parse_data)
 
         self.logger.info(f"Scraping astronomy data for {location}, {country}")
-        astronomy_data = await self.scrape_astronomy(country, location)
-
+        try:
+            astronomy_data = await self.scrape_astronomy(country, location)
+        except DeadlineExceeded:
+            # astronomy is an optional extra on the model; return the weather without it rather than nothing
+            self.logger.warning(f"Out of time before astronomy data for {location}, {country}; returning weather only")
+            omit("astronomy")
+            astronomy_data = None
+
+        # Copy before attaching astronomy so the memoized parse result is never mutated
+        weather_data = weather_data.model_copy()
         weather_data.astronomy = astronomy_data
         self.logger.info(f"Successfully scraped weather and astronomy data for {location}, {country}")
         return weather_data
@@ -104,15 +110,13 @@ class TimeAndDateScraper:
     async def scrape_astronomy(self, country: str, location: str):
         self.logger.info(f"Scraping astronomy data for {location}, {country}")
         url = f"https://www.timeanddate.com/astronomy/{country}/{location}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
         
         if response.status_code != 200:
             self.logger.error(f"Failed to fetch astronomy data for {location}, {country}. Status code: {response.status_code}")
             raise HTTPException(status_code=404, detail="Astronomy data not found")
         
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_astronomy_data(soup)
+        return upstream.parse(response, self._parse_astronomy_data)
 
     def _parse_astronomy_data(self, soup):
         self.logger.debug("Parsing astronomy data from HTML")
@@ -246,15 +250,13 @@ class TimeAndDateScraper:
     async def scrape_14_day_forecast(self, country: str, location: str):
         self.logger.info(f"Scraping 14-day forecast for {location}, {country}")
         url = f"https://www.timeanddate.com/weather/{country}/{location}/ext"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=self.headers)
+        response = await upstream.get(url, headers=self.headers)
         
         if response.status_code != 200:
             self.logger.error(f"Failed to fetch 14-day forecast for {location}, {country}. Status code: {response.status_code}")
             raise HTTPException(status_code=404, detail="14-day forecast data not found")
         
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_14_day_forecast(soup, location)
+        return upstream.parse(response, self._parse_14_day_forecast, location)
 
     def _parse_14_day_forecast(self, soup, location):
         self.logger.debug(f"Parsing 14-day forecast for {location}")
@@ -343,15 +345,13 @@ class TimeAndDateScraper:
     async def scrape_24hour_forecast(self, country: str, location: str):
         self.logger.info(f"Scraping 24-hour forecast for {location}, {country}")
         url = f"https://www.timeanddate.com/weather/{country}/{location}/hourly"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=self.headers)
+        response = await upstream.get(url, headers=self.headers)
         
         if response.status_code != 200:
             self.logger.error(f"Failed to fetch 24-hour forecast for {location}, {country}. Status code: {response.status_code}")
             raise HTTPException(status_code=404, detail="24-hour forecast data not found")
         
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return self._parse_24hour_forecast(soup, location)
+        return upstream.parse(response, self._parse_24hour_forecast, location)
 
     def _parse_24hour_forecast(self, soup, location):
         self.logger.debug(f"Parsing 24-hour forecast for {location}")
@@ -1,7 +1,7 @@
-import httpx
-from bs4 import BeautifulSoup
 from fastapi import HTTPException
 from app.models.wunderground_model import WundergroundWeatherData, Temperature, Condition, AirQuality, AdditionalConditions, Astronomy
+from app.core.upstream import upstream
+from app.core.deadline import DeadlineExceeded, omit
 import logging
 
 def fahrenheit_to_celsius(fahrenheit):
@@ -14,17 +14,29 @@ class WundergroundScraper:
     async def scrape(self, country_code: str, location: str):
         self.logger.info(f"Scraping weather data for {location}, {country_code}")
         url = f"https://www.wunderground.com/weather/{country_code}/{location}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await upstream.get(url)
         
         if response.status_code != 200:
             self.logger.error(f"Failed to fetch weather data for {location}, {country_code}. Status code: {response.status_code}")
             raise HTTPException(status_code=404, detail="Weather data not found")
         
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return await self._parse_data(soup)
+        page = upstream.parse(response, self._parse_page)
+        air_quality = await self._fetch_air_quality(page['health_url'])
+
+        self.logger.info("Successfully parsed all weather data")
+        return WundergroundWeatherData(
+            location=page['basic_info']['location'],
+            temperature=page['basic_info']['temperature'],
+            feels_like=page['basic_info']['feels_like'],
+            condition=page['basic_info']['condition'],
+            forecast=page['basic_info']['forecast'],
+            pollen=air_quality['pollen'],
+            air_quality=air_quality['air_quality'],
+            additional_conditions=page['additional_conditions'],
+            astronomy=page['astronomy']
+        )
 
-    async def _parse_data(self, soup):
+    def _parse_page(self, soup):
         city_conditions = soup.find('div', class_='region-content-main')
         if not city_conditions:
             self.logger.error("Error finding weather data container")
@@ -33,31 +45,24 @@ class WundergroundScraper:
         try:
             self.logger.debug("Parsing basic weather information")
             basic_info = self._parse_basic_info(soup, city_conditions)
-            
-            self.logger.debug("Parsing air quality information")
-            air_quality = await self._parse_air_quality(soup)
-            
+
+            self.logger.debug("Finding the air quality page")
+            health_url = self._parse_health_url(soup)
+
             self.logger.debug("Parsing additional conditions")
             additional_conditions = self._parse_additional_conditions(soup)
-            
+
             self.logger.debug("Parsing astronomy information")
             astronomy = self._parse_astronomy(soup)
-
-            self.logger.info("Successfully parsed all weather data")
-            return WundergroundWeatherData(
-                location=basic_info['location'],
-                temperature=basic_info['temperature'],
-                feels_like=basic_info['feels_like'],
-                condition=basic_info['condition'],
-                forecast=basic_info['forecast'],
-                pollen=air_quality['pollen'],
-                air_quality=air_quality['air_quality'],
-                additional_conditions=additional_conditions,
-                astronomy=astronomy
-            )
         except (AttributeError, ValueError) as e:
             self.logger.error(f"Error parsing weather data: {str(e)}", exc_info=True)
             raise HTTPException(status_code=500, detail=f"Error parsing weather data: {str(e)}")
+        return {
+            'basic_info': basic_info,
+            'health_url': health_url,
+            'additional_conditions': additional_conditions,
+            'astronomy': astronomy,
+        }
 
     def _parse_basic_info(self, soup, city_conditions):
         self.logger.debug("Parsing basic weather information")
@@ -84,25 +89,28 @@ class WundergroundScraper:
             'forecast': forecast_text
         }
 
-    async def _parse_air_quality(self, soup):
-        self.logger.debug("Parsing air quality information")
+    def _parse_health_url(self, soup):
         forecast_sections = soup.find_all('div', class_='city-forecast')
         if len(forecast_sections) < 2:
             self.logger.warning("Forecast section not found")
             raise HTTPException(status_code=500, detail="Forecast section not found")
+        return forecast_sections[1].find('lib-air-quality-tile').find('a')['href']
 
-        forecast_section = forecast_sections[1]
-        health_url = forecast_section.find('lib-air-quality-tile').find('a')['href']
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"https://www.wunderground.com{health_url}")
+    async def _fetch_air_quality(self, health_url):
+        self.logger.debug("Parsing air quality information")
+        try:
+            response = await upstream.get(f"https://www.wunderground.com{health_url}")
+        except DeadlineExceeded:
+            omit("air_quality")
+            response = None
 
-        if response.status_code != 200:
+        if response is None or response.status_code != 200:
             self.logger.warning("Failed to fetch air quality data")
             return {"pollen": "No data", "air_quality": AirQuality(aqi_value="No data", aqi_type="No data", api_icon="No data", aqi_suggestion="No data", dominant_pollutant="No data", pollutant_desc="No data")}
 
-        aq_soup = BeautifulSoup(response.text, 'html.parser')
-        
+        return upstream.parse(response, self._parse_air_quality)
+
+    def _parse_air_quality(self, aq_soup):
         aqi_value = aq_soup.find('div', class_='aqi-value').text.strip() if aq_soup.find('div', class_='aqi-value') else "No data"
         aqi_type = aq_soup.find('div', class_='aqi-type').text.strip() if aq_soup.find('div', class_='aqi-type') else "No data"
         
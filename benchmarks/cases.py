@@ -0,0 +1,53 @@
+"""Upstream page types: the URL each fixture was recorded from and the parser that consumes it."""
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Tuple
+from app.scrapers.anime.mal_scraper import AnimeMalScraper, AnimeMalSeasonAndScheduleScraper, AnimeSearchScraper, AnimeDetailsScraper
+from app.scrapers.timeanddate_scraper import TimeAndDateScraper
+from app.scrapers.wunderground_scraper import WundergroundScraper
+from app.scrapers.gsmarena_scraper import GSMArenaScraper, GSMArenaPhoneInfoScraper
+from app.scrapers.hero_scraper import HeroScraper
+from app.scrapers.libgen_scraper import LibgenScraper
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+@dataclass(frozen=True)
+class Case:
+    name: str
+    url: str
+    parser: Callable[..., Any]
+    args: Tuple = ()
+
+    @property
+    def fixture(self) -> str:
+        return os.path.join(FIXTURES_DIR, f"{self.name}.html")
+
+    def load(self) -> str:
+        with open(self.fixture, encoding="utf-8") as f:
+            return f.read()
+
+
+_mal, _season, _search, _details = AnimeMalScraper(), AnimeMalSeasonAndScheduleScraper(), AnimeSearchScraper(), AnimeDetailsScraper()
+_timeanddate, _hero = TimeAndDateScraper(), HeroScraper()
+
+CASES = [
+    Case("mal_top", "https://myanimelist.net/topanime.php?limit=0", _mal._parse_anime_data, (1, 1)),
+    Case("mal_season", "https://myanimelist.net/anime/season/2024/fall", _season._parse_anime_season_data, (2024, "fall", "season")),
+    Case("mal_schedule", "https://myanimelist.net/anime/season/schedule", _season._parse_anime_season_data, (2024, "fall", "schedule")),
+    Case("mal_search", "https://myanimelist.net/anime.php?q=naruto&cat=anime", _search._parse_search_results, (1,)),
+    Case("mal_details", "https://myanimelist.net/anime/5114", _details._parse_anime_details, (5114,)),
+    Case("mal_character", "https://myanimelist.net/character/11", _details._parse_character_details),
+    Case("mal_person", "https://myanimelist.net/people/11", _details._parse_person_details, (11,)),
+    Case("timeanddate_current", "https://www.timeanddate.com/weather/uk/london", _timeanddate._parse_data),
+    Case("timeanddate_astronomy", "https://www.timeanddate.com/astronomy/uk/london", _timeanddate._parse_astronomy_data),
+    Case("timeanddate_14day", "https://www.timeanddate.com/weather/uk/london/ext", _timeanddate._parse_14_day_forecast, ("london",)),
+    Case("timeanddate_hourly", "https://www.timeanddate.com/weather/uk/london/hourly", _timeanddate._parse_24hour_forecast, ("london",)),
+    Case("wunderground", "https://www.wunderground.com/weather/gb/london", WundergroundScraper()._parse_page),
+    Case("gsmarena_search", "https://www.gsmarena.com/results.php3?sQuickSearch=yes&sName=samsung", GSMArenaScraper()._parse_data),
+    Case("gsmarena_specs", "https://www.gsmarena.com/samsung_galaxy_s24_ultra-12771.php", GSMArenaPhoneInfoScraper()._parse_phone_details, ("samsung_galaxy_s24_ultra-12771.php",)),
+    Case("hero_category", "https://hero.fandom.com/wiki/Category:Superheroes?from=A", _hero._parse_data),
+    Case("hero_detail", "https://hero.fandom.com/wiki/Spider-Man", _hero._parse_hero_detail, ("Spider-Man",)),
+    Case("hero_search", "https://hero.fandom.com/wiki/Special:Search?query=spider&scope=internal&navigationSearch=true", _hero._parse_search_results),
+    Case("libgen_search", "https://libgen.is/search.php?req=python", LibgenScraper()._parse_data),
+]
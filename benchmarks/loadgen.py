@@ -0,0 +1,133 @@
+"""Open-loop load generator for the API: sends requests at a fixed rate and reports latency percentiles per route.
+
+Requests are started on schedule whether or not earlier ones have finished, and latency is measured from the
+scheduled start, so a stalled server shows up in the percentiles instead of quietly lowering the request rate.
+
+    python -m benchmarks.stub_upstream --latency-ms 80 &
+    UPSTREAM_BASE_URL=http://127.0.0.1:9000 python main.py &
+    python -m benchmarks.loadgen --rps 200 --duration 30
+
+Run the API with CACHE_ENABLED=false to measure the full fetch and parse path rather than cache hits.
+Per-host upstream limits still apply when fetches go to the stub; add UPSTREAM_SCHEDULER_ENABLED=false to take them
+out of the measurement.
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+from typing import Dict, List, Tuple
+import httpx
+
+# (weight, path); the mix leans on the MAL routes, which carry most production traffic
+DEFAULT_MIX: List[Tuple[int, str]] = [
+    (20, "/anime/mal/top?page=1"),
+    (10, "/anime/mal/top_airing?page=1"),
+    (8, "/anime/mal/season?y=2024&s=fall"),
+    (6, "/anime/mal/schedule"),
+    (8, "/anime/mal/search?q=naruto"),
+    (10, "/anime/mal/details?id=5114"),
+    (4, "/anime/mal/character?id=11"),
+    (4, "/anime/mal/person?id=11"),
+    (8, "/weather/timeanddate/uk/london"),
+    (4, "/weather/timeanddate/uk/london/14day"),
+    (4, "/weather/timeanddate/uk/london/24hour"),
+    (2, "/weather/wunderground/gb/london"),
+    (4, "/phones/gsmarena/samsung"),
+    (4, "/phones/gsmarena?id=samsung_galaxy_s24_ultra-12771.php"),
+    (4, "/hero/heroes?start=A"),
+    (4, "/hero/details?heroid=Spider-Man"),
+    (2, "/hero/search?q=spider"),
+    (4, "/books/libgen/python"),
+]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run(base_url: str, mix: List[Tuple[int, str]], rps: float, duration: float, timeout: float):
+    weights = [weight for weight, _ in mix]
+    paths = [path for _, path in mix]
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=1000)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def fire(path: str, scheduled: float):
+            route = path.split("?")[0]
+            try:
+                response = await client.get(path)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies[route].append(time.perf_counter() - scheduled)
+            statuses[route][status] += 1
+
+        tasks = []
+        started = time.perf_counter()
+        total = int(rps * duration)
+        for i in range(total):
+            scheduled = started + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(random.choices(paths, weights)[0], scheduled)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    return latencies, statuses, total / elapsed
+
+
+def report(latencies, statuses, achieved_rps: float, as_json: bool):
+    rows = {}
+    for route in sorted(latencies):
+        values = sorted(latencies[route])
+        rows[route] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1),
+            "statuses": dict(statuses[route]),
+        }
+    everything = sorted(value for values in latencies.values() for value in values)
+    overall = {
+        "count": len(everything),
+        "achieved_rps": round(achieved_rps, 1),
+        "p50_ms": round(percentile(everything, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(everything, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(everything, 0.99) * 1000, 1),
+    }
+    if as_json:
+        print(json.dumps({"overall": overall, "routes": rows}, indent=2))
+        return
+
+    print(f"{'route':<36} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}  statuses")
+    for route, row in rows.items():
+        print(f"{route:<36} {row['count']:>7} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} {row['max_ms']:>9}  {row['statuses']}")
+    print(f"{'overall':<36} {overall['count']:>7} {overall['p50_ms']:>9} {overall['p95_ms']:>9} {overall['p99_ms']:>9}"
+          f"  achieved {overall['achieved_rps']} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the API at a target request rate")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--rps", type=float, default=50)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--path", action="append", help="Request only these paths (repeatable) instead of the default mix")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    mix = [(1, path) for path in args.path] if args.path else DEFAULT_MIX
+    latencies, statuses, achieved = asyncio.run(run(args.base_url, mix, args.rps, args.duration, args.timeout))
+    report(latencies, statuses, achieved, args.json)
+
+
+if __name__ == "__main__":
+    main()
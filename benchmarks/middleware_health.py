@@ -0,0 +1,80 @@
+"""Throughput of /health behind the error-handling middleware, old and new.
+
+Compares no middleware, the previous BaseHTTPMiddleware-based handler and the
+current pure ASGI ErrorHandlingMiddleware, driving the app in-process so only
+middleware overhead is measured.
+
+    python -m benchmarks.middleware_health --requests 20000 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import time
+import httpx
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+from app.middleware import ErrorHandlingMiddleware
+
+
+class LegacyErrorHandlingMiddleware(BaseHTTPMiddleware):
+    """The BaseHTTPMiddleware implementation that ErrorHandlingMiddleware replaced, kept for comparison."""
+
+    async def dispatch(self, request: Request, call_next):
+        try:
+            return await call_next(request)
+        except Exception as e:
+            logging_payload = {"error_type": type(e).__name__, "request_headers": dict(request.headers)}
+            json.dumps(logging_payload, indent=2)
+            return Response(content=json.dumps({"error": "An internal server error occurred"}), status_code=500, media_type="application/json")
+
+
+def build_app(middleware):
+    app = FastAPI()
+    if middleware is not None:
+        app.add_middleware(middleware)
+
+    @app.get("/health")
+    def health_check():
+        return {"status": "healthy"}
+
+    return app
+
+
+async def run(app, total: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        remaining = iter(range(total))
+
+        async def worker():
+            for _ in remaining:
+                response = await client.get("/health")
+                assert response.status_code == 200
+
+        await client.get("/health")
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return total / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    variants = {
+        "none": None,
+        "BaseHTTPMiddleware (old)": LegacyErrorHandlingMiddleware,
+        "pure ASGI (current)": ErrorHandlingMiddleware,
+    }
+    results = {name: asyncio.run(run(build_app(middleware), args.requests, args.concurrency)) for name, middleware in variants.items()}
+
+    baseline = results["none"]
+    for name, rps in results.items():
+        print(f"{name:<28} {rps:>10.0f} req/s  ({rps / baseline:.0%} of no middleware)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Offline microbenchmarks for every scraper parse path, run against the HTML fixtures in benchmarks/fixtures.
+
+Each operation is what UpstreamClient._run_parser does per upstream response: build the BeautifulSoup tree and
+run the parser on it. Peak memory is measured in a separate tracemalloc run so it does not skew the timings.
+
+    python -m benchmarks.parsers                      # run and compare with benchmarks/baseline.json
+    python -m benchmarks.parsers -k mal_              # only cases whose name contains "mal_"
+    python -m benchmarks.parsers --save-baseline      # record the current numbers as the new baseline
+
+Exits with status 1 when a case is slower (ops/sec) or hungrier (peak memory) than the baseline by more than
+--tolerance. Baselines are machine-specific; regenerate them on the machine that runs the comparison.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tracemalloc
+from statistics import median
+from typing import Dict, List
+from bs4 import BeautifulSoup
+from benchmarks.cases import CASES, Case
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def run_once(case: Case, html: str):
+    return case.parser(BeautifulSoup(html, 'html.parser'), *case.args)
+
+
+def measure(case: Case, min_time: float, rounds: int) -> Dict[str, float]:
+    html = case.load()
+    run_once(case, html)  # warm up and fail fast on a broken fixture
+
+    # Size the inner loop so each round takes about min_time, then keep the median round
+    loops, elapsed = 1, 0.0
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            run_once(case, html)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / 5:
+            break
+        loops *= 2
+    loops = max(1, int(loops * min_time / elapsed))
+    per_op = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(loops):
+            run_once(case, html)
+        per_op.append((time.perf_counter() - started) / loops)
+
+    tracemalloc.start()
+    try:
+        run_once(case, html)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "ops_per_sec": round(1 / median(per_op), 2),
+        "mean_ms": round(sum(per_op) / len(per_op) * 1000, 3),
+        "peak_kib": round(peak / 1024, 1),
+        "fixture_kib": round(len(html.encode()) / 1024, 1),
+    }
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["ops_per_sec"] < base["ops_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['ops_per_sec']} ops/s vs baseline {base['ops_per_sec']}")
+        if result["peak_kib"] > base["peak_kib"] * (1 + tolerance):
+            regressions.append(f"{name}: peak {result['peak_kib']} KiB vs baseline {base['peak_kib']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scraper parser microbenchmarks")
+    parser.add_argument("-k", "--filter", default="", help="Only run cases whose name contains this string")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Target seconds per timing round")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed fractional regression before failing")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Write these results to the baseline file")
+    args = parser.parse_args()
+
+    # The parsers log every call at INFO; that would dominate the timings
+    logging.disable(logging.CRITICAL)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    print(f"{'case':<24} {'ops/sec':>10} {'mean ms':>10} {'peak KiB':>10} {'html KiB':>10} {'vs base':>9}")
+    for case in CASES:
+        if args.filter not in case.name:
+            continue
+        result = results[case.name] = measure(case, args.min_time, args.rounds)
+        base = baseline.get(case.name)
+        change = f"{result['ops_per_sec'] / base['ops_per_sec'] - 1:+.0%}" if base else "new"
+        print(f"{case.name:<24} {result['ops_per_sec']:>10.1f} {result['mean_ms']:>10.3f} {result['peak_kib']:>10.1f} {result['fixture_kib']:>10.1f} {change:>9}")
+
+    if args.save_baseline:
+        merged = {**baseline, **results}
+        with open(args.baseline, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "results": merged}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nRegressions beyond tolerance:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Refresh benchmarks/fixtures from the live sites, one page per benchmark case.
+
+    python -m benchmarks.record_fixtures                # every case
+    python -m benchmarks.record_fixtures mal_details    # just the named cases
+    python -m benchmarks.record_fixtures --from-archive upstream_archive.sqlite3   # pages the API recorded in production
+
+Regenerate benchmarks/baseline.json afterwards, since timings depend on the page contents.
+"""
+import asyncio
+import argparse
+import httpx
+from app.core.archive import UpstreamArchive
+from benchmarks.cases import CASES
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/85.0.4183.121 Safari/537.36',
+    'Accept-Language': 'en-US,en;q=0.9',
+}
+
+
+def save(case, text: str, size: int):
+    with open(case.fixture, "w", encoding="utf-8") as f:
+        f.write(text)
+    print(f"{case.name}: {size / 1024:.1f} KiB")
+
+
+def from_archive(path: str, names):
+    """Copy the latest archived response for each case URL, as recorded with UPSTREAM_RECORD_SAMPLE_RATE."""
+    archive = UpstreamArchive(path)
+    for case in CASES:
+        if names and case.name not in names:
+            continue
+        recorded = archive.get(case.url)
+        if recorded is None or recorded[0] != 200:
+            print(f"{case.name}: not in the archive, fixture left unchanged")
+            continue
+        # Wrap the stored wire bytes in a response so httpx undoes any content encoding
+        response = httpx.Response(200, headers=recorded[1], stream=httpx.ByteStream(recorded[2]), request=httpx.Request("GET", case.url))
+        response.read()
+        save(case, response.text, len(response.content))
+    archive.close()
+
+
+async def record(names):
+    async with httpx.AsyncClient(headers=HEADERS, follow_redirects=True, timeout=20) as client:
+        for case in CASES:
+            if names and case.name not in names:
+                continue
+            response = await client.get(case.url)
+            if response.status_code != 200:
+                print(f"{case.name}: HTTP {response.status_code}, fixture left unchanged")
+                continue
+            save(case, response.text, len(response.content))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the parser benchmark fixtures")
+    parser.add_argument("cases", nargs="*", help="Case names to refresh; all when omitted")
+    parser.add_argument("--from-archive", help="Read pages from an upstream archive instead of the live sites")
+    args = parser.parse_args()
+    if args.from_archive:
+        from_archive(args.from_archive, set(args.cases))
+    else:
+        asyncio.run(record(set(args.cases)))
@@ -0,0 +1,147 @@
+"""Local stand-in for every upstream site, serving the recorded fixtures in benchmarks/fixtures.
+
+Start it, then point the API at it with UPSTREAM_BASE_URL; every upstream fetch for https://host/path then arrives
+here as /host/path:
+
+    python -m benchmarks.stub_upstream --port 9000 --latency-ms 80 --jitter-ms 40 --error-rate 0.01
+    UPSTREAM_BASE_URL=http://127.0.0.1:9000 python main.py
+
+Responses carry a strong ETag and honour If-None-Match, so upstream revalidation can be exercised as well.
+"""
+import re
+import random
+import asyncio
+import hashlib
+import argparse
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, Response
+from starlette.routing import Route
+from benchmarks.cases import FIXTURES_DIR
+
+# (host/path regex, fixture name); first match wins, so more specific paths come first
+ROUTES: List[Tuple[str, str]] = [
+    (r"myanimelist\.net/topanime\.php", "mal_top"),
+    (r"myanimelist\.net/anime/season/schedule", "mal_schedule"),
+    (r"myanimelist\.net/anime/season", "mal_season"),
+    (r"myanimelist\.net/anime\.php", "mal_search"),
+    (r"myanimelist\.net/anime/\d+", "mal_details"),
+    (r"myanimelist\.net/character/\d+", "mal_character"),
+    (r"myanimelist\.net/people/\d+", "mal_person"),
+    (r"www\.timeanddate\.com/weather/[^/]+/[^/]+/ext", "timeanddate_14day"),
+    (r"www\.timeanddate\.com/weather/[^/]+/[^/]+/hourly", "timeanddate_hourly"),
+    (r"www\.timeanddate\.com/weather/[^/]+/[^/]+", "timeanddate_current"),
+    (r"www\.timeanddate\.com/astronomy/", "timeanddate_astronomy"),
+    (r"www\.wunderground\.com/weather/", "wunderground"),
+    (r"www\.wunderground\.com/health/", "wunderground_health"),
+    (r"www\.gsmarena\.com/results\.php3", "gsmarena_search"),
+    (r"www\.gsmarena\.com/.+\.php", "gsmarena_specs"),
+    (r"hero\.fandom\.com/wiki/Category:", "hero_category"),
+    (r"hero\.fandom\.com/wiki/Special:Search", "hero_search"),
+    (r"hero\.fandom\.com/wiki/", "hero_detail"),
+    (r"libgen\.is/search\.php", "libgen_search"),
+    (r"library\.lol/main/", "library_lol"),
+    (r"libgen\.li/ads\.php", "libgen_li"),
+]
+
+# Pages too small to be worth a fixture file
+INLINE_PAGES = {
+    "wunderground_health": '<div class="aqi-current"><img alt="icon" src="/aqi.svg"><div class="aqi-value">21</div><div class="aqi-type">Good</div><div class="data"><p>Air quality is good.</p><div class="aqi-value">PM2.5</div><div class="aqi-value">O3</div><p class="pollutant-desc">Ozone.</p></div></div><div class="region-pollen"><div class="status">Low</div></div>',
+    "library_lol": '<div id="download"><h2><a href="https://download.library.lol/main/0/stub/book.pdf">GET</a></h2></div>',
+    "libgen_li": '<table><tr><td bgcolor="#A9F5BC"><a href="get.php?md5=stub&amp;key=STUB">GET</a></td></tr></table>',
+}
+
+
+@dataclass
+class Page:
+    body: bytes
+    etag: str
+
+
+@dataclass
+class Behaviour:
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+
+
+class StubUpstream:
+    def __init__(self, behaviour: Behaviour):
+        self.behaviour = behaviour
+        self.routes = [(re.compile(pattern), name) for pattern, name in ROUTES]
+        self.pages: Dict[str, Page] = {}
+        self.served: Dict[str, int] = {}
+
+    def _page(self, name: str) -> Page:
+        page = self.pages.get(name)
+        if page is None:
+            if name in INLINE_PAGES:
+                body = f"<html><body>{INLINE_PAGES[name]}</body></html>".encode()
+            else:
+                with open(f"{FIXTURES_DIR}/{name}.html", "rb") as f:
+                    body = f.read()
+            page = self.pages[name] = Page(body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+        return page
+
+    def resolve(self, target: str) -> Optional[str]:
+        # GSMArena goes through a web proxy; the real target is in its u parameter
+        if target.startswith("webproxy.lumiproxy.com/"):
+            inner = parse_qs(urlsplit("//" + target).query).get("u", [""])[0]
+            target = inner.split("://", 1)[-1]
+        for pattern, name in self.routes:
+            if pattern.match(target):
+                return name
+        return None
+
+    async def handle(self, request: Request) -> Response:
+        target = request.url.path.lstrip("/")
+        if request.url.query:
+            target += "?" + request.url.query
+        name = self.resolve(target)
+
+        behaviour = self.behaviour
+        delay = behaviour.latency + random.uniform(-behaviour.jitter, behaviour.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if name is None:
+            return HTMLResponse("<html><body>Not found</body></html>", status_code=404)
+        if random.random() < behaviour.error_rate:
+            return HTMLResponse("<html><body>Injected error</body></html>", status_code=behaviour.error_status)
+
+        self.served[name] = self.served.get(name, 0) + 1
+        page = self._page(name)
+        if request.headers.get("if-none-match") == page.etag:
+            return Response(status_code=304, headers={"etag": page.etag})
+        return Response(page.body, media_type="text/html; charset=utf-8", headers={"etag": page.etag})
+
+    def stats(self, request: Request) -> Response:
+        return Response(str(self.served), media_type="text/plain")
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[
+            Route("/__stub__/stats", self.stats),
+            Route("/{path:path}", self.handle),
+        ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded upstream fixtures locally")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- spread around the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    args = parser.parse_args()
+
+    behaviour = Behaviour(args.latency_ms / 1000, args.jitter_ms / 1000, args.error_rate, args.error_status)
+    uvicorn.run(StubUpstream(behaviour).app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
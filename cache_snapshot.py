@@ -0,0 +1,74 @@
+"""Build a response cache snapshot before a deploy takes traffic, so the new process starts warm.
+
+    python cache_snapshot.py                                   # the CACHE_WARMER_PATHS, into CACHE_SNAPSHOT_PATH
+    python cache_snapshot.py /anime/mal/top?page=5 /phones/gsmarena/top
+    python cache_snapshot.py --keys hot_paths.txt --output /data/cache_snapshot.jsonl.gz
+
+Each path is requested through the app in-process, exactly as a client would, and the entries it caches are written
+out. Entries already in the output file are kept unless they have expired. A key list has one path per line and may
+come from GET /admin/hot-keys.
+"""
+import os
+import sys
+import asyncio
+import argparse
+import httpx
+from app.core.config import settings
+from app.core.cache import response_cache
+from app.core.upstream import upstream
+from main import app, load_cache_snapshot
+
+
+def read_keys(path: str):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+async def build(paths, output: str, concurrency: int) -> int:
+    if os.path.exists(output):
+        load_cache_snapshot(output)
+    failed = 0
+    slots = asyncio.Semaphore(concurrency)
+
+    async def fetch(client: httpx.AsyncClient, path: str):
+        nonlocal failed
+        async with slots:
+            try:
+                response = await client.get(path)
+                status = str(response.status_code)
+            except Exception as e:
+                status = str(e) or type(e).__name__
+        if status != "200":
+            failed += 1
+        print(f"{path}: {status}")
+
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://cache-snapshot",
+                                     timeout=None) as client:
+            await asyncio.gather(*(fetch(client, path) for path in paths))
+    finally:
+        await upstream.aclose()
+    saved = response_cache.save_snapshot(output)
+    print(f"Wrote {saved} entries to {output}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-build a response cache snapshot from a list of paths.")
+    parser.add_argument("paths", nargs="*", help="paths to cache, e.g. /anime/mal/top?page=1")
+    parser.add_argument("--keys", help="file with one path per line")
+    parser.add_argument("--output", default=settings.CACHE_SNAPSHOT_PATH or "cache_snapshot.jsonl.gz")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    if not settings.CACHE_ENABLED:
+        parser.error("the response cache is disabled (CACHE_ENABLED=false)")
+    paths = args.paths + (read_keys(args.keys) if args.keys else [])
+    if not paths:
+        paths = settings.CACHE_WARMER_PATHS
+    failed = asyncio.run(build(paths, args.output, args.concurrency))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,91 @@
+import os
+import math
 import logging
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request
+from fastapi.exception_handlers import http_exception_handler
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.exceptions import HTTPException as StarletteHTTPException
 from app.core.config import settings
-from app.middleware import ErrorHandlingMiddleware
-from app.api import weather, books, phones, hero, anime
+from app.core.cache import response_cache
+from app.core.upstream import upstream
+from app.core.breaker import CircuitOpenError
+from app.core.deadline import DeadlineExceeded
+from app.core.metrics import registry
+from app.core.loop_monitor import LoopLagMonitor
+from app.core.warmer import CacheWarmer
+from app.core.hotkeys import hot_keys
+from app.core.peers import peer_cache
+from app.core.admission import admission
+from app.middleware import (
+    ErrorHandlingMiddleware, HTTPCacheMiddleware, MetricsMiddleware, ServerTimingMiddleware, DeadlineMiddleware,
+    ClientDisconnectMiddleware, CachePolicy,
+)
+from app.api import weather, books, phones, hero, anime, admin
 
 logging.basicConfig(level=settings.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Infinite API", description="Collection of multiple APIs.")
+def load_cache_snapshot(path: str):
+    if not os.path.exists(path):
+        return
+    try:
+        loaded = response_cache.load_snapshot(path, settings.CACHE_MODE)
+        logger.info(f"Loaded {loaded} unexpired response cache entries from {path}")
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Could not load the response cache snapshot {path}: {e}")
+
+def save_cache_snapshot(path: str):
+    try:
+        saved = response_cache.save_snapshot(path)
+        logger.info(f"Saved {saved} response cache entries to {path}")
+    except OSError as e:
+        logger.warning(f"Could not save the response cache snapshot {path}: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop_monitor = LoopLagMonitor(settings.LOOP_MONITOR_INTERVAL, settings.LOOP_LAG_THRESHOLD)
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    warmer = CacheWarmer(
+        app, settings.CACHE_WARMER_PATHS, settings.CACHE_WARMER_LEAD_SECONDS, settings.CACHE_WARMER_JITTER_SECONDS,
+        settings.CACHE_WARMER_RETRY_SECONDS,
+        hot_keys=hot_keys if settings.HOT_KEYS_ENABLED else None,
+        hot_count=settings.CACHE_WARMER_HOT_KEYS,
+        hot_min_count=settings.CACHE_WARMER_HOT_MIN_COUNT,
+        hot_sync=settings.CACHE_WARMER_HOT_SYNC_SECONDS,
+    )
+    snapshot = settings.CACHE_SNAPSHOT_PATH if settings.CACHE_ENABLED else ""
+    # Before the warmer starts, so it finds the restored entries fresh and leaves them alone
+    if snapshot:
+        load_cache_snapshot(snapshot)
+    if settings.CACHE_ENABLED and settings.CACHE_WARMER_ENABLED and (warmer.paths or warmer.hot_keys is not None):
+        warmer.start()
+    yield
+    await warmer.stop()
+    if snapshot:
+        save_cache_snapshot(snapshot)
+    await loop_monitor.stop()
+    if peer_cache is not None:
+        await peer_cache.aclose()
+    await upstream.aclose()
+
+app = FastAPI(title="Infinite API", description="Collection of multiple APIs.", lifespan=lifespan)
+
+app.add_middleware(
+    HTTPCacheMiddleware,
+    policies={
+        "/weather": CachePolicy(max_age=settings.CACHE_TTL_WEATHER, stale_while_revalidate=settings.CACHE_TTL_WEATHER),
+        "/books": CachePolicy(max_age=settings.CACHE_TTL_BOOKS, stale_while_revalidate=settings.CACHE_TTL_BOOKS),
+        "/phones": CachePolicy(max_age=settings.CACHE_TTL_PHONES, stale_while_revalidate=settings.CACHE_TTL_PHONES),
+        "/hero": CachePolicy(max_age=settings.CACHE_TTL_HEROES, stale_while_revalidate=settings.CACHE_TTL_HEROES),
+        "/anime": CachePolicy(max_age=settings.CACHE_TTL_ANIME, stale_while_revalidate=settings.CACHE_TTL_ANIME),
+    },
+)
+
+# Outside HTTPCacheMiddleware so it can mark partial responses uncacheable after the cache headers are set
+app.add_middleware(DeadlineMiddleware, default=settings.REQUEST_DEADLINE, deadlines=settings.REQUEST_DEADLINES)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,7 +95,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.add_middleware(ErrorHandlingMiddleware)
+app.add_middleware(ErrorHandlingMiddleware, detail_logs_per_minute=settings.ERROR_DETAIL_LOGS_PER_MINUTE)
+
+if settings.CANCEL_ON_DISCONNECT:
+    app.add_middleware(ClientDisconnectMiddleware)
+
+if settings.SERVER_TIMING_ENABLED:
+    app.add_middleware(
+        ServerTimingMiddleware,
+        sample_rate=settings.SERVER_TIMING_SAMPLE_RATE,
+        sample_rates=settings.SERVER_TIMING_SAMPLE_RATES,
+        log=settings.SERVER_TIMING_LOG,
+    )
+
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+def _find_cause(error: BaseException, error_type: type):
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, error_type):
+            return error
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return None
+
+# Routes wrap scraper errors in a 500; when the cause is an open circuit or the request's deadline, answer 503 with
+# a Retry-After or 504 instead
+async def upstream_unavailable_handler(request: Request, exc: Exception):
+    open_circuit = _find_cause(exc, CircuitOpenError)
+    if open_circuit is not None:
+        return JSONResponse(
+            {"detail": str(open_circuit)},
+            status_code=503,
+            headers={"Retry-After": str(math.ceil(open_circuit.retry_after))},
+        )
+    deadline_exceeded = _find_cause(exc, DeadlineExceeded)
+    if deadline_exceeded is not None:
+        return JSONResponse({"detail": str(deadline_exceeded)}, status_code=504)
+    return await http_exception_handler(request, exc)
+
+app.add_exception_handler(StarletteHTTPException, upstream_unavailable_handler)
+app.add_exception_handler(CircuitOpenError, upstream_unavailable_handler)
+app.add_exception_handler(DeadlineExceeded, upstream_unavailable_handler)
 
 app.include_router(weather.router, prefix="/weather", tags=["weather"])
 app.include_router(books.router, prefix="/books", tags=["books"])
@@ -26,13 +145,42 @@ app.include_router(phones.router, prefix="/phones", tags=["phones"])
 app.include_router(hero.router, prefix="/hero", tags=["heroes"])
 app.include_router(anime.router, prefix="/anime", tags=["anime"])
 
+# A limit keyed by a group no cached route belongs to would silently leave that group on the default
+if settings.ADMISSION_ENABLED and admission.unknown_limits():
+    logger.warning(f"ADMISSION_MAX_IN_FLIGHT names unknown route groups {admission.unknown_limits()}; "
+                   f"known groups are {sorted(admission.groups)}")
+
+if settings.PROFILING_ENABLED:
+    app.include_router(admin.router, prefix="/admin/profile", tags=["admin"])
+
+if settings.HOT_KEYS_ENABLED:
+    app.include_router(admin.hot_keys_router, prefix="/admin", tags=["admin"])
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Infinite API! Made with ❤ by Debojit."}
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
+    circuits = upstream.breakers.states()
+    degraded = any(state != "closed" for state in circuits.values())
+    return {"status": "degraded" if degraded else "healthy", "upstreams": circuits}
+
+# Circuit states, upstream hosts and peer URLs are operator-only, like the other admin endpoints
+@app.get("/cache/stats", dependencies=[Depends(admin.require_admin)])
+def cache_stats():
+    stats = response_cache.stats()
+    if peer_cache is not None:
+        stats["peers"] = peer_cache.stats()
+    return stats
+
+@app.get("/upstream/stats", dependencies=[Depends(admin.require_admin)])
+def upstream_stats():
+    return upstream.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
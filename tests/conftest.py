@@ -0,0 +1,25 @@
+import pytest
+
+
+class Clock:
+    """Stands in for the `time` module of the code under test, so expiry and windows can be stepped through."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return 1_700_000_000.0 + self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return Clock()
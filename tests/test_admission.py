@@ -0,0 +1,72 @@
+import asyncio
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from app.core import cache as cache_module
+from app.core.admission import AdmissionController
+from app.core.cache import cached, response_cache
+from app.core.config import settings
+
+
+def test_sheds_past_the_group_limit():
+    admission = AdmissionController({"anime": 2}, default=0, retry_after=3)
+    with admission.admit("anime.top"), admission.admit("anime.details"):
+        with pytest.raises(HTTPException) as raised:
+            with admission.admit("anime.search"):
+                pass
+        assert raised.value.status_code == 503
+        assert raised.value.headers == {"Retry-After": "3"}
+        # Other groups have their own limit, here the unlimited default
+        with admission.admit("weather.forecast"):
+            pass
+    with admission.admit("anime.search"):
+        pass
+
+
+def test_releases_the_slot_when_the_request_fails():
+    admission = AdmissionController({"anime": 1}, default=0, retry_after=1)
+    with pytest.raises(RuntimeError):
+        with admission.admit("anime.top"):
+            raise RuntimeError("upstream failed")
+    with admission.admit("anime.top"):
+        pass
+
+
+def test_reports_limits_for_groups_no_route_uses():
+    admission = AdmissionController({"anime": 1, "hero": 1}, default=0, retry_after=1)
+    admission.register("anime.top")
+    admission.register("heroes.category")
+    assert admission.unknown_limits() == ["hero"]
+
+
+def test_only_cache_misses_are_shed(monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_MODE", "bytes")
+    monkeypatch.setattr(cache_module, "admission", AdmissionController({"tests": 1}, default=0, retry_after=2))
+    response_cache.clear()
+    release = asyncio.Event()
+    app = FastAPI()
+
+    @app.get("/items/{name}")
+    @cached("tests.items", ttl=60)
+    async def item(name: str):
+        if name == "slow":
+            await release.wait()
+        return {"name": name}
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            assert (await client.get("/items/cached")).status_code == 200
+            slow = asyncio.ensure_future(client.get("/items/slow"))
+            await asyncio.sleep(0.05)
+            shed = await client.get("/items/other")
+            hit = await client.get("/items/cached")
+            release.set()
+            return shed, hit, await slow
+
+    try:
+        shed, hit, slow = asyncio.run(main())
+    finally:
+        response_cache.clear()
+    assert (shed.status_code, shed.headers["retry-after"]) == (503, "2")
+    assert hit.status_code == 200
+    assert slow.status_code == 200
@@ -0,0 +1,125 @@
+import pytest
+from app.core import breaker as breaker_module
+from app.core.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakers, CircuitOpenError
+
+
+@pytest.fixture
+def make_breaker(clock, monkeypatch):
+    monkeypatch.setattr(breaker_module, "time", clock)
+
+    def make(**overrides):
+        thresholds = dict(window=10.0, min_calls=4, error_rate=0.5, slow_call_seconds=2.0, slow_call_rate=0.5,
+                          open_seconds=30.0, probes=2)
+        return CircuitBreaker("example.com", **{**thresholds, **overrides})
+
+    return make
+
+
+def call(breaker, failed=False, duration=0.1):
+    probe = breaker.allow()
+    breaker.record(probe, failed, duration)
+
+
+def test_opens_once_error_rate_reached_over_min_calls(make_breaker):
+    breaker = make_breaker()
+    for failed in (True, True, False):
+        call(breaker, failed)
+    assert breaker.state == CLOSED  # 3 calls is under min_calls
+
+    call(breaker, failed=False)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.allow()
+    assert raised.value.host == "example.com"
+    assert raised.value.retry_after == pytest.approx(30.0)
+    assert breaker.rejected == 1
+
+
+def test_stays_closed_below_error_rate(make_breaker):
+    breaker = make_breaker()
+    for failed in (True, False, False, False, False, False):
+        call(breaker, failed)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["error_rate"] == pytest.approx(1 / 6, abs=1e-4)
+
+
+def test_opens_on_slow_calls(make_breaker):
+    breaker = make_breaker()
+    for duration in (3.0, 3.0, 0.1, 0.1):
+        call(breaker, duration=duration)
+    assert breaker.state == OPEN
+
+
+def test_failures_outside_the_window_are_forgotten(make_breaker, clock):
+    breaker = make_breaker()
+    call(breaker, failed=True)
+    call(breaker, failed=True)
+    clock.advance(11.0)
+    call(breaker, failed=True)
+    call(breaker, failed=False)
+    call(breaker, failed=False)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["calls"] == 3
+
+
+def test_cancelled_calls_are_not_counted(make_breaker):
+    breaker = make_breaker()
+    for _ in range(5):
+        call(breaker, failed=None)
+    assert breaker.stats()["calls"] == 0
+
+
+def test_half_open_admits_probes_and_closes_after_successes(make_breaker, clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        call(breaker, failed=True)
+    clock.advance(30.0)
+
+    first, second = breaker.allow(), breaker.allow()
+    assert (first, second) == (True, True)
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()  # only `probes` calls at a time
+
+    breaker.record(first, False, 0.1)
+    assert breaker.state == HALF_OPEN
+    breaker.record(second, False, 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.allow() is False
+
+
+@pytest.mark.parametrize("failed, duration", [(True, 0.1), (False, 5.0)])
+def test_failed_or_slow_probe_reopens(make_breaker, clock, failed, duration):
+    breaker = make_breaker()
+    for _ in range(4):
+        call(breaker, failed=True)
+    clock.advance(30.0)
+
+    probe = breaker.allow()
+    breaker.record(probe, failed, duration)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_calls_admitted_before_opening_do_not_affect_recovery(make_breaker, clock):
+    breaker = make_breaker()
+    straggler = breaker.allow()
+    for _ in range(4):
+        call(breaker, failed=True)
+    clock.advance(30.0)
+    probe = breaker.allow()
+
+    breaker.record(straggler, True, 0.1)
+    assert breaker.state == HALF_OPEN
+    breaker.record(probe, False, 0.1)
+    assert breaker.state == HALF_OPEN
+
+
+def test_breakers_are_per_host():
+    breakers = CircuitBreakers(window=10.0, min_calls=1, error_rate=0.5, slow_call_seconds=2.0, slow_call_rate=1.0,
+                               open_seconds=30.0, probes=1)
+    call(breakers.get("a.example"), failed=True)
+    assert breakers.get("a.example") is breakers.get("a.example")
+    assert breakers.states() == {"a.example": OPEN}
+    assert breakers.get("b.example").allow() is False
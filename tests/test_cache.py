@@ -0,0 +1,262 @@
+import os
+import gzip
+import threading
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from app.core import cache as cache_module
+from app.core.cache import CachedBody, ResponseCache, cached, response_cache
+from app.core.config import settings
+from app.middleware import CachePolicy, HTTPCacheMiddleware
+
+
+class Item(BaseModel):
+    name: str
+    text: str
+
+
+@pytest.fixture
+def cache(clock, monkeypatch):
+    monkeypatch.setattr(cache_module, "time", clock)
+    return ResponseCache(max_bytes=1000, stale_seconds=60)
+
+
+@pytest.fixture
+def make_client(clock, monkeypatch):
+    """A TestClient for an app with one cached route, GET /items/{name}, answered by `handler(name)`."""
+    monkeypatch.setattr(cache_module, "time", clock)
+    response_cache.clear()
+
+    def make(mode, handler):
+        monkeypatch.setattr(settings, "CACHE_MODE", mode)
+        app = FastAPI()
+
+        @app.get("/items/{name}", response_model=Item)
+        @cached("tests.items", ttl=60)
+        async def item(name: str):
+            return await handler(name)
+
+        app.add_middleware(HTTPCacheMiddleware, policies={"/items": CachePolicy(max_age=60, stale_while_revalidate=60)})
+        return TestClient(app)
+
+    yield make
+    response_cache.clear()
+
+
+def test_evicts_least_recently_used_to_stay_under_budget(cache):
+    cache.set("a", 1, "anime.top", ttl=60, size=400)
+    cache.set("b", 2, "anime.top", ttl=60, size=400)
+    assert cache.get("a", "anime.top") == 1  # now b is least recently used
+
+    cache.set("c", 3, "weather.forecast", ttl=60, size=400)
+    assert cache.get("b", "anime.top") is None
+    assert cache.get("a", "anime.top") == 1
+    assert cache.get("c", "weather.forecast") == 3
+    assert cache.current_bytes == 800
+    stats = cache.stats()["families"]["anime.top"]
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (1, 400, 1)
+
+
+def test_rejects_an_entry_larger_than_the_budget(cache):
+    cache.set("a", 1, "anime.top", ttl=60, size=400)
+    cache.set("huge", 2, "anime.top", ttl=60, size=1001)
+    assert cache.get("huge", "anime.top") is None
+    assert cache.get("a", "anime.top") == 1
+    assert cache.stats()["families"]["anime.top"]["rejected"] == 1
+
+
+def test_replacing_a_key_replaces_its_size(cache):
+    cache.set("a", 1, "anime.top", ttl=60, size=400)
+    cache.set("a", 2, "anime.top", ttl=60, size=100)
+    assert cache.current_bytes == 100
+    assert cache.get("a", "anime.top") == 2
+
+
+def test_size_defaults_to_the_serialized_length(cache):
+    cache.set("a", {"title": "x" * 100}, "anime.top", ttl=60)
+    assert cache.current_bytes == len('{"title":""}') + 100 + cache_module.ENTRY_OVERHEAD_BYTES
+
+
+def test_expired_entries_miss_but_can_be_served_stale(cache, clock):
+    cache.set("a", 1, "anime.top", ttl=10, size=100)
+    clock.advance(11)
+    assert cache.get("a", "anime.top") is None
+    assert cache.get_stale("a", "anime.top") == 1
+
+    clock.advance(60)
+    assert cache.get_stale("a", "anime.top") is None
+    assert cache.get("a", "anime.top") is None
+    assert cache.current_bytes == 0
+    assert cache.stats()["families"]["anime.top"]["expirations"] == 1
+
+
+def test_bytes_mode_serves_hits_from_the_encoded_body(make_client):
+    calls = []
+
+    async def handler(name):
+        calls.append(name)
+        return {"name": name, "text": "short", "internal": "not in the response model"}
+
+    client = make_client("bytes", handler)
+    miss = client.get("/items/a")
+    hit = client.get("/items/a")
+    assert calls == ["a"]
+    assert miss.json() == hit.json() == {"name": "a", "text": "short"}
+    assert hit.content == miss.content
+    assert hit.headers["etag"] == miss.headers["etag"]
+    assert hit.headers["vary"] == "Accept-Encoding"
+    # Too small to be worth compressing
+    assert "content-encoding" not in client.get("/items/a", headers={"accept-encoding": "gzip"}).headers
+
+    not_modified = client.get("/items/a", headers={"if-none-match": hit.headers["etag"]})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+
+def test_bytes_mode_serves_the_gzip_variant_to_clients_that_accept_it(make_client):
+    async def handler(name):
+        return {"name": name, "text": "x" * settings.CACHE_GZIP_MIN_BYTES}
+
+    client = make_client("bytes", handler)
+    plain = client.get("/items/a", headers={"accept-encoding": "identity"})
+    compressed = client.get("/items/a", headers={"accept-encoding": "gzip, br"})
+    assert "content-encoding" not in plain.headers
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.json() == plain.json()
+    # The two encodings are different representations, so they must not share an ETag
+    assert compressed.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+    entry = response_cache.get("tests.items?name=a", "tests.items")
+    assert gzip.decompress(entry.gzip_body) == entry.body == plain.content
+
+    assert client.get("/items/a", headers={"accept-encoding": "gzip",
+                                           "if-none-match": compressed.headers["etag"]}).status_code == 304
+
+
+@pytest.mark.parametrize("mode", ["bytes", "object"])
+def test_stale_fallback_is_marked_so_nothing_stores_it_as_fresh(make_client, clock, mode):
+    upstream_up = True
+
+    async def handler(name):
+        if not upstream_up:
+            raise RuntimeError("upstream down")
+        return {"name": name, "text": "from yesterday"}
+
+    client = make_client(mode, handler)
+    fresh = client.get("/items/a")
+    assert fresh.headers["cache-control"] == "public, max-age=60, stale-while-revalidate=60"
+
+    upstream_up = False
+    clock.advance(3600)
+    stale = client.get("/items/a")
+    assert stale.status_code == 200
+    assert stale.json() == {"name": "a", "text": "from yesterday"}
+    assert stale.headers["cache-control"] == "no-cache"
+    assert stale.headers["warning"] == '110 - "Response is Stale"'
+
+
+@pytest.mark.parametrize("mode", ["bytes", "object"])
+def test_client_errors_are_not_masked_by_stale_entries(make_client, clock, mode):
+    missing = False
+
+    async def handler(name):
+        if missing:
+            raise HTTPException(status_code=404, detail="Not found")
+        return {"name": name, "text": "gone now"}
+
+    client = make_client(mode, handler)
+    client.get("/items/a")
+    missing = True
+    clock.advance(3600)
+    assert client.get("/items/a").status_code == 404
+
+
+class StaleOwner:
+    """Peer cache whose owner for every key answers with a stale fallback."""
+
+    def owns(self, key):
+        return False
+
+    def owner(self, key):
+        return "http://cache-2:8000"
+
+    async def fetch(self, owner, target):
+        return httpx.Response(200, json={"name": "a", "text": "owner's stale copy"},
+                              headers={"cache-control": "no-cache", "warning": '110 - "Response is Stale"'})
+
+
+@pytest.mark.parametrize("mode", ["bytes", "object"])
+def test_stale_answers_from_the_owner_keep_their_headers_and_are_not_copied(make_client, monkeypatch, mode):
+    async def handler(name):
+        raise AssertionError("the owner should have answered")
+
+    monkeypatch.setattr(cache_module, "peer_cache", StaleOwner())
+    client = make_client(mode, handler)
+    response = client.get("/items/a")
+    assert response.json() == {"name": "a", "text": "owner's stale copy"}
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.headers["warning"] == '110 - "Response is Stale"'
+    assert response_cache.get("tests.items?name=a", "tests.items") is None
+
+
+def test_snapshot_round_trip(cache, clock, tmp_path):
+    body = CachedBody(body=b'{"a":1}', gzip_body=b"\x1f\x8b...", etag='"abc"', last_modified="Mon, 01 Jan 2024 00:00:00 GMT")
+    cache.set("bytes", body, "anime.top", ttl=60)
+    cache.set("gone", body, "anime.top", ttl=5)
+    clock.advance(10)
+    path = str(tmp_path / "snapshot.jsonl.gz")
+    assert cache.save_snapshot(path) == 1
+    assert os.listdir(tmp_path) == ["snapshot.jsonl.gz"]
+
+    restored = ResponseCache(max_bytes=1000)
+    assert restored.load_snapshot(path, "bytes") == 1
+    assert restored.get("bytes", "anime.top") == body
+    assert restored.ttl_remaining("bytes") == pytest.approx(50)
+    assert restored.get("gone", "anime.top") is None
+    # Entries stored in bytes mode are no use to a process caching endpoint results
+    assert ResponseCache(max_bytes=1000).load_snapshot(path, "object") == 0
+
+
+def test_snapshot_round_trip_of_endpoint_results(cache, tmp_path):
+    cache.set("json", {"title": "Frieren", "score": 9.3}, "anime.details", ttl=60)
+    path = str(tmp_path / "snapshot.jsonl.gz")
+    cache.save_snapshot(path)
+
+    restored = ResponseCache(max_bytes=1000)
+    assert restored.load_snapshot(path, "object") == 1
+    assert restored.get("json", "anime.details") == {"title": "Frieren", "score": 9.3}
+
+
+def test_snapshot_expiry_is_wall_clock(cache, clock, tmp_path):
+    cache.set("a", {"x": 1}, "anime.top", ttl=60)
+    path = str(tmp_path / "snapshot.jsonl.gz")
+    cache.save_snapshot(path)
+    clock.advance(61)
+    assert ResponseCache(max_bytes=1000).load_snapshot(path, "object") == 0
+
+
+def test_failed_snapshot_leaves_no_temp_file(cache, tmp_path, monkeypatch):
+    cache.set("a", {"x": 1}, "anime.top", ttl=60)
+    path = tmp_path / "snapshot.jsonl.gz"
+    path.write_bytes(b"previous")
+    monkeypatch.setattr(cache_module, "_snapshot_value", lambda value: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        cache.save_snapshot(str(path))
+    assert os.listdir(tmp_path) == ["snapshot.jsonl.gz"]
+    assert path.read_bytes() == b"previous"
+
+
+def test_concurrent_snapshot_saves_do_not_interleave(tmp_path):
+    cache = ResponseCache(max_bytes=100_000)
+    for i in range(50):
+        cache.set(f"key{i}", {"i": i}, "anime.top", ttl=60)
+    path = str(tmp_path / "snapshot.jsonl.gz")
+    # Workers shutting down together each write their own temp file before the rename
+    threads = [threading.Thread(target=cache.save_snapshot, args=(path,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert os.listdir(tmp_path) == ["snapshot.jsonl.gz"]
+    assert ResponseCache(max_bytes=100_000).load_snapshot(path, "object") == 50
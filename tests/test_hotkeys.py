@@ -0,0 +1,57 @@
+import random
+from collections import Counter
+from app.core import hotkeys as hotkeys_module
+from app.core.hotkeys import CountMinSketch, HeavyHitters
+
+
+def zipf_keys(count: int, distinct: int, seed: int = 7):
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, distinct + 1)]
+    return rng.choices([f"/anime/mal/top?page={i}" for i in range(distinct)], weights, k=count)
+
+
+def test_sketch_never_underestimates():
+    keys = zipf_keys(20000, 2000)
+    sketch = CountMinSketch(width=512, depth=4)
+    for key in keys:
+        sketch.add(key)
+    counts = Counter(keys)
+    assert sketch.total == len(keys)
+    assert all(sketch.estimate(key) >= count for key, count in counts.items())
+    assert sketch.estimate(keys[0]) - counts[keys[0]] <= len(keys) * 2.72 / 512
+
+
+def test_sketch_halving():
+    sketch = CountMinSketch(width=64, depth=2)
+    for _ in range(9):
+        sketch.add("a")
+    sketch.halve()
+    assert sketch.estimate("a") == 4
+    assert sketch.total == 4
+
+
+def test_heavy_hitters_track_the_most_requested_keys():
+    keys = zipf_keys(20000, 2000)
+    hitters = HeavyHitters(k=10, width=2048, depth=4, decay_seconds=0)
+    for key in keys:
+        hitters.add(key, "http://testserver" + key)
+    top = hitters.top()
+    assert [entry["key"] for entry in top] == [key for key, _ in Counter(keys).most_common(10)]
+    assert top[0]["url"] == "http://testserver" + top[0]["key"]
+
+
+def test_heavy_hitters_skip_overlong_urls():
+    hitters = HeavyHitters(k=10, width=64, depth=2, decay_seconds=0)
+    hitters.add("long", "/" + "x" * hotkeys_module.MAX_URL_LENGTH)
+    assert hitters.top() == []
+    assert hitters.sketch.estimate("long") == 1
+
+
+def test_heavy_hitters_decay(clock, monkeypatch):
+    monkeypatch.setattr(hotkeys_module, "time", clock)
+    hitters = HeavyHitters(k=2, width=64, depth=2, decay_seconds=60)
+    for _ in range(8):
+        hitters.add("a", "/a")
+    clock.advance(60)
+    hitters.add("b", "/b")
+    assert {entry["key"]: entry["count"] for entry in hitters.top()} == {"a": 4, "b": 1}
@@ -0,0 +1,46 @@
+import time
+import asyncio
+import logging
+from types import SimpleNamespace
+import httpx
+from app.core.loop_monitor import LoopLagMonitor, _blame, event_loop_blocked_total
+from app.core.upstream import UpstreamClient
+
+
+def fake_frame(module: str, name: str, back=None):
+    return SimpleNamespace(f_globals={"__name__": module}, f_code=SimpleNamespace(co_name=name, co_qualname=name),
+                           f_back=back)
+
+
+def test_blame_names_the_route_handler_and_the_innermost_app_frame():
+    frame = fake_frame("bs4.builder", "feed", fake_frame(
+        "app.scrapers.mal_scraper", "AnimeMalScraper._parse_data", fake_frame(
+            "app.core.upstream", "UpstreamClient.parse", fake_frame(
+                "app.api.anime", "get_top_anime", fake_frame("starlette.routing", "handle")))))
+    assert _blame(frame) == ("app.api.anime:get_top_anime", "app.scrapers.mal_scraper:AnimeMalScraper._parse_data")
+    assert _blame(fake_frame("asyncio.events", "_run")) == ("unknown", "unknown")
+
+
+def blocking_parser(soup):
+    time.sleep(0.3)
+    return soup.p.text
+
+
+def test_a_blocked_loop_is_logged_and_counted_with_its_culprit(caplog):
+    async def main():
+        monitor = LoopLagMonitor(interval=0.01, threshold=0.05)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.05)
+            UpstreamClient().parse(httpx.Response(200, text="<p>blocking</p>"), blocking_parser)
+            await asyncio.sleep(0.05)
+        finally:
+            await monitor.stop()
+
+    with caplog.at_level(logging.WARNING, logger="app.core.loop_monitor"):
+        asyncio.run(main())
+
+    # The innermost app frame is the fetch layer running the parser
+    holders = [labels["holder"] for _, labels, value in event_loop_blocked_total.samples() if value]
+    assert any(holder.startswith("app.core.upstream:") and holder.endswith("_run_parser") for holder in holders)
+    assert any("Event loop blocked for" in message and "_run_parser" in message for message in caplog.messages)
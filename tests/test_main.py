@@ -0,0 +1,18 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.core.config import settings
+from main import app
+
+
+@pytest.mark.parametrize("path", ["/cache/stats", "/upstream/stats"])
+def test_stats_endpoints_require_the_admin_token(monkeypatch, path):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "s3cret")
+    client = TestClient(app)
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers={"x-admin-token": "wrong"}).status_code == 403
+    assert client.get(path, headers={"x-admin-token": "s3cret"}).status_code == 200
+
+
+def test_stats_endpoints_are_closed_without_an_admin_token(monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "")
+    assert TestClient(app).get("/cache/stats", headers={"x-admin-token": ""}).status_code == 403
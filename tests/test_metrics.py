@@ -0,0 +1,50 @@
+from app.core.metrics import Registry
+
+
+def test_render_counters_and_gauges():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests served.", ("route", "status"))
+    in_flight = registry.gauge("in_flight", "Requests in flight.")
+    requests.inc("/anime/top", "200")
+    requests.inc("/anime/top", "200", amount=2)
+    requests.inc('/say/"hi"\\', "500")
+    in_flight.inc()
+    in_flight.inc()
+    in_flight.dec()
+
+    assert registry.render() == (
+        "# HELP requests_total Requests served.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{route="/anime/top",status="200"} 3\n'
+        'requests_total{route="/say/\\"hi\\"\\\\",status="500"} 1\n'
+        "# HELP in_flight Requests in flight.\n"
+        "# TYPE in_flight gauge\n"
+        "in_flight 1\n"
+    )
+
+
+def test_render_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency.", ("host",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, "example.com")
+
+    assert registry.render().splitlines() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{host="example.com",le="0.1"} 2',
+        'latency_seconds_bucket{host="example.com",le="1"} 3',
+        'latency_seconds_bucket{host="example.com",le="+Inf"} 4',
+        'latency_seconds_count{host="example.com"} 4',
+        'latency_seconds_sum{host="example.com"} 3.65',
+    ]
+
+
+def test_render_collected_metrics_at_scrape_time():
+    registry = Registry()
+    state = {"anime.top": 10}
+    registry.collected("cache_bytes", "Bytes cached.", "gauge",
+                       lambda: (({"family": family}, size) for family, size in state.items()))
+    state["anime.top"] = 25
+
+    assert registry.render().splitlines()[1:] == ["# TYPE cache_bytes gauge", 'cache_bytes{family="anime.top"} 25']
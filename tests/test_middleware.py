@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from app.core.deadline import omit, remaining
+from app.core.metrics import http_requests_cancelled_total, http_requests_total
+from app.core.timing import record_span, span
+from app.middleware import (CLIENT_CLOSED_REQUEST, ERROR_BODY, CachePolicy, ClientDisconnectMiddleware,
+                            DeadlineMiddleware, ErrorHandlingMiddleware, HTTPCacheMiddleware, MetricsMiddleware,
+                            ServerTimingMiddleware)
+
+
+def http_scope(path="/anime/top", method="GET", headers=()):
+    return {"type": "http", "method": method, "path": path, "query_string": b"", "headers": list(headers)}
+
+
+def call_asgi(app, scope=None, receive=None, sent=None):
+    """Run `app` for one request and return the messages it sent, collected in `sent` if given."""
+    sent = [] if sent is None else sent
+
+    async def default_receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope or http_scope(), receive or default_receive, send))
+    return sent
+
+
+@pytest.fixture
+def http_cache_client():
+    app = FastAPI()
+
+    @app.api_route("/anime/top", methods=["GET", "HEAD"])
+    async def top():
+        return {"titles": ["Frieren"]}
+
+    @app.get("/anime/missing")
+    async def missing():
+        raise HTTPException(status_code=404, detail="Not found")
+
+    @app.get("/anime/live")
+    async def live():
+        return JSONResponse({"live": True}, headers={"cache-control": "no-cache"})
+
+    @app.get("/animex")
+    async def lookalike():
+        return {"other": True}
+
+    app.add_middleware(HTTPCacheMiddleware, policies={"/anime": CachePolicy(max_age=60, stale_while_revalidate=30)})
+    return TestClient(app)
+
+
+def test_cacheable_responses_get_cache_control_and_a_strong_etag(http_cache_client):
+    response = http_cache_client.get("/anime/top")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=60, stale-while-revalidate=30"
+    assert response.headers["etag"].startswith('"')
+    assert http_cache_client.get("/anime/top").headers["etag"] == response.headers["etag"]
+
+
+@pytest.mark.parametrize("if_none_match", ["{etag}", "W/{etag}", '"other", {etag}', "*"])
+def test_matching_if_none_match_gets_304(http_cache_client, if_none_match):
+    etag = http_cache_client.get("/anime/top").headers["etag"]
+    response = http_cache_client.get("/anime/top", headers={"if-none-match": if_none_match.format(etag=etag)})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    assert response.headers["cache-control"] == "public, max-age=60, stale-while-revalidate=30"
+    assert "content-type" not in response.headers
+
+
+def test_stale_if_none_match_gets_the_full_response(http_cache_client):
+    response = http_cache_client.get("/anime/top", headers={"if-none-match": '"outdated"'})
+    assert response.status_code == 200
+    assert response.json() == {"titles": ["Frieren"]}
+
+
+def test_head_gets_cache_control_without_an_etag_of_the_empty_body(http_cache_client):
+    response = http_cache_client.head("/anime/top")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=60, stale-while-revalidate=30"
+    assert "etag" not in response.headers
+
+
+def test_errors_are_not_stored(http_cache_client):
+    response = http_cache_client.get("/anime/missing")
+    assert response.status_code == 404
+    assert response.headers["cache-control"] == "no-store"
+    assert "etag" not in response.headers
+
+
+def test_cache_control_set_by_the_route_wins(http_cache_client):
+    assert http_cache_client.get("/anime/live").headers["cache-control"] == "no-cache"
+
+
+def test_paths_outside_the_policy_prefixes_are_untouched(http_cache_client):
+    response = http_cache_client.get("/animex")
+    assert "cache-control" not in response.headers
+    assert "etag" not in response.headers
+
+
+def test_error_before_the_response_starts_becomes_a_json_500(caplog):
+    async def failing(scope, receive, send):
+        raise RuntimeError("parser broke")
+
+    with caplog.at_level(logging.ERROR):
+        sent = call_asgi(ErrorHandlingMiddleware(failing))
+    assert sent[0]["status"] == 500
+    assert dict(sent[0]["headers"])[b"content-type"] == b"application/json"
+    assert sent[1]["body"] == ERROR_BODY
+    assert "RuntimeError while processing GET /anime/top: parser broke" in caplog.text
+
+
+def test_error_after_the_response_starts_is_reraised():
+    async def failing_midway(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        raise RuntimeError("stream broke")
+
+    sent = []
+    with pytest.raises(RuntimeError):
+        call_asgi(ErrorHandlingMiddleware(failing_midway), sent=sent)
+    assert [message["status"] for message in sent] == [200]
+
+
+def test_successful_responses_pass_through():
+    async def ok(scope, receive, send):
+        await send({"type": "http.response.start", "status": 404, "headers": [(b"x-test", b"1")]})
+        await send({"type": "http.response.body", "body": b"missing"})
+
+    sent = call_asgi(ErrorHandlingMiddleware(ok))
+    assert sent == [{"type": "http.response.start", "status": 404, "headers": [(b"x-test", b"1")]},
+                    {"type": "http.response.body", "body": b"missing"}]
+
+
+def test_error_details_are_rate_limited(caplog):
+    async def failing(scope, receive, send):
+        raise RuntimeError("parser broke")
+
+    middleware = ErrorHandlingMiddleware(failing, detail_logs_per_minute=2)
+    with caplog.at_level(logging.ERROR):
+        for _ in range(4):
+            call_asgi(middleware)
+    assert [record.exc_info is not None for record in caplog.records] == [True, True, False, False]
+    assert "details suppressed, 2 so far" in caplog.records[-1].getMessage()
+
+
+@pytest.fixture
+def timing_client():
+    app = FastAPI()
+
+    @app.get("/anime/mal/details/{anime_id}")
+    @app.get("/anime/mal/detailsX")
+    @app.get("/anime/mal/details")
+    async def details():
+        with span("cache", "anime.details"):
+            pass
+        record_span("fetch", 0.25, "200 myanimelist.net", "https://myanimelist.net/anime/1?secret=1")
+        return {}
+
+    app.add_middleware(ServerTimingMiddleware, sample_rate=0.0, sample_rates={"/anime/mal/details": 1.0})
+    return TestClient(app)
+
+
+def test_server_timing_reports_spans_without_upstream_urls(timing_client):
+    header = timing_client.get("/anime/mal/details/1").headers["server-timing"]
+    names = [metric.split(";")[0] for metric in header.split(", ")]
+    assert names == ["cache", "fetch", "total"]
+    assert 'fetch;dur=250.00;desc="200 myanimelist.net"' in header
+    assert "https://" not in header
+
+
+@pytest.mark.parametrize("path, sampled", [
+    ("/anime/mal/details", True),
+    ("/anime/mal/details/1", True),
+    ("/anime/mal/detailsX", False),
+])
+def test_server_timing_sample_rates_match_whole_path_segments(timing_client, path, sampled):
+    assert ("server-timing" in timing_client.get(path).headers) == sampled
+
+
+@pytest.fixture
+def deadline_client():
+    app = FastAPI()
+
+    @app.get("/hero/{name}")
+    @app.get("/heroes/{name}")
+    @app.get("/books/{name}")
+    @app.get("/booksX/{name}")
+    async def budget():
+        return {"remaining": remaining()}
+
+    @app.get("/weather/partial")
+    async def partial():
+        omit("air_quality")
+        omit("astronomy")
+        return {"remaining": remaining()}
+
+    app.add_middleware(HTTPCacheMiddleware, policies={"/weather": CachePolicy(max_age=600)})
+    app.add_middleware(DeadlineMiddleware, default=5.0, deadlines={"/hero": 15.0, "/books": 20.0})
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("path, budget", [
+    ("/hero/batman", 15.0),
+    ("/heroes/batman", 5.0),
+    ("/books/dune", 20.0),
+    ("/booksX/dune", 5.0),
+])
+def test_deadline_comes_from_the_longest_matching_path_segment(deadline_client, path, budget):
+    assert deadline_client.get(path).json()["remaining"] == pytest.approx(budget, abs=0.5)
+
+
+@pytest.mark.parametrize("header, budget", [("2.5", 2.5), ("60", 15.0), ("0", 15.0), ("-1", 15.0), ("soon", 15.0)])
+def test_clients_may_shorten_the_deadline_but_not_lengthen_it(deadline_client, header, budget):
+    response = deadline_client.get("/hero/batman", headers={"x-request-deadline": header})
+    assert response.json()["remaining"] == pytest.approx(budget, abs=0.5)
+
+
+def test_a_zero_budget_means_no_deadline():
+    app = FastAPI()
+
+    @app.get("/off/{name}")
+    async def unbounded():
+        return {"remaining": remaining()}
+
+    app.add_middleware(DeadlineMiddleware, default=0.0)
+    client = TestClient(app)
+    assert client.get("/off/x").json() == {"remaining": None}
+    assert client.get("/off/x", headers={"x-request-deadline": "3"}).json()["remaining"] == pytest.approx(3, abs=0.5)
+
+
+def test_partial_responses_are_marked_and_not_cacheable(deadline_client):
+    response = deadline_client.get("/weather/partial")
+    assert response.status_code == 200
+    assert response.headers["x-partial-response"] == "air_quality, astronomy"
+    assert response.headers["cache-control"] == "no-store"
+    assert "x-partial-response" not in deadline_client.get("/hero/batman").headers
+
+
+def disconnecting_receive(after: float):
+    """The request arrives whole, then the client goes away `after` seconds later."""
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(after)
+        return {"type": "http.disconnect"}
+
+    return receive
+
+
+def test_disconnect_cancels_the_handler_and_records_499():
+    cancelled = []
+
+    async def slow(scope, receive, send):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    app = MetricsMiddleware(ClientDisconnectMiddleware(slow))
+    before = http_requests_total._values.get(("GET", "unmatched", str(CLIENT_CLOSED_REQUEST)), 0)
+    cancelled_before = http_requests_cancelled_total._values.get(("unmatched",), 0)
+    sent = call_asgi(app, receive=disconnecting_receive(0.05))
+
+    assert cancelled == [True]
+    assert [message.get("status") for message in sent] == [CLIENT_CLOSED_REQUEST, None]
+    assert http_requests_total._values[("GET", "unmatched", str(CLIENT_CLOSED_REQUEST))] == before + 1
+    assert http_requests_cancelled_total._values[("unmatched",)] == cancelled_before + 1
+
+
+def test_handlers_that_finish_first_are_untouched():
+    async def quick(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"done"})
+
+    sent = call_asgi(ClientDisconnectMiddleware(quick), receive=disconnecting_receive(1.0))
+    assert [message.get("status") for message in sent] == [200, None]
+    assert sent[1]["body"] == b"done"
+
+
+def test_disconnect_after_the_response_started_sends_nothing_more():
+    async def streaming(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await asyncio.sleep(10)
+
+    sent = call_asgi(ClientDisconnectMiddleware(streaming), receive=disconnecting_receive(0.05))
+    assert [message.get("status") for message in sent] == [200]
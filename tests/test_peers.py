@@ -0,0 +1,105 @@
+import asyncio
+from collections import Counter
+import httpx
+import pytest
+from app.core.deadline import start_deadline
+from app.core.peers import PEER_HEADER, HashRing, PeerCache
+
+NODES = ["http://cache-1:8000", "http://cache-2:8000", "http://cache-3:8000"]
+KEYS = [f"GET /anime/mal/top?page={i}" for i in range(3000)]
+
+
+def test_owner_is_stable_and_one_of_the_nodes():
+    ring = HashRing(NODES, vnodes=64)
+    assert all(ring.owner(key) in NODES for key in KEYS[:100])
+    assert [ring.owner(key) for key in KEYS[:100]] == [HashRing(list(reversed(NODES)), 64).owner(key) for key in KEYS[:100]]
+
+
+def test_keys_spread_evenly():
+    owners = Counter(HashRing(NODES, vnodes=128).owner(key) for key in KEYS)
+    assert set(owners) == set(NODES)
+    assert all(0.25 < count / len(KEYS) < 0.42 for count in owners.values())
+
+
+def test_removing_a_node_only_moves_its_keys():
+    before = HashRing(NODES, vnodes=64)
+    after = HashRing(NODES[:2], vnodes=64)
+    moved = [key for key in KEYS if before.owner(key) != after.owner(key)]
+    assert moved
+    assert all(before.owner(key) == NODES[2] for key in moved)
+
+
+def test_adding_a_node_only_takes_keys_for_itself():
+    before = HashRing(NODES, vnodes=64)
+    after = HashRing(NODES + ["http://cache-4:8000"], vnodes=64)
+    moved = [key for key in KEYS if before.owner(key) != after.owner(key)]
+    assert all(after.owner(key) == "http://cache-4:8000" for key in moved)
+
+
+THRESHOLDS = dict(window=10.0, min_calls=2, error_rate=0.5, slow_call_seconds=1.0, slow_call_rate=1.0,
+                  open_seconds=5.0, probes=1)
+
+
+def test_peer_cache_requires_itself_among_the_peers():
+    with pytest.raises(ValueError):
+        PeerCache("http://cache-9:8000", NODES, 64, 0.1, 1.0, **THRESHOLDS)
+
+    peers = PeerCache("http://cache-1:8000/", [node + "/" for node in NODES], 64, 0.1, 1.0, **THRESHOLDS)
+    assert peers.peers == NODES
+    assert sum(peers.owns(key) for key in KEYS) == sum(peers.owner(key) == NODES[0] for key in KEYS)
+
+
+def fetch_from_peer(handler, calls: int = 1, deadline=None):
+    peers = PeerCache(NODES[0], NODES, 64, 0.1, 1.0, **THRESHOLDS)
+
+    async def main():
+        peers._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        if deadline is not None:
+            start_deadline(deadline)
+        try:
+            return [await peers.fetch(NODES[1], "/anime/mal/top?page=2") for _ in range(calls)]
+        finally:
+            await peers.aclose()
+
+    return peers, asyncio.run(main())
+
+
+def test_fetch_forwards_to_the_owner_with_the_remaining_deadline():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        return httpx.Response(404, json={"detail": "Not found"})
+
+    peers, (response,) = fetch_from_peer(handler, deadline=8.0)
+    assert response.status_code == 404
+    assert str(seen[0].url) == "http://cache-2:8000/anime/mal/top?page=2"
+    assert seen[0].headers[PEER_HEADER] == NODES[0]
+    assert 7.0 < float(seen[0].headers["x-request-deadline"]) <= 8.0
+    assert (peers.forwarded, peers.fallbacks) == (1, 0)
+
+
+def refused(request: httpx.Request) -> httpx.Response:
+    raise httpx.ConnectError("refused")
+
+
+@pytest.mark.parametrize("failure", [lambda request: httpx.Response(502), refused])
+def test_fetch_falls_back_and_stops_asking_a_failing_owner(failure):
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(request)
+        return failure(request)
+
+    peers, responses = fetch_from_peer(handler, calls=4)
+    assert responses == [None] * 4
+    # The owner's circuit opens after min_calls failures, so later misses do not wait on it
+    assert len(sent) == 2
+    assert peers.fallbacks == 4
+    assert peers.stats()["circuits"][NODES[1]]["state"] == "open"
+
+
+def test_fetch_does_not_forward_once_the_deadline_is_spent():
+    peers, responses = fetch_from_peer(lambda request: httpx.Response(200), deadline=-1.0)
+    assert responses == [None]
+    assert peers.forwarded == 0
@@ -0,0 +1,27 @@
+import sys
+import time
+import threading
+from app.core.profiling import SamplingProfiler, frame_label
+
+
+def spin(seconds: float):
+    until = time.perf_counter() + seconds
+    while time.perf_counter() < until:
+        pass
+
+
+def test_frame_label_names_the_module_and_function():
+    frame = sys._getframe()
+    assert frame_label(frame) == f"{__name__}:test_frame_label_names_the_module_and_function"
+
+
+def test_sampler_records_the_sampled_thread_stacks():
+    sampler = SamplingProfiler(threading.get_ident(), interval=0.002)
+    sampler.start()
+    try:
+        spin(0.2)
+    finally:
+        sampler.stop()
+    assert sampler.samples > 0
+    assert sum(count for stack, count in sampler.stacks.items() if stack.endswith(f"{__name__}:spin")) > 0
+    assert sampler.collapsed().splitlines()[0].rsplit(" ", 1)[1].isdigit()
@@ -0,0 +1,70 @@
+from email.utils import formatdate
+import httpx
+import pytest
+from app.core import retry as retry_module
+from app.core.breaker import CircuitOpenError
+from app.core.retry import MAX_BALANCE, RetryBudget, RetryPolicy, retry_after, retry_reason
+
+
+@pytest.mark.parametrize("response, error, reason", [
+    (httpx.Response(503), None, "503"),
+    (httpx.Response(429), None, "429"),
+    (httpx.Response(404), None, None),
+    (httpx.Response(200), None, None),
+    (None, httpx.ConnectError("refused"), "ConnectError"),
+    (None, httpx.ReadTimeout("slow"), "ReadTimeout"),
+    (None, CircuitOpenError("example.com", 5.0), None),
+    (None, ValueError("bug"), None),
+])
+def test_retry_reason(response, error, reason):
+    assert retry_reason(response, error) == reason
+
+
+def test_retry_after_accepts_seconds_and_http_dates(clock, monkeypatch):
+    monkeypatch.setattr(retry_module, "time", clock)
+    assert retry_after(httpx.Response(503, headers={"retry-after": "7"})) == 7.0
+    http_date = formatdate(clock.time() + 30, usegmt=True)
+    assert retry_after(httpx.Response(503, headers={"retry-after": http_date})) == pytest.approx(30, abs=1)
+    assert retry_after(httpx.Response(503, headers={"retry-after": "soon"})) is None
+    assert retry_after(httpx.Response(503)) is None
+    assert retry_after(None) is None
+
+
+def test_backoff_is_jittered_and_capped_unless_the_upstream_asks():
+    policy = RetryPolicy(max_attempts=4, backoff_base=0.5, backoff_max=2.0, deadline=10.0, budget=RetryBudget(0.1, 1.0))
+    assert all(0 <= policy.backoff(1, None) <= 0.5 for _ in range(50))
+    assert all(0 <= policy.backoff(6, None) <= 2.0 for _ in range(50))
+    assert policy.backoff(1, httpx.Response(429, headers={"retry-after": "3"})) == 3.0
+
+
+def test_denied_by_checks_attempts_then_deadline_then_budget(clock, monkeypatch):
+    monkeypatch.setattr(retry_module, "time", clock)
+    budget = RetryBudget(ratio=0.1, min_per_second=0.0)
+    policy = RetryPolicy(max_attempts=3, backoff_base=0.5, backoff_max=2.0, deadline=10.0, budget=budget)
+    deadline = clock.monotonic() + 5
+    assert policy.denied_by(3, 0.1, deadline) == "attempts"
+    assert policy.denied_by(1, 6.0, deadline) == "deadline"
+    assert policy.denied_by(1, 0.1, deadline) is None
+    budget.balance = 0.0
+    assert policy.denied_by(1, 0.1, deadline) == "budget"
+
+
+def test_budget_allows_a_ratio_of_traffic(clock, monkeypatch):
+    monkeypatch.setattr(retry_module, "time", clock)
+    budget = RetryBudget(ratio=0.1, min_per_second=0.0)
+    budget.balance = 0.0
+    for _ in range(30):
+        budget.deposit()
+    assert [budget.withdraw() for _ in range(4)] == [True, True, True, False]
+    assert (budget.retries, budget.denied) == (3, 1)
+
+
+def test_budget_refills_over_time_up_to_the_cap(clock, monkeypatch):
+    monkeypatch.setattr(retry_module, "time", clock)
+    budget = RetryBudget(ratio=0.1, min_per_second=1.0)
+    budget.balance = 0.0
+    assert budget.withdraw() is False
+    clock.advance(2)
+    assert budget.withdraw() is True
+    clock.advance(1000)
+    assert budget.stats()["balance"] == MAX_BALANCE
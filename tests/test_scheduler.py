@@ -0,0 +1,149 @@
+import time
+import asyncio
+import pytest
+from app.core.scheduler import (CRAWL, INTERACTIVE, PREFETCH, HostLimit, HostQueue, UpstreamQueueTimeout,
+                                UpstreamScheduler, match_host, priority)
+
+WEIGHTS = {INTERACTIVE: 16.0, PREFETCH: 4.0, CRAWL: 1.0}
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_match_host_prefers_the_most_specific_domain():
+    domains = {"example.com": 1, "api.example.com": 2}
+    assert match_host("API.example.com", domains) == 2
+    assert match_host("www.example.com", domains) == 1
+    assert match_host("example.org", domains, 0) == 0
+
+
+def test_limit_for_covers_subdomains():
+    scheduler = UpstreamScheduler({"example.com": {"max_in_flight": 2, "rate": 5, "burst": 3}}, HostLimit(8), None,
+                                  WEIGHTS, 0.5)
+    assert scheduler.limit_for("www.example.com") == HostLimit(2, 5.0, 3)
+    assert scheduler.limit_for("other.org") == HostLimit(8)
+
+
+def test_max_in_flight_is_respected():
+    queue = HostQueue("example.com", HostLimit(max_in_flight=3), WEIGHTS, 0.5)
+    peak = 0
+
+    async def fetch():
+        nonlocal peak
+        async with queue.slot(None):
+            peak = max(peak, queue.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(fetch() for _ in range(10)))
+
+    run(main())
+    assert peak == 3
+    assert queue.in_flight == 0
+    assert queue.stats()["sent"] == 10
+
+
+def test_rate_limit_spaces_out_sends_after_the_burst():
+    queue = HostQueue("example.com", HostLimit(rate=50.0, burst=2), WEIGHTS, 0.5)
+
+    async def main():
+        sent_at = []
+
+        async def fetch():
+            async with queue.slot(None):
+                sent_at.append(time.monotonic())
+
+        await asyncio.gather(*(fetch() for _ in range(6)))
+        return sent_at
+
+    sent_at = run(main())
+    # Two go out at once, then one every 20ms
+    assert sent_at[1] - sent_at[0] < 0.01
+    assert sent_at[-1] - sent_at[0] >= 4 * 0.02 * 0.9
+
+
+def test_queue_timeout_gives_up_without_holding_a_slot():
+    queue = HostQueue("example.com", HostLimit(max_in_flight=1), WEIGHTS, 0.5)
+
+    async def main():
+        async with queue.slot(None):
+            with pytest.raises(UpstreamQueueTimeout):
+                async with queue.slot(0.01):
+                    pass
+        async with queue.slot(0.01):
+            pass
+
+    run(main())
+    assert queue.timeouts == 1
+    assert queue.in_flight == 0
+    assert queue.queued == {INTERACTIVE: 0, PREFETCH: 0, CRAWL: 0}
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def start_order(queue: HostQueue, priorities):
+    """Queue one fetch per entry of `priorities` behind a held slot, release it and return the order they started in."""
+    started = []
+
+    async def fetch(name):
+        async with queue.slot(None, name):
+            started.append(name)
+
+    async with queue.slot(None, INTERACTIVE):
+        tasks = []
+        for name in priorities:
+            tasks.append(asyncio.create_task(fetch(name)))
+            await settle()
+    await asyncio.gather(*tasks)
+    return started
+
+
+def test_classes_share_slots_by_weight():
+    queue = HostQueue("example.com", HostLimit(max_in_flight=1), WEIGHTS, 1.0)
+    started = run(start_order(queue, [CRAWL] * 8 + [PREFETCH] * 8))
+    # Prefetch has four times crawl's weight, so it gets four of every five slots until it runs out
+    assert started[:5].count(PREFETCH) == 4
+    assert started[:10].count(PREFETCH) == 8
+
+
+def test_interactive_goes_before_queued_background_work():
+    queue = HostQueue("example.com", HostLimit(max_in_flight=1), {**WEIGHTS, CRAWL: 64.0}, 1.0)
+    started = run(start_order(queue, [CRAWL, CRAWL, CRAWL, INTERACTIVE]))
+    assert started[0] == INTERACTIVE
+
+
+def test_background_classes_hold_at_most_their_share():
+    queue = HostQueue("example.com", HostLimit(max_in_flight=4), WEIGHTS, 0.5)
+    peak = 0
+
+    async def fetch(name):
+        nonlocal peak
+        async with queue.slot(None, name):
+            peak = max(peak, queue.background_in_flight)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(fetch(CRAWL) for _ in range(6)))
+
+    run(main())
+    assert peak == 2
+
+
+def test_scheduler_uses_the_current_priority_class():
+    scheduler = UpstreamScheduler({}, HostLimit(), None, {PREFETCH: 4.0, CRAWL: 1.0, "disabled": 0.0}, 0.5)
+
+    async def main():
+        with priority(CRAWL):
+            async with scheduler.slot("example.com"):
+                pass
+        with priority("disabled"):
+            async with scheduler.slot("example.com"):
+                pass
+
+    run(main())
+    # A class with no weight is sent as interactive
+    assert scheduler.stats()["example.com"]["sent_by_priority"] == {INTERACTIVE: 1, PREFETCH: 0, CRAWL: 1}
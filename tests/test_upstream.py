@@ -0,0 +1,172 @@
+import time
+import asyncio
+import httpx
+import pytest
+from app.core.config import settings
+from app.core.deadline import DeadlineExceeded, start_deadline
+from app.core.scheduler import PREFETCH, priority
+from app.core.upstream import UpstreamClient
+
+
+def test_revalidates_with_stored_validators_and_replays_304s(monkeypatch):
+    monkeypatch.setattr(settings, "UPSTREAM_SCHEDULER_ENABLED", False)
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append((request.headers.get("if-none-match"), request.headers.get("if-modified-since")))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"etag": '"v1"'})
+        return httpx.Response(200, content=b"<html>v1</html>", headers={
+            "etag": '"v1"', "last-modified": "Mon, 01 Jan 2024 00:00:00 GMT", "content-type": "text/html"})
+
+    async def main():
+        upstream = UpstreamClient()
+        upstream._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        first = await upstream.get("https://example.com/page")
+        second = await upstream.get("https://example.com/page")
+        await upstream.aclose()
+        return upstream, first, second
+
+    upstream, first, second = asyncio.run(main())
+    assert seen == [(None, None), ('"v1"', "Mon, 01 Jan 2024 00:00:00 GMT")]
+    assert (second.status_code, second.content, second.headers["content-type"]) == (200, first.content, "text/html")
+    assert second.extensions["content_hash"] == first.extensions["content_hash"]
+    assert upstream.stats()["revalidation"]["hosts"]["example.com"]["not_modified"] == 1
+
+
+def test_revalidation_store_is_bounded_by_bytes(monkeypatch):
+    monkeypatch.setattr(settings, "UPSTREAM_REVALIDATE_MAX_BYTES", 10_000)
+    monkeypatch.setattr(settings, "UPSTREAM_SCHEDULER_ENABLED", False)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.headers.get("if-none-match"):
+            return httpx.Response(304, headers={"etag": '"v1"'})
+        size = 20_000 if request.url.path == "/huge" else 3000
+        return httpx.Response(200, content=b"x" * size, headers={"etag": '"v1"'})
+
+    async def main():
+        upstream = UpstreamClient()
+        upstream._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        for page in range(5):
+            await upstream.get(f"https://example.com/{page}")
+        revalidation = upstream.stats()["revalidation"]
+        assert (revalidation["tracked_urls"], revalidation["tracked_bytes"]) == (3, 9000)
+
+        replayed = await upstream.get("https://example.com/4")
+        assert (replayed.status_code, len(replayed.content)) == (200, 3000)
+
+        # Too big to keep at all, so nothing else is evicted for it
+        await upstream.get("https://example.com/huge")
+        assert upstream.stats()["revalidation"]["tracked_bytes"] == 9000
+        await upstream.aclose()
+
+    asyncio.run(main())
+
+
+def test_transient_failures_are_retried_until_the_attempts_run_out(monkeypatch):
+    monkeypatch.setattr(settings, "UPSTREAM_SCHEDULER_ENABLED", False)
+    monkeypatch.setattr(settings, "UPSTREAM_RETRY_BACKOFF_BASE", 0.001)
+    statuses = {"/flaky": [503, 200], "/down": [503, 503, 503, 503], "/missing": [404, 200]}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(statuses[request.url.path].pop(0))
+
+    async def main():
+        upstream = UpstreamClient()
+        upstream._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        results = [(await upstream.get(f"https://example.com{path}")).status_code for path in statuses]
+        await upstream.aclose()
+        return upstream, results
+
+    upstream, results = asyncio.run(main())
+    assert results == [200, 503, 404]
+    # Three attempts for /down, and 404s are not worth another try
+    assert statuses == {"/flaky": [], "/down": [503], "/missing": [200]}
+    assert upstream.retry_policy.budget.retries == 3
+
+
+def test_fetches_give_up_when_the_request_deadline_runs_out(monkeypatch):
+    monkeypatch.setattr(settings, "UPSTREAM_SCHEDULER_ENABLED", False)
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(1.0)
+        return httpx.Response(200)
+
+    async def main():
+        upstream = UpstreamClient()
+        upstream._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        start_deadline(0.1)
+        started = time.monotonic()
+        try:
+            with pytest.raises(DeadlineExceeded):
+                await upstream.get("https://example.com/slow")
+            elapsed = time.monotonic() - started
+            # With nothing left, the next fetch is not even sent
+            with pytest.raises(DeadlineExceeded):
+                await upstream.get("https://example.com/other")
+        finally:
+            await upstream.aclose()
+        return elapsed
+
+    assert asyncio.run(main()) < 0.5
+
+
+def test_a_shared_fetch_outlives_callers_that_go_away(monkeypatch):
+    monkeypatch.setattr(settings, "UPSTREAM_SCHEDULER_ENABLED", False)
+    sent, finished = [], []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(request.url.path)
+        try:
+            await asyncio.sleep(0.1)
+        except asyncio.CancelledError:
+            finished.append("cancelled")
+            raise
+        finished.append("done")
+        return httpx.Response(200, content=b"shared")
+
+    async def main():
+        upstream = UpstreamClient()
+        upstream._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        gone = asyncio.ensure_future(upstream.get("https://example.com/page"))
+        staying = asyncio.ensure_future(upstream.get("https://example.com/page"))
+        await asyncio.sleep(0.02)
+        gone.cancel()
+        response = await staying
+        assert gone.cancelled()
+        assert (response.status_code, response.content) == (200, b"shared")
+
+        # Once every caller has gone, the fetch itself is cancelled
+        alone = asyncio.ensure_future(upstream.get("https://example.com/abandoned"))
+        await asyncio.sleep(0.02)
+        alone.cancel()
+        await asyncio.sleep(0.02)
+        await upstream.aclose()
+
+    asyncio.run(main())
+    assert sent == ["/page", "/abandoned"]
+    assert finished == ["done", "cancelled"]
+
+
+def test_interactive_callers_do_not_join_a_background_fetch(monkeypatch):
+    monkeypatch.setattr(settings, "UPSTREAM_SCHEDULER_ENABLED", False)
+    sent = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(request.url.path)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200)
+
+    async def main():
+        upstream = UpstreamClient()
+        upstream._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with priority(PREFETCH):
+            background = [asyncio.ensure_future(upstream.get("https://example.com/page")) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        interactive = [asyncio.ensure_future(upstream.get("https://example.com/page")) for _ in range(2)]
+        await asyncio.gather(*background, *interactive)
+        await upstream.aclose()
+
+    asyncio.run(main())
+    # One fetch per class: background callers share theirs, interactive callers share a new one
+    assert sent == ["/page", "/page"]
@@ -0,0 +1,113 @@
+import asyncio
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from app.core import cache as cache_module
+from app.core.cache import cached, response_cache
+from app.core.config import settings
+from app.core.hotkeys import HeavyHitters
+from app.core.scheduler import PREFETCH, current_priority
+from app.core.warmer import CacheWarmer
+
+
+@pytest.fixture
+def warm_app(clock, monkeypatch):
+    """An app with one cached route, /items/{name} (60s TTL), that records the priority of every call."""
+    monkeypatch.setattr(cache_module, "time", clock)
+    monkeypatch.setattr(settings, "CACHE_MODE", "bytes")
+    response_cache.clear()
+    app = FastAPI()
+    app.state.calls = []
+    app.state.failing = False
+
+    @app.get("/items/{name}")
+    @cached("tests.items", ttl=60)
+    async def item(name: str):
+        app.state.calls.append((name, current_priority()))
+        if app.state.failing:
+            raise HTTPException(status_code=502, detail="upstream down")
+        return {"name": name}
+
+    yield app
+    response_cache.clear()
+
+
+def refresh(warmer: CacheWarmer, path: str):
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=warmer.app), base_url="http://test") as client:
+            return await warmer._refresh(client, path)
+
+    return asyncio.run(main())
+
+
+def test_refreshes_at_prefetch_priority_lead_seconds_before_expiry(warm_app, clock):
+    warmer = CacheWarmer(warm_app, ["/items/a"], lead=10, jitter=0, retry=30)
+    assert refresh(warmer, "/items/a") == pytest.approx(50)
+    assert warm_app.state.calls == [("a", PREFETCH)]
+
+    # Still fresh beyond the lead time: nothing to do until then
+    clock.advance(20)
+    assert refresh(warmer, "/items/a") == pytest.approx(30)
+    assert len(warm_app.state.calls) == 1
+
+    # Inside the lead time the entry is rebuilt although it has not expired yet
+    clock.advance(35)
+    assert refresh(warmer, "/items/a") == pytest.approx(50)
+    assert warm_app.state.calls == [("a", PREFETCH), ("a", PREFETCH)]
+    assert response_cache.ttl_remaining("tests.items?name=a") == pytest.approx(60)
+
+
+def test_an_entry_cached_before_the_first_visit_is_kept(warm_app, clock):
+    response_cache.set("tests.items?name=a", cache_module._cached_body(b'{"name":"a"}'), "tests.items", 40)
+    warmer = CacheWarmer(warm_app, ["/items/a"], lead=10, jitter=0, retry=30)
+    assert refresh(warmer, "/items/a") == pytest.approx(30)
+    assert warm_app.state.calls == []
+    assert warmer._keys == {"/items/a": "tests.items?name=a"}
+
+
+def test_failed_refreshes_are_retried_later(warm_app, clock):
+    warmer = CacheWarmer(warm_app, ["/items/a"], lead=10, jitter=0, retry=30)
+    refresh(warmer, "/items/a")
+    clock.advance(70)
+    warm_app.state.failing = True
+    # The stale fallback is a 200, but it stored nothing
+    assert refresh(warmer, "/items/a") == 30
+
+
+def test_short_ttls_are_not_refreshed_in_a_loop():
+    warmer = CacheWarmer(None, [], lead=120, jitter=0, retry=30)
+    assert warmer._until_due(5) == 1.0
+
+
+def test_start_warms_every_path_within_the_jitter_window(warm_app):
+    warmer = CacheWarmer(warm_app, ["/items/a", "/items/b"], lead=10, jitter=0, retry=30)
+
+    async def main():
+        warmer.start()
+        await asyncio.sleep(0.2)
+        await warmer.stop()
+
+    asyncio.run(main())
+    assert sorted(warm_app.state.calls) == [("a", PREFETCH), ("b", PREFETCH)]
+    assert set(warmer._due) == {"/items/a", "/items/b"}
+
+
+def test_hot_keys_are_warmed_while_they_stay_hot(warm_app):
+    hot_keys = HeavyHitters(k=4, width=256, depth=2, decay_seconds=0)
+    for _ in range(5):
+        hot_keys.add("tests.items?name=hot", "/items/hot")
+        hot_keys.add("tests.items?name=a", "/items/a?")
+    hot_keys.add("tests.items?name=cold", "/items/cold")
+    warmer = CacheWarmer(warm_app, ["/items/a"], lead=10, jitter=0, retry=30, hot_keys=hot_keys, hot_count=4,
+                         hot_min_count=3)
+    warmer._keys["/items/a"] = "tests.items?name=a"
+    warmer._due = {"/items/a": 0.0}
+
+    warmer._sync_hot_keys()
+    # The fixed path is already warmed under another spelling, and the cold key is under the minimum count
+    assert set(warmer._due) == {"/items/a", "/items/hot"}
+
+    # Traffic moved on: only the fixed path stays
+    warmer.hot_keys = HeavyHitters(k=4, width=256, depth=2, decay_seconds=0)
+    warmer._sync_hot_keys()
+    assert set(warmer._due) == {"/items/a"}